@@ -0,0 +1,77 @@
+"""
+ZEGA Gateway
+Runs core, image, voice, docparser and the MCP server as one ASGI app in one process.
+MCP tool calls are dispatched to the mounted apps in-process instead of over HTTP.
+
+Usage (from the AIservices directory):
+    python gateway.py                      # port 8000, or ZEGA_GATEWAY_PORT
+    uvicorn gateway:app --port 8000
+
+Routes: /core/*, /image/*, /voice/*, /docparser/*, /mcp/* (JSON-RPC at /mcp/mcp).
+The separate-process layout (start-all-services.bat) keeps working unchanged.
+"""
+import importlib
+import os
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fastapi import FastAPI
+
+GATEWAY_PORT = int(os.getenv("ZEGA_GATEWAY_PORT", "8000"))
+
+# service -> (module, mount prefix, env var the MCP server reads for its base URL)
+SERVICES = {
+    "core": ("zega.api", "/core", "ZEGA_CORE_URL"),
+    "image": ("zega_image.api", "/image", "ZEGA_IMAGE_URL"),
+    "voice": ("zega_voice.api", "/voice", "ZEGA_VOICE_URL"),
+    "docparser": ("zega_docparser.api", "/docparser", "ZEGA_DOCPARSER_URL"),
+}
+MCP_PREFIX = "/mcp"
+
+def build_gateway() -> FastAPI:
+    # MCP resources advertise service URLs; point them at the gateway mounts
+    for _, prefix, env_var in SERVICES.values():
+        os.environ.setdefault(env_var, f"http://localhost:{GATEWAY_PORT}{prefix}")
+
+    service_apps = {
+        service: importlib.import_module(module).app
+        for service, (module, _, _) in SERVICES.items()
+    }
+    mcp = importlib.import_module("mcp_server.server")
+    mcp.mcp_server.use_in_process(service_apps)
+    mounted = {**service_apps, "mcp": mcp.app}
+
+    @asynccontextmanager
+    async def lifespan(_: FastAPI):
+        # Starlette does not run lifespan events of mounted sub-apps; run them here
+        for sub_app in mounted.values():
+            await sub_app.router.startup()
+        print(f"[GATEWAY] ✅ {', '.join(mounted)} mounted on :{GATEWAY_PORT} (MCP dispatch in-process)")
+        yield
+        for sub_app in mounted.values():
+            await sub_app.router.shutdown()
+
+    gateway = FastAPI(title="ZEGA Gateway", version="1.0.0", lifespan=lifespan)
+
+    @gateway.get("/health")
+    async def health():
+        return {
+            "status": "ZEGA gateway is active",
+            "services": {name: prefix for name, (_, prefix, _) in SERVICES.items()},
+            "mcp": MCP_PREFIX,
+            "mcp_transport": mcp.mcp_server.transport.name
+        }
+
+    for service, (_, prefix, _) in SERVICES.items():
+        gateway.mount(prefix, service_apps[service])
+    gateway.mount(MCP_PREFIX, mcp.app)
+    return gateway
+
+app = build_gateway()
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=GATEWAY_PORT)
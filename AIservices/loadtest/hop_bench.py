@@ -0,0 +1,166 @@
+"""
+MCP Hop Overhead Benchmark
+Times the same MCP tool calls dispatched in-process (gateway mode) and over
+localhost HTTP (separate services), so the cost of the extra hop is visible
+
+Usage (from the AIservices directory, no network needed):
+    python -m loadtest.hop_bench -n 500 -c 8
+    python -m loadtest.hop_bench --spawn      # HTTP target in a separate uvicorn process
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+import uvicorn
+
+from loadtest.runner import _free_port, percentile
+
+# Docparser tools are pure CPU (regex) work, so the timing is mostly dispatch cost
+TOOL_CALLS = [
+    ("detect_genre", {"text": "The dragon circled the castle while the knights readied their swords."}),
+    ("extract_characters", {"text": '"We leave at dawn," said Mara. Tomas nodded. "Then Mara leads."'}),
+    ("get_service_status", {"service": "docparser"}),
+]
+
+async def _time_calls(mcp_server, total: int, concurrency: int) -> Dict[str, Any]:
+    from mcp_server.server import UpstreamError
+
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            name, arguments = TOOL_CALLS[i % len(TOOL_CALLS)]
+            start = time.perf_counter()
+            try:
+                result = await mcp_server.execute_tool(name, arguments)
+            except UpstreamError:
+                result = {"error": "upstream"}
+            latencies.append((time.perf_counter() - start) * 1000)
+            if isinstance(result, dict) and result.get("error"):
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "calls": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+    }
+
+@contextlib.asynccontextmanager
+async def _http_docparser(app, spawn: bool):
+    """Yield the docparser base URL: in this event loop, or in a child uvicorn process"""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    if spawn:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "zega_docparser.api:app",
+             "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            cwd=str(Path(__file__).parent.parent),
+            stdout=subprocess.DEVNULL
+        )
+        try:
+            async with httpx.AsyncClient() as client:
+                for _ in range(200):
+                    with contextlib.suppress(httpx.HTTPError):
+                        if (await client.get(f"{url}/health")).status_code == 200:
+                            break
+                    await asyncio.sleep(0.1)
+                else:
+                    raise RuntimeError("Spawned docparser did not become healthy")
+            yield url
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+    else:
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+        task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.05)
+        try:
+            yield url
+        finally:
+            server.should_exit = True
+            await task
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from mcp_server.server import ZegaMCPServer
+    from mcp_server.transport import HTTPTransport
+    import zega_docparser.api as docparser
+
+    docparser.parser.training_data_path = Path(tempfile.mkdtemp(prefix="zega_hop_"))
+    results: Dict[str, Any] = {}
+
+    in_process = ZegaMCPServer()
+    in_process.use_in_process({"docparser": docparser.app})
+    await _time_calls(in_process, args.warmup, args.concurrency)
+    results["inprocess"] = await _time_calls(in_process, args.requests, args.concurrency)
+    await in_process.close()
+
+    async with _http_docparser(docparser.app, args.spawn) as url:
+        over_http = ZegaMCPServer()
+        over_http.base_urls["docparser"] = url
+        over_http.transport = HTTPTransport(over_http.base_urls)
+        await _time_calls(over_http, args.warmup, args.concurrency)
+        results["http_process" if args.spawn else "http_same_loop"] = await _time_calls(
+            over_http, args.requests, args.concurrency
+        )
+        await over_http.close()
+
+    http_key = "http_process" if args.spawn else "http_same_loop"
+    results["hop_overhead_ms"] = {
+        stat: round(results[http_key][stat] - results["inprocess"][stat], 3)
+        for stat in ("mean_ms", "p50_ms", "p95_ms")
+    }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare in-process vs HTTP dispatch of MCP tool calls")
+    parser.add_argument("-n", "--requests", type=int, default=300)
+    parser.add_argument("-c", "--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=30)
+    parser.add_argument("--spawn", action="store_true",
+                        help="Run the HTTP target in a separate uvicorn process (closest to production)")
+    parser.add_argument("--json", action="store_true", help="Print the raw JSON report")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show service logs")
+    args = parser.parse_args()
+
+    log_sink = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    with log_sink:
+        report = asyncio.run(run(args))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"\n{'mode':<16} {'calls':>6} {'err':>4} {'rps':>8} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for mode, r in report.items():
+        if mode == "hop_overhead_ms":
+            continue
+        print(f"{mode:<16} {r['calls']:>6} {r['errors']:>4} {r['rps']:>8} "
+              f"{r['mean_ms']:>7.2f}ms {r['p50_ms']:>7.2f}ms {r['p95_ms']:>7.2f}ms {r['p99_ms']:>7.2f}ms")
+    overhead = report["hop_overhead_ms"]
+    print(f"\nHTTP hop overhead: mean {overhead['mean_ms']:+.3f}ms, p50 {overhead['p50_ms']:+.3f}ms, "
+          f"p95 {overhead['p95_ms']:+.3f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+"""
+ZEGA Load Test Runner
+Boots core, image, voice, docparser and MCP in one process with stubbed providers,
+replays a scenario mix and reports latency histograms, error rates and event-loop lag
+
+Usage (from the AIservices directory, no network needed):
+    python -m loadtest.runner --mix default -c 32 -n 1000
+    python -m loadtest.runner --mix editor --rate 40 --duration 60 --max-p95-ms 2500
+"""
+import argparse
+import asyncio
+import contextlib
+import importlib
+import json
+import math
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+import uvicorn
+
+from zega.benchmarks.mock_providers import MockProviderServer, ProviderBehavior
+from loadtest.scenarios import MIXES, Scenario, build_mix, pick
+
+SERVICES = {
+    # service -> (module, app attribute, env var the MCP server reads)
+    "core": ("zega.api", "app", "ZEGA_CORE_URL"),
+    "image": ("zega_image.api", "app", "ZEGA_IMAGE_URL"),
+    "voice": ("zega_voice.api", "app", "ZEGA_VOICE_URL"),
+    "docparser": ("zega_docparser.api", "app", "ZEGA_DOCPARSER_URL"),
+    "mcp": ("mcp_server.server", "app", None),
+}
+
+HISTOGRAM_BOUNDS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))]
+
+@dataclass
+class ScenarioStats:
+    """Latency samples and outcome counts for one scenario"""
+    latencies_ms: List[float] = field(default_factory=list)
+    outcomes: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, latency_ms: float, outcome: str):
+        self.latencies_ms.append(latency_ms)
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    @property
+    def errors(self) -> int:
+        return sum(v for k, v in self.outcomes.items() if k != "ok")
+
+    def histogram(self) -> Dict[str, int]:
+        buckets = {f"<={b}ms": 0 for b in HISTOGRAM_BOUNDS_MS}
+        buckets["+Inf"] = 0
+        for latency in self.latencies_ms:
+            for bound in HISTOGRAM_BOUNDS_MS:
+                if latency <= bound:
+                    buckets[f"<={bound}ms"] += 1
+                    break
+            else:
+                buckets["+Inf"] += 1
+        return buckets
+
+    def summary(self) -> Dict[str, Any]:
+        total = len(self.latencies_ms)
+        return {
+            "requests": total,
+            "errors": self.errors,
+            "error_rate": round(self.errors / total, 4) if total else 0.0,
+            "outcomes": dict(self.outcomes),
+            "p50_ms": round(percentile(self.latencies_ms, 50), 1),
+            "p95_ms": round(percentile(self.latencies_ms, 95), 1),
+            "p99_ms": round(percentile(self.latencies_ms, 99), 1),
+            "max_ms": round(max(self.latencies_ms, default=0.0), 1),
+            "histogram": self.histogram(),
+        }
+
+class LoopLagMonitor:
+    """Samples how late a periodic timer fires; blocking handlers show up as lag"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples_ms: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples_ms.append(max(0.0, (loop.time() - expected) * 1000))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "samples": len(self.samples_ms),
+            "p50_ms": round(percentile(self.samples_ms, 50), 1),
+            "p99_ms": round(percentile(self.samples_ms, 99), 1),
+            "max_ms": round(max(self.samples_ms, default=0.0), 1),
+        }
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def classify(response: httpx.Response) -> str:
+    """ok | http_<status> | app_error (200 with success=false / error body)"""
+    if response.status_code >= 400:
+        return f"http_{response.status_code}"
+    if response.headers.get("content-type", "").startswith("application/json"):
+        body = response.json()
+        if isinstance(body, dict) and (body.get("success") is False or body.get("error")):
+            return "app_error"
+    return "ok"
+
+class ServiceCluster:
+    """All five FastAPI apps on ephemeral localhost ports inside this event loop"""
+
+    def __init__(self, behaviors: Dict[str, ProviderBehavior]):
+        self.behaviors = behaviors
+        self.mock = MockProviderServer(behaviors={
+            k: v for k, v in behaviors.items() if k in ("gemini", "groq", "ollama", "huggingface")
+        })
+        self.ports = {name: _free_port() for name in SERVICES}
+        self.servers: List[uvicorn.Server] = []
+        self.tasks: List[asyncio.Task] = []
+        self.modules: Dict[str, Any] = {}
+
+    def url(self, service: str) -> str:
+        return f"http://127.0.0.1:{self.ports[service]}"
+
+    async def start(self, workdir: Path):
+        await self.mock.start()
+        os.environ.update(self.mock.env())
+        # Empty values keep load_dotenv from pulling real keys out of .env
+        for key in ("GOOGLE_API_KEY", "STABILITY_API_KEY", "REPLICATE_API_TOKEN"):
+            os.environ[key] = ""
+        os.environ["OPENAI_API_KEY"] = "loadtest"  # Skip loading a local Whisper model
+        os.environ["ZEGA_ARTIFACT_DIR"] = str(workdir / "artifacts")
+        for service, (_, _, env_var) in SERVICES.items():
+            if env_var:
+                os.environ[env_var] = self.url(service)
+
+        # Import off-loop: the ensemble's startup Ollama probe is a blocking call to self.mock
+        for service, (module_name, _, _) in SERVICES.items():
+            self.modules[service] = await asyncio.to_thread(importlib.import_module, module_name)
+        self._install_stubs(workdir)
+
+        for service, (_, app_attr, _) in SERVICES.items():
+            config = uvicorn.Config(
+                getattr(self.modules[service], app_attr),
+                host="127.0.0.1",
+                port=self.ports[service],
+                log_level="warning",
+                lifespan="off"
+            )
+            server = uvicorn.Server(config)
+            self.servers.append(server)
+            self.tasks.append(asyncio.create_task(server.serve()))
+
+        while not all(s.started for s in self.servers):
+            await asyncio.sleep(0.05)
+
+    def _install_stubs(self, workdir: Path):
+        from loadtest.stubs import StubImageProvider, StubSTTProvider, StubTTSProvider
+        from zega.benchmarks.run_bench import BenchMemory
+
+        core = self.modules["core"]
+        memory = BenchMemory()
+        core.memory = memory
+        core.zega.memory = memory
+        if hasattr(core.zega, "agent_pool"):
+            core.zega.agent_pool.memory = memory
+            core.zega.auto_trainer.memory = memory
+
+        generator = self.modules["image"].generator
+        generator.providers = [StubImageProvider(behavior=self.behaviors["image"])]
+        generator.training_data_path = workdir / "image_training"
+        generator.training_data_path.mkdir(exist_ok=True)  # The catalog opens here on first use
+
+        processor = self.modules["voice"].processor
+        processor.tts_providers = [StubTTSProvider(behavior=self.behaviors["tts"])]
+        processor.stt_providers = [StubSTTProvider(behavior=self.behaviors["stt"])]
+
+        self.modules["docparser"].parser.training_data_path = workdir / "docparser_training"
+        (workdir / "docparser_training").mkdir(exist_ok=True)
+
+    async def stop(self):
+        for server in self.servers:
+            server.should_exit = True
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self.mock.stop()
+
+async def fire(
+    client: httpx.AsyncClient,
+    cluster: ServiceCluster,
+    scenario: Scenario,
+    i: int,
+    stats: Dict[str, ScenarioStats]
+):
+    start = time.perf_counter()
+    try:
+        response = await client.request(
+            scenario.method, cluster.url(scenario.service) + scenario.path, **scenario.build(i)
+        )
+        outcome = classify(response)
+    except httpx.TimeoutException:
+        outcome = "client_timeout"
+    except Exception as e:
+        outcome = type(e).__name__
+    stats.setdefault(scenario.name, ScenarioStats()).record(
+        (time.perf_counter() - start) * 1000, outcome
+    )
+
+async def drive(args: argparse.Namespace, cluster: ServiceCluster, mix: List[Scenario]) -> Dict[str, ScenarioStats]:
+    """Closed loop (--concurrency workers) or open loop (--rate arrivals/s, Poisson)"""
+    stats: Dict[str, ScenarioStats] = {}
+    limits = httpx.Limits(max_connections=max(args.concurrency, 100))
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        deadline = time.perf_counter() + args.duration if args.duration else None
+
+        def more(i: int) -> bool:
+            if deadline:
+                return time.perf_counter() < deadline
+            return i < args.requests
+
+        if args.rate:
+            in_flight = set()
+            i = 0
+            while more(i):
+                task = asyncio.create_task(fire(client, cluster, pick(mix), i, stats))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+                i += 1
+                await asyncio.sleep(random.expovariate(args.rate))
+            await asyncio.gather(*in_flight)
+        else:
+            counter = iter(range(10 ** 9))
+
+            async def worker():
+                for i in counter:
+                    if not more(i):
+                        return
+                    await fire(client, cluster, pick(mix), i, stats)
+
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return stats
+
+def build_behaviors(args: argparse.Namespace) -> Dict[str, ProviderBehavior]:
+    def behavior(latency: str) -> ProviderBehavior:
+        return ProviderBehavior(
+            latency=latency,
+            error_rate=args.error_rate,
+            rate_limit_rate=args.rate_limit_rate,
+            timeout_rate=args.timeout_rate,
+            hang_seconds=args.hang_seconds
+        )
+
+    return {
+        "gemini": behavior(args.gemini_latency),
+        "groq": behavior(args.groq_latency),
+        "ollama": behavior(args.ollama_latency),
+        "huggingface": behavior(args.hf_latency),
+        "image": behavior(args.image_latency),
+        "tts": behavior(args.tts_latency),
+        "stt": behavior(args.stt_latency),
+    }
+
+async def run(args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    cluster = ServiceCluster(build_behaviors(args))
+    log_sink = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+
+    with log_sink:
+        await cluster.start(workdir)
+        monitor = LoopLagMonitor()
+        monitor.start()
+        started = time.perf_counter()
+        try:
+            stats = await drive(args, cluster, build_mix(args.mix))
+        finally:
+            elapsed = time.perf_counter() - started
+            await monitor.stop()
+            await cluster.stop()
+
+    total = sum(len(s.latencies_ms) for s in stats.values())
+    errors = sum(s.errors for s in stats.values())
+    return {
+        "mix": args.mix,
+        "mode": f"open loop @ {args.rate}/s" if args.rate else f"closed loop x{args.concurrency}",
+        "duration_s": round(elapsed, 2),
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "scenarios": {name: s.summary() for name, s in sorted(stats.items())},
+        "loop_lag": monitor.summary(),
+        "provider_calls": cluster.mock.get_stats(),
+    }
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n[LOADTEST] 📊 mix={report['mix']}  {report['mode']}  {report['duration_s']}s")
+    print(f"[LOADTEST] {report['requests']} requests  {report['throughput_rps']} req/s  "
+          f"error rate {report['error_rate']:.2%}")
+    print(f"[LOADTEST] {'scenario':<22}{'n':>6}{'err%':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for name, s in report["scenarios"].items():
+        print(f"[LOADTEST] {name:<22}{s['requests']:>6}{s['error_rate']:>8.1%}"
+              f"{s['p50_ms']:>9.0f}{s['p95_ms']:>9.0f}{s['p99_ms']:>9.0f}{s['max_ms']:>9.0f}")
+    for name, s in report["scenarios"].items():
+        peak = max(s["histogram"].values()) or 1
+        print(f"\n[LOADTEST] {name} latency histogram")
+        for bucket, count in s["histogram"].items():
+            if count:
+                print(f"[LOADTEST]   {bucket:>10} {count:>6} {'#' * max(1, round(40 * count / peak))}")
+        failures = {k: v for k, v in s["outcomes"].items() if k != "ok"}
+        if failures:
+            print(f"[LOADTEST]   ❌ {failures}")
+    lag = report["loop_lag"]
+    print(f"\n[LOADTEST] ⏱️ Event-loop lag  p50: {lag['p50_ms']}ms  p99: {lag['p99_ms']}ms  max: {lag['max_ms']}ms")
+
+def check_thresholds(args: argparse.Namespace, report: Dict[str, Any]) -> List[str]:
+    """Regression gates; any violation makes the run exit non-zero"""
+    violations = []
+    if args.max_error_rate is not None and report["error_rate"] > args.max_error_rate:
+        violations.append(f"error rate {report['error_rate']:.2%} > {args.max_error_rate:.2%}")
+    if args.max_p95_ms is not None:
+        for name, s in report["scenarios"].items():
+            if s["p95_ms"] > args.max_p95_ms:
+                violations.append(f"{name} p95 {s['p95_ms']}ms > {args.max_p95_ms}ms")
+    if args.max_loop_lag_ms is not None and report["loop_lag"]["p99_ms"] > args.max_loop_lag_ms:
+        violations.append(f"loop lag p99 {report['loop_lag']['p99_ms']}ms > {args.max_loop_lag_ms}ms")
+    return violations
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline load test for all ZEGA services")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="default")
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("-n", "--requests", type=int, default=500)
+    parser.add_argument("--duration", type=float, help="Run for N seconds instead of -n requests")
+    parser.add_argument("--rate", type=float, help="Open-loop arrival rate (req/s) instead of closed loop")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Client timeout per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Provider HTTP 500 rate")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Provider 429 rate")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Provider hang rate")
+    parser.add_argument("--hang-seconds", type=float, default=65.0)
+    parser.add_argument("--gemini-latency", default="lognormal:900:0.3")
+    parser.add_argument("--groq-latency", default="lognormal:400:0.3")
+    parser.add_argument("--ollama-latency", default="lognormal:1500:0.4")
+    parser.add_argument("--hf-latency", default="lognormal:8000:0.5")
+    parser.add_argument("--image-latency", default="lognormal:3000:0.4")
+    parser.add_argument("--tts-latency", default="lognormal:800:0.3")
+    parser.add_argument("--stt-latency", default="lognormal:1200:0.3")
+    parser.add_argument("--max-error-rate", type=float)
+    parser.add_argument("--max-p95-ms", type=float)
+    parser.add_argument("--max-loop-lag-ms", type=float)
+    parser.add_argument("--json", dest="json_out", help="Also write the report to this file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Keep service logging")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    # Stores, checkpoints and training data land in a throwaway directory
+    with tempfile.TemporaryDirectory(prefix="zega-loadtest-") as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            report = asyncio.run(run(args, Path(workdir)))
+        finally:
+            os.chdir(cwd)
+
+    print_report(report)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[LOADTEST] 💾 Report written to {args.json_out}")
+
+    violations = check_thresholds(args, report)
+    for violation in violations:
+        print(f"[LOADTEST] ❌ Threshold exceeded: {violation}")
+    sys.exit(1 if violations else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Load Test Scenarios
+Weighted request mixes replaying realistic traffic against the five ZEGA services
+"""
+import random
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List
+
+SAMPLE_SCENE = (
+    "Elena drew her sword as the dragon landed on the castle wall. "
+    "\"Stay behind me,\" she told Marcus. The wizard's tower burned in the distance, "
+    "and the kingdom's last knights gathered in the courtyard below."
+)
+
+SAMPLE_DOCUMENT = "\n\n".join(
+    f"Chapter {n}\n\n" + " ".join([SAMPLE_SCENE] * 6) for n in range(1, 9)
+)
+
+@dataclass
+class Scenario:
+    """One kind of request: which service, what HTTP call, how often"""
+    name: str
+    service: str        # core | image | voice | docparser | mcp
+    method: str
+    path: str
+    weight: int
+    build: Callable[[int], Dict[str, Any]]  # request index -> httpx request kwargs
+
+def _editor_continuation(i: int) -> Dict[str, Any]:
+    return {"json": {
+        "user_id": f"load-user-{i % 20}",
+        "context": f"{SAMPLE_SCENE} ({i})",
+        "mode": "continuation"
+    }}
+
+def _scene_structured(i: int) -> Dict[str, Any]:
+    return {"json": {
+        "user_id": f"load-user-{i % 20}",
+        "context": f"Previous scene: {SAMPLE_SCENE}\nCharacters: Elena, Marcus ({i})",
+        "instruction": "Write the next scene",
+        "mode": "scene_structured"
+    }}
+
+def _genre_selection(i: int) -> Dict[str, Any]:
+    return {"json": {
+        "user_id": f"load-user-{i % 20}",
+        "context": f"{SAMPLE_SCENE} ({i})",
+        "instruction": "Select from these genres: Fantasy, Adventure, Horror, Romance, Sci-Fi",
+        "mode": "genre_selection"
+    }}
+
+def _doc_upload(i: int) -> Dict[str, Any]:
+    return {"files": {"file": (f"draft-{i}.txt", SAMPLE_DOCUMENT.encode(), "text/plain")}}
+
+def _narrate(i: int) -> Dict[str, Any]:
+    return {"json": {
+        "scene_title": f"The Siege ({i})",
+        "scene_description": SAMPLE_SCENE * 2,
+        "voice": "en-US-JennyNeural"
+    }}
+
+def _image(i: int) -> Dict[str, Any]:
+    return {"json": {
+        "scene_title": "The Siege",
+        "scene_description": f"{SAMPLE_SCENE} ({i})",
+        "characters": [{"name": "Elena", "description": "Knight with silver armor"}],
+        "story_genre": "Fantasy",
+        "num_variations": 1
+    }}
+
+# MCP fan-out: one agent turn calling several tools on different services
+MCP_FANOUT_TOOLS = [
+    ("detect_genre", {"text": SAMPLE_SCENE}),
+    ("extract_characters", {"text": SAMPLE_SCENE}),
+    ("parse_text_to_scenes", {"text": SAMPLE_DOCUMENT[:4000], "title": "Draft"}),
+    ("narrate_scene", {"scene_title": "The Siege", "scene_description": SAMPLE_SCENE}),
+    ("get_available_voices", {}),
+    ("get_service_status", {"service": "all"}),
+]
+
+def _mcp_tool_call(i: int) -> Dict[str, Any]:
+    name, arguments = random.choice(MCP_FANOUT_TOOLS)
+    return {"json": {"name": name, "arguments": arguments}}
+
+SCENARIOS = {
+    "editor_continuation": Scenario("editor_continuation", "core", "POST", "/predict", 40, _editor_continuation),
+    "scene_structured": Scenario("scene_structured", "core", "POST", "/predict", 8, _scene_structured),
+    "genre_selection": Scenario("genre_selection", "core", "POST", "/predict", 6, _genre_selection),
+    "doc_upload": Scenario("doc_upload", "docparser", "POST", "/parse/file", 8, _doc_upload),
+    "narrate": Scenario("narrate", "voice", "POST", "/narrate", 10, _narrate),
+    "image_generate": Scenario("image_generate", "image", "POST", "/generate", 8, _image),
+    "mcp_tools_call": Scenario("mcp_tools_call", "mcp", "POST", "/tools/call", 20, _mcp_tool_call),
+}
+
+# Named mixes: scenario name -> weight override (0 drops it)
+MIXES: Dict[str, Dict[str, int]] = {
+    "default": {},
+    "editor": {"editor_continuation": 70, "genre_selection": 15, "scene_structured": 15,
+               "doc_upload": 0, "narrate": 0, "image_generate": 0, "mcp_tools_call": 0},
+    "media": {"editor_continuation": 10, "scene_structured": 0, "genre_selection": 0,
+              "doc_upload": 20, "narrate": 35, "image_generate": 35, "mcp_tools_call": 0},
+    "mcp": {"editor_continuation": 0, "scene_structured": 0, "genre_selection": 0,
+            "doc_upload": 0, "narrate": 0, "image_generate": 0, "mcp_tools_call": 100},
+}
+
+def build_mix(name: str) -> List[Scenario]:
+    """Scenarios with their weights for a named mix"""
+    overrides = MIXES[name]
+    mix = []
+    for scenario in SCENARIOS.values():
+        weight = overrides.get(scenario.name, scenario.weight)
+        if weight > 0:
+            mix.append(Scenario(scenario.name, scenario.service, scenario.method,
+                                scenario.path, weight, scenario.build))
+    return mix
+
+def pick(mix: List[Scenario]) -> Scenario:
+    return random.choices(mix, weights=[s.weight for s in mix])[0]
@@ -0,0 +1,86 @@
+"""
+Stub Providers for Load Tests
+Image and voice providers with simulated latency/failures (no network)
+"""
+import asyncio
+from typing import Dict, List
+
+from zega.benchmarks.mock_providers import ProviderBehavior, tiny_png
+from zega_image.generator import ImageGenerationResult
+from zega_voice.processor import SynthesisResult, TranscriptionResult
+
+STUB_PNG = tiny_png()
+
+async def _simulate(behavior: ProviderBehavior) -> str:
+    """Sleep like the provider would; returns the sampled outcome"""
+    outcome = behavior.sample_outcome()
+    if outcome == "timeout":
+        await asyncio.sleep(behavior.hang_seconds)
+    else:
+        await asyncio.sleep(behavior.sample_latency())
+    return outcome
+
+class StubImageProvider:
+    """Stands in for Pollinations/HF/Stability in ZegaImageGenerator.providers"""
+
+    def __init__(self, name: str = "pollinations", behavior: ProviderBehavior = None):
+        self.name = name
+        self.behavior = behavior or ProviderBehavior(latency="lognormal:3000:0.4")
+
+    async def generate(self, prompt: str, *args, **kwargs) -> ImageGenerationResult:
+        outcome = await _simulate(self.behavior)
+        if outcome != "ok":
+            return ImageGenerationResult(
+                success=False, provider=self.name, prompt_used=prompt, error=f"stub {outcome}"
+            )
+        return ImageGenerationResult(
+            success=True,
+            image_data=STUB_PNG,
+            provider=self.name,
+            prompt_used=prompt,
+            model_used="stub"
+        )
+
+class StubTTSProvider:
+    """Edge-TTS shaped stub: audio size grows with text length like real MP3 output"""
+
+    BYTES_PER_CHAR = 180  # ~24 kbps MP3 at normal speaking rate
+
+    def __init__(self, name: str = "edge_tts", behavior: ProviderBehavior = None):
+        self.name = name
+        self.behavior = behavior or ProviderBehavior(latency="lognormal:800:0.3")
+
+    async def synthesize(self, text: str, voice: str = "en-US-JennyNeural", **kwargs) -> SynthesisResult:
+        outcome = await _simulate(self.behavior)
+        if outcome != "ok":
+            return SynthesisResult(success=False, error=f"stub {outcome}", provider=self.name)
+        return SynthesisResult(
+            success=True,
+            audio_data=b"\xff\xfb" + b"\x00" * (len(text) * self.BYTES_PER_CHAR),
+            audio_format="mp3",
+            provider=self.name,
+            voice_used=voice
+        )
+
+    async def get_voices(self) -> List[Dict[str, str]]:
+        return [{"name": "Stub Jenny", "short_name": "en-US-JennyNeural",
+                 "gender": "Female", "locale": "en-US"}]
+
+class StubSTTProvider:
+    """Whisper shaped stub returning one timestamped segment"""
+
+    def __init__(self, name: str = "whisper", behavior: ProviderBehavior = None):
+        self.name = name
+        self.behavior = behavior or ProviderBehavior(latency="lognormal:1200:0.3")
+
+    async def transcribe(self, audio_data: bytes, language: str = "en") -> TranscriptionResult:
+        outcome = await _simulate(self.behavior)
+        if outcome != "ok":
+            return TranscriptionResult(success=False, error=f"stub {outcome}", provider=self.name)
+        return TranscriptionResult(
+            success=True,
+            text="The night was dark and full of stars.",
+            language=language,
+            timestamps=[{"start": 0.0, "end": 2.5, "text": "The night was dark and full of stars."}],
+            provider=self.name
+        )
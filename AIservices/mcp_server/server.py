@@ -8,8 +8,12 @@ import os
 import sys
 import json
 import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import AsyncExitStack, asynccontextmanager
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Union
 from dataclasses import dataclass, asdict
 import base64
 
@@ -19,6 +23,56 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from dotenv import load_dotenv
 load_dotenv(dotenv_path=Path(__file__).parent.parent / '.env')
 
+from zega_telemetry import registry, instrument_app
+from mcp_server.transport import HTTPTransport, InProcessTransport
+
+MCP_TOOL_SECONDS = registry.histogram(
+    "zega_mcp_tool_seconds", "MCP tool call latency including the backend hop", ["tool", "outcome"])
+
+# Tool -> (service, method, path) on the backing service
+TOOL_ROUTES = {
+    "generate_scene": ("core", "POST", "/generate/scene"),
+    "expand_scene": ("core", "POST", "/expand/scene"),
+    "analyze_scene": ("core", "POST", "/analyze/scene"),
+    "generate_scene_image": ("image", "POST", "/generate"),
+    "quick_image": ("image", "GET", "/generate/quick"),
+    "transcribe_audio": ("voice", "POST", "/transcribe"),
+    "text_to_speech": ("voice", "POST", "/synthesize"),
+    "narrate_scene": ("voice", "POST", "/narrate"),
+    "generate_subtitles": ("voice", "POST", "/subtitles"),
+    "parse_text_to_scenes": ("docparser", "POST", "/mcp/execute"),
+    "extract_characters": ("docparser", "POST", "/mcp/execute"),
+    "detect_genre": ("docparser", "POST", "/mcp/execute"),
+    "get_available_voices": ("voice", "GET", "/voices"),
+}
+
+# Fixed query parameters added to a tool's route (GET routes also send their arguments as query parameters)
+TOOL_QUERY = {
+    "quick_image": {"response_mode": "json"},  # JSON with an artifact URL instead of raw image bytes
+}
+
+# Image/audio results (large when include_data inlines base64): relayed chunk by chunk unless the caller opts out
+LARGE_RESULT_TOOLS = {"generate_scene_image", "quick_image", "text_to_speech", "narrate_scene"}
+
+DEFERRED_PREFIX = "zega://results/"
+DEFERRED_TTL = int(os.getenv("ZEGA_MCP_DEFERRED_TTL", "300"))
+DEFERRED_MAX = 256
+
+class UpstreamError(Exception):
+    """A backing service answered a tool call with a 4xx/5xx status"""
+
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+def error_detail(body: Any) -> str:
+    """The message from a FastAPI-style error body ({"detail": ...} or {"error": ...})"""
+    if isinstance(body, dict):
+        detail = body.get("detail", body.get("error", body))
+        return detail if isinstance(detail, str) else json.dumps(detail)
+    return str(body)
+
 # MCP Server implementation
 @dataclass
 class MCPTool:
@@ -57,6 +111,10 @@ class ZegaMCPServer:
             "voice": os.getenv("ZEGA_VOICE_URL", "http://localhost:8004"),
             "docparser": os.getenv("ZEGA_DOCPARSER_URL", "http://localhost:8005")
         }
+        # Separate processes by default; gateway.py switches to in-process dispatch
+        self.transport = HTTPTransport(self.base_urls)
+        # token -> (expires_at, tool name, arguments) for zega://results/<token>
+        self.deferred: "OrderedDict[str, tuple]" = OrderedDict()
         
         self.tools = self._register_tools()
         self.resources = self._register_resources()
@@ -127,7 +185,8 @@ class ZegaMCPServer:
                             "items": {"type": "string"},
                             "description": "Characters to include in the image"
                         },
-                        "size": {"type": "string", "enum": ["square", "portrait", "landscape"], "description": "Image aspect ratio"}
+                        "size": {"type": "string", "enum": ["square", "portrait", "landscape"], "description": "Image aspect ratio"},
+                        "include_data": {"type": "boolean", "description": "Inline base64 image data besides the artifact URL"}
                     },
                     "required": ["scene_description"]
                 }
@@ -139,7 +198,9 @@ class ZegaMCPServer:
                 inputSchema={
                     "type": "object",
                     "properties": {
-                        "prompt": {"type": "string", "description": "Image description prompt"}
+                        "prompt": {"type": "string", "description": "Image description prompt"},
+                        "style": {"type": "string", "description": "Style words appended to the prompt", "default": "cinematic"},
+                        "include_data": {"type": "boolean", "description": "Also inline the image as base64", "default": False}
                     },
                     "required": ["prompt"]
                 }
@@ -167,7 +228,8 @@ class ZegaMCPServer:
                     "properties": {
                         "text": {"type": "string", "description": "Text to convert to speech"},
                         "voice": {"type": "string", "description": "Voice to use (e.g., 'en-US-JennyNeural')"},
-                        "language": {"type": "string", "description": "Language code"}
+                        "language": {"type": "string", "description": "Language code"},
+                        "include_data": {"type": "boolean", "description": "Inline base64 audio besides the artifact URL"}
                     },
                     "required": ["text"]
                 }
@@ -181,7 +243,8 @@ class ZegaMCPServer:
                     "properties": {
                         "scene_title": {"type": "string", "description": "Title of the scene"},
                         "scene_description": {"type": "string", "description": "Scene content to narrate"},
-                        "voice": {"type": "string", "description": "Narrator voice"}
+                        "voice": {"type": "string", "description": "Narrator voice"},
+                        "include_data": {"type": "boolean", "description": "Inline base64 audio besides the artifact URL"}
                     },
                     "required": ["scene_title", "scene_description"]
                 }
@@ -312,50 +375,33 @@ class ZegaMCPServer:
         return [asdict(resource) for resource in self.resources.values()]
     
     async def execute_tool(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute an MCP tool call"""
-        import aiohttp
-        
+        """Execute an MCP tool call; raises UpstreamError when the backing service fails it"""
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await self._dispatch_tool(name, arguments)
+            outcome = "error" if isinstance(result, dict) and result.get("error") else "ok"
+            return result
+        finally:
+            # Unknown names share one label so callers cannot grow the series set
+            MCP_TOOL_SECONDS.labels(name if name in self.tools else "unknown", outcome).observe(
+                time.perf_counter() - started
+            )
+
+    async def _dispatch_tool(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Route a tool call to the backing service"""
         if name not in self.tools:
             return {"error": f"Unknown tool: {name}"}
         
         try:
-            # Route to appropriate service
-            if name in ["generate_scene", "expand_scene", "analyze_scene"]:
-                url = f"{self.base_urls['core']}/{name.replace('_', '/')}"
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(url, json=arguments) as resp:
-                        return await resp.json()
-            
-            elif name in ["generate_scene_image", "quick_image"]:
-                endpoint = "generate" if name == "generate_scene_image" else "generate/quick"
-                url = f"{self.base_urls['image']}/{endpoint}"
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(url, json=arguments) as resp:
-                        return await resp.json()
-            
-            elif name in ["transcribe_audio", "text_to_speech", "narrate_scene", "generate_subtitles"]:
-                endpoint_map = {
-                    "transcribe_audio": "transcribe",
-                    "text_to_speech": "synthesize",
-                    "narrate_scene": "narrate",
-                    "generate_subtitles": "subtitles"
-                }
-                url = f"{self.base_urls['voice']}/{endpoint_map[name]}"
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(url, json=arguments) as resp:
-                        return await resp.json()
-            
-            elif name in ["parse_text_to_scenes", "extract_characters", "detect_genre"]:
-                url = f"{self.base_urls['docparser']}/mcp/execute"
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(url, params={"tool_name": name}, json=arguments) as resp:
-                        return await resp.json()
-            
-            elif name == "get_available_voices":
-                url = f"{self.base_urls['voice']}/voices"
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url) as resp:
-                        return await resp.json()
+            if name in TOOL_ROUTES:
+                service, method, path, params = self._route(name, arguments)
+                status, body = await self._request(
+                    service, method, path, arguments if method == "POST" else None, params=params
+                )
+                if status >= 400:
+                    raise UpstreamError(status, error_detail(body))
+                return body
             
             elif name == "get_service_status":
                 return await self._check_services(arguments.get("service", "all"))
@@ -363,34 +409,120 @@ class ZegaMCPServer:
             else:
                 return {"error": f"Tool '{name}' not yet implemented"}
                 
+        except UpstreamError:
+            raise
         except Exception as e:
             return {"error": str(e)}
     
+    def _route(self, name: str, arguments: Dict[str, Any]):
+        """(service, method, path, query params) for a routed tool"""
+        service, method, path = TOOL_ROUTES[name]
+        params: Dict[str, str] = {}
+        if method == "GET":
+            params.update({
+                key: json.dumps(value) if isinstance(value, bool) else str(value)
+                for key, value in arguments.items() if value is not None
+            })
+        # DocParser serves all of its tools from one endpoint
+        if service == "docparser":
+            params["tool_name"] = name
+        params.update(TOOL_QUERY.get(name, {}))
+        return service, method, path, params or None
+    
+    def can_stream(self, name: str) -> bool:
+        return name in TOOL_ROUTES
+    
+    @asynccontextmanager
+    async def open_tool_stream(self, name: str, arguments: Dict[str, Any]):
+        """
+        Start a routed tool call and yield (status, content type, body chunks)
+        without reading the body, so large results can be relayed as they arrive.
+        """
+        service, method, path, params = self._route(name, arguments)
+        started = time.perf_counter()
+        status = 0
+        try:
+            async with self.transport.stream(
+                service, method, path, arguments if method == "POST" else None, params=params
+            ) as (status, content_type, chunks):
+                yield status, content_type, chunks
+        finally:
+            MCP_TOOL_SECONDS.labels(name, "ok" if 0 < status < 400 else "error").observe(
+                time.perf_counter() - started
+            )
+    
+    def defer_tool(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Park a tool call behind a one-time zega://results/<token> resource; it
+        runs (streamed) when the client reads the resource.
+        """
+        now = time.time()
+        while self.deferred and (
+            len(self.deferred) >= DEFERRED_MAX
+            or next(iter(self.deferred.values()))[0] < now
+        ):
+            self.deferred.popitem(last=False)
+        token = uuid.uuid4().hex
+        self.deferred[token] = (now + DEFERRED_TTL, name, arguments)
+        return {
+            "resource": {
+                "uri": f"{DEFERRED_PREFIX}{token}",
+                "name": f"{name} result",
+                "mimeType": "application/json"
+            },
+            "expires_in": DEFERRED_TTL
+        }
+    
+    def take_deferred(self, uri: str) -> Optional[tuple]:
+        """(tool name, arguments) for a pending zega://results URI; single use"""
+        if not uri or not uri.startswith(DEFERRED_PREFIX):
+            return None
+        entry = self.deferred.pop(uri[len(DEFERRED_PREFIX):], None)
+        if entry is None or entry[0] < time.time():
+            return None
+        return entry[1], entry[2]
+    
+    async def _request(
+        self,
+        service: str,
+        method: str,
+        path: str,
+        json_body: Any = None,
+        params: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None
+    ):
+        """(status, JSON body) from a backing service via the active transport"""
+        return await self.transport.request(service, method, path, json_body, params, timeout)
+    
+    def use_in_process(self, apps: Dict[str, Any]):
+        """Gateway mode: dispatch to these mounted ASGI apps instead of over HTTP"""
+        self.transport = InProcessTransport(apps)
+    
+    async def close(self):
+        """Release pooled connections"""
+        await self.transport.close()
+    
     async def _check_services(self, service: str = "all") -> Dict[str, Any]:
         """Check health of ZEGA services"""
-        import aiohttp
-        
-        results = {}
         services_to_check = [service] if service != "all" else list(self.base_urls.keys())
+        services = [svc for svc in services_to_check if svc in self.base_urls]
+        
+        async def check(svc: str) -> Dict[str, Any]:
+            try:
+                status, body = await self._request(svc, "GET", "/health", timeout=5)
+                if status == 200:
+                    return {"status": "healthy", "details": body}
+                return {"status": "unhealthy", "code": status}
+            except Exception as e:
+                return {"status": "unreachable", "error": str(e)}
         
-        async with aiohttp.ClientSession() as session:
-            for svc in services_to_check:
-                if svc in self.base_urls:
-                    try:
-                        async with session.get(f"{self.base_urls[svc]}/health", timeout=aiohttp.ClientTimeout(total=5)) as resp:
-                            if resp.status == 200:
-                                results[svc] = {"status": "healthy", "details": await resp.json()}
-                            else:
-                                results[svc] = {"status": "unhealthy", "code": resp.status}
-                    except Exception as e:
-                        results[svc] = {"status": "unreachable", "error": str(e)}
+        # Concurrent: one slow or down service no longer delays the others' results
+        checks = await asyncio.gather(*(check(svc) for svc in services))
         
-        return {"services": results}
+        return {"services": dict(zip(services, checks)), "transport": self.transport.name}
     
     async def read_resource(self, uri: str) -> Dict[str, Any]:
         """Read an MCP resource"""
-        import aiohttp
-        
         if uri == "zega://services":
             return {
                 "services": {
@@ -423,9 +555,8 @@ class ZegaMCPServer:
         
         elif uri == "zega://voices":
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(f"{self.base_urls['voice']}/voices") as resp:
-                        return await resp.json()
+                _, body = await self._request("voice", "GET", "/voices")
+                return body
             except:
                 return {"voices": [], "error": "Voice service unavailable"}
         
@@ -451,12 +582,19 @@ class ZegaMCPServer:
                 }
             }
         
+        deferred = self.take_deferred(uri)
+        if deferred:
+            return await self.execute_tool(*deferred)
+        if uri and uri.startswith(DEFERRED_PREFIX):
+            return {"error": f"Result expired or already read: {uri}"}
+        
         return {"error": f"Unknown resource: {uri}"}
 
 
 # Create FastAPI app for HTTP transport
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Body
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
 app = FastAPI(
@@ -473,12 +611,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Shared metrics: request timing, loop lag and Prometheus text on /metrics
+instrument_app(app, "mcp")
+
 # Initialize MCP server
 mcp_server = ZegaMCPServer()
+app.add_event_handler("shutdown", mcp_server.close)
 
 class ToolCallRequest(BaseModel):
     name: str
     arguments: Dict[str, Any] = {}
+    stream: Optional[bool] = None  # None: stream LARGE_RESULT_TOOLS only
+    defer: bool = False            # Return a zega://results URI, run on read
 
 class ResourceRequest(BaseModel):
     uri: str
@@ -498,38 +642,126 @@ async def list_resources():
     """List all available MCP resources"""
     return {"resources": mcp_server.get_resources()}
 
+def wants_stream(name: str, stream: Optional[bool]) -> bool:
+    if not mcp_server.can_stream(name):
+        return False
+    return stream if stream is not None else name in LARGE_RESULT_TOOLS
+
+def rpc_error(request_id: Any, message: str, status: Optional[int] = None) -> Dict[str, Any]:
+    """JSON-RPC error response; `status` is the failing backend's HTTP status, if any"""
+    error = {"code": -32000, "message": message}
+    if status is not None:
+        error["data"] = {"status": status}
+    return {"jsonrpc": "2.0", "id": request_id, "error": error}
+
+async def relay_tool(name: str, arguments: Dict[str, Any], rpc: bool = False, rpc_id: Any = None) -> Response:
+    """
+    Relay the backing service's JSON body chunk by chunk (wrapped in a
+    JSON-RPC result envelope when `rpc`), so the MCP process never holds a
+    whole base64 image or audio payload. A 4xx/5xx from the backend becomes
+    a JSON-RPC error, or keeps its status on the REST endpoints.
+    """
+    stack = AsyncExitStack()
+    
+    def failure(message: str, status: int) -> Response:
+        if rpc:
+            return JSONResponse(rpc_error(rpc_id, message, status))
+        return JSONResponse({"error": message}, status_code=status)
+    
+    try:
+        status, content_type, chunks = await stack.enter_async_context(
+            mcp_server.open_tool_stream(name, arguments)
+        )
+        if status >= 400:
+            # Error bodies are small; read it for the message
+            raw = b"".join([chunk async for chunk in chunks])
+            try:
+                detail = error_detail(json.loads(raw))
+            except ValueError:
+                detail = raw.decode(errors="replace")[:500] or f"HTTP {status}"
+            await stack.aclose()
+            return failure(detail, status)
+        if not content_type.startswith("application/json"):
+            raise ValueError(f"Unexpected content type from {name}: {content_type}")
+    except Exception as e:
+        await stack.aclose()
+        return failure(str(e), 502)
+    
+    if rpc:
+        prefix = b'{"jsonrpc": "2.0", "id": ' + json.dumps(rpc_id).encode() + b', "result": '
+        suffix = b"}"
+    else:
+        prefix, suffix = b"", b""
+    
+    async def body():
+        try:
+            yield prefix
+            async for chunk in chunks:
+                yield chunk
+            yield suffix
+        finally:
+            await stack.aclose()
+    
+    return StreamingResponse(body(), media_type="application/json")
+
 @app.post("/tools/call")
 async def call_tool(request: ToolCallRequest):
     """Execute an MCP tool"""
-    result = await mcp_server.execute_tool(request.name, request.arguments)
-    return result
+    if request.defer and mcp_server.can_stream(request.name):
+        return mcp_server.defer_tool(request.name, request.arguments)
+    if wants_stream(request.name, request.stream):
+        return await relay_tool(request.name, request.arguments)
+    try:
+        return await mcp_server.execute_tool(request.name, request.arguments)
+    except UpstreamError as e:
+        return JSONResponse({"error": e.detail}, status_code=e.status)
 
 @app.post("/resources/read")
 async def read_resource(request: ResourceRequest):
-    """Read an MCP resource"""
+    """Read an MCP resource (zega://results URIs are streamed)"""
+    deferred = mcp_server.take_deferred(request.uri)
+    if deferred:
+        return await relay_tool(*deferred)
     result = await mcp_server.read_resource(request.uri)
     return result
 
 # MCP Protocol endpoints (JSON-RPC style)
-@app.post("/mcp")
-async def mcp_handler(request: Dict[str, Any]):
-    """
-    Main MCP protocol handler
-    Supports JSON-RPC style requests
-    """
+MAX_BATCH_SIZE = int(os.getenv("ZEGA_MCP_MAX_BATCH", "50"))
+BATCH_CONCURRENCY = int(os.getenv("ZEGA_MCP_BATCH_CONCURRENCY", "8"))
+
+async def handle_rpc(request: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one JSON-RPC request and build its response"""
+    if not isinstance(request, dict):
+        return {
+            "jsonrpc": "2.0",
+            "id": None,
+            "error": {"code": -32600, "message": "Invalid Request"}
+        }
+    
     method = request.get("method")
-    params = request.get("params", {})
+    params = request.get("params") or {}
     request_id = request.get("id")
     
+    # Every method here takes named parameters
+    if not isinstance(params, dict):
+        return {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "error": {"code": -32602, "message": "Invalid params: expected an object"}
+        }
+    
     try:
         if method == "tools/list":
             result = {"tools": mcp_server.get_tools()}
         
         elif method == "tools/call":
-            result = await mcp_server.execute_tool(
-                params.get("name"),
-                params.get("arguments", {})
-            )
+            if params.get("defer") and mcp_server.can_stream(params.get("name")):
+                result = mcp_server.defer_tool(params.get("name"), params.get("arguments", {}))
+            else:
+                result = await mcp_server.execute_tool(
+                    params.get("name"),
+                    params.get("arguments", {})
+                )
         
         elif method == "resources/list":
             result = {"resources": mcp_server.get_resources()}
@@ -553,12 +785,59 @@ async def mcp_handler(request: Dict[str, Any]):
             "result": result
         }
         
+    except UpstreamError as e:
+        return rpc_error(request_id, e.detail, e.status)
     except Exception as e:
+        return rpc_error(request_id, str(e))
+
+def rpc_stream_target(request: Dict[str, Any]) -> Optional[tuple]:
+    """(tool, arguments) when a single JSON-RPC request should be relayed as a stream"""
+    params = request.get("params") or {}
+    if not isinstance(params, dict):
+        return None  # handle_rpc answers with -32602
+    if request.get("method") == "tools/call" and not params.get("defer"):
+        if wants_stream(params.get("name"), params.get("stream")):
+            return params.get("name"), params.get("arguments", {})
+    elif request.get("method") == "resources/read":
+        return mcp_server.take_deferred(params.get("uri"))
+    return None
+
+@app.post("/mcp")
+async def mcp_handler(request: Union[Dict[str, Any], List[Any]] = Body(...)):
+    """
+    Main MCP protocol handler
+    Supports JSON-RPC style requests, and JSON-RPC batches (an array of
+    requests run concurrently; responses keep request order, notifications
+    without an id get none)
+    """
+    if isinstance(request, dict):
+        streamed = rpc_stream_target(request)
+        if streamed:
+            name, arguments = streamed
+            return await relay_tool(name, arguments, rpc=True, rpc_id=request.get("id"))
+        return await handle_rpc(request)
+    
+    if not request or len(request) > MAX_BATCH_SIZE:
         return {
             "jsonrpc": "2.0",
-            "id": request_id,
-            "error": {"code": -32000, "message": str(e)}
+            "id": None,
+            "error": {"code": -32600, "message": f"Batch must hold 1-{MAX_BATCH_SIZE} requests"}
         }
+    
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    
+    async def bounded(message):
+        async with semaphore:
+            return await handle_rpc(message)
+    
+    responses = await asyncio.gather(*(bounded(message) for message in request))
+    replies = [
+        response for message, response in zip(request, responses)
+        if not (isinstance(message, dict) and "id" not in message)
+    ]
+    if not replies:
+        return Response(status_code=204)
+    return replies
 
 if __name__ == "__main__":
     import uvicorn
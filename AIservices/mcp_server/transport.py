@@ -0,0 +1,132 @@
+"""
+MCP Service Transports
+How the MCP server reaches core/image/voice/docparser: over HTTP, or in-process in gateway mode
+"""
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional, Tuple
+
+# Relay granularity for streamed results
+CHUNK_SIZE = 64 * 1024
+
+class HTTPTransport:
+    """
+    Services run as separate processes; calls go over localhost HTTP.
+
+    One persistent aiohttp session (keep-alive connection pool) per backend
+    service, created on first use, so tool calls skip the TCP connect.
+    """
+    name = "http"
+
+    def __init__(self, base_urls: Dict[str, str], pool_size: int = None):
+        self.base_urls = base_urls
+        self.pool_size = pool_size or int(os.getenv("ZEGA_MCP_POOL_SIZE", "32"))
+        self.sessions: Dict[str, Any] = {}
+
+    def _session(self, service: str):
+        import aiohttp
+
+        session = self.sessions.get(service)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30)
+            )
+            self.sessions[service] = session
+        return session
+
+    async def request(
+        self,
+        service: str,
+        method: str,
+        path: str,
+        json_body: Any = None,
+        params: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None
+    ) -> Tuple[int, Any]:
+        """(status, parsed JSON body)"""
+        import aiohttp
+
+        client_timeout = aiohttp.ClientTimeout(total=timeout) if timeout else None
+        async with self._session(service).request(
+            method, f"{self.base_urls[service]}{path}", json=json_body, params=params, timeout=client_timeout
+        ) as resp:
+            return resp.status, await resp.json()
+
+    @asynccontextmanager
+    async def stream(
+        self,
+        service: str,
+        method: str,
+        path: str,
+        json_body: Any = None,
+        params: Optional[Dict[str, str]] = None
+    ):
+        """Yield (status, content type, async byte chunks) without buffering the body"""
+        async with self._session(service).request(
+            method, f"{self.base_urls[service]}{path}", json=json_body, params=params
+        ) as resp:
+            yield resp.status, resp.headers.get("content-type", ""), resp.content.iter_chunked(CHUNK_SIZE)
+
+    async def close(self):
+        sessions, self.sessions = self.sessions, {}
+        for session in sessions.values():
+            await session.close()
+
+class InProcessTransport:
+    """
+    Gateway mode: the service apps are mounted in this process, so calls are
+    handed straight to their ASGI callables. No socket, no HTTP parsing; the
+    request still goes through routing, validation and middleware.
+    """
+    name = "inprocess"
+
+    def __init__(self, apps: Dict[str, Any]):
+        import httpx
+
+        self.clients = {
+            service: httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app),
+                base_url=f"http://{service}"
+            )
+            for service, app in apps.items()
+        }
+
+    async def request(
+        self,
+        service: str,
+        method: str,
+        path: str,
+        json_body: Any = None,
+        params: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None
+    ) -> Tuple[int, Any]:
+        """(status, parsed JSON body)"""
+        response = await self.clients[service].request(
+            method, path, json=json_body, params=params, timeout=timeout
+        )
+        if not response.headers.get("content-type", "").startswith("application/json"):
+            # Same failure the HTTP transport raises for non-JSON bodies
+            raise ValueError(f"Unexpected content type from {service}{path}: {response.headers.get('content-type')}")
+        return response.status_code, json.loads(response.content)
+
+    @asynccontextmanager
+    async def stream(
+        self,
+        service: str,
+        method: str,
+        path: str,
+        json_body: Any = None,
+        params: Optional[Dict[str, str]] = None
+    ):
+        """
+        Yield (status, content type, async byte chunks). httpx's ASGI transport
+        collects the app's body before returning, so this saves the JSON
+        decode/encode round trip but not the buffer itself.
+        """
+        async with self.clients[service].stream(method, path, json=json_body, params=params) as response:
+            yield response.status_code, response.headers.get("content-type", ""), response.aiter_bytes(CHUNK_SIZE)
+
+    async def close(self):
+        for client in self.clients.values():
+            await client.aclose()
@@ -0,0 +1,22 @@
+@echo off
+echo ========================================
+echo   ZEGA AI Services - Gateway (one process)
+echo ========================================
+echo.
+
+REM Activate virtual environment if exists
+if exist "venv\Scripts\activate.bat" (
+    call venv\Scripts\activate.bat
+)
+
+if "%ZEGA_GATEWAY_PORT%"=="" set ZEGA_GATEWAY_PORT=8000
+
+echo Starting ZEGA Gateway on port %ZEGA_GATEWAY_PORT%...
+echo.
+echo   ZEGA Core:      http://localhost:%ZEGA_GATEWAY_PORT%/core
+echo   ZEGA ImageGen:  http://localhost:%ZEGA_GATEWAY_PORT%/image
+echo   ZEGA Voice:     http://localhost:%ZEGA_GATEWAY_PORT%/voice
+echo   ZEGA DocParser: http://localhost:%ZEGA_GATEWAY_PORT%/docparser
+echo   ZEGA MCP:       http://localhost:%ZEGA_GATEWAY_PORT%/mcp
+echo.
+python gateway.py
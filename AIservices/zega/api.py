@@ -4,14 +4,18 @@ from pathlib import Path
 # Add parent directory to Python path for module imports
 sys.path.insert(0, str(Path(__file__).parent))
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 from core.model import ZegaModel
 from core.model_v2 import ZegaModelV2
 from core.memory import ZegaMemory
+from core.admission import AdmissionController, AdmissionRejected, PriorityClass
+from core.tracing import start_trace, stage_histograms
+from core.telemetry import instrument_app, render_metrics, PROMETHEUS_CONTENT_TYPE
+from contextlib import nullcontext
 import os
 import json
 import asyncio
@@ -32,6 +36,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Shared metrics: request timing and loop lag; /metrics below serves the registry itself
+instrument_app(app, "core", metrics_path=None)
+
 # Initialize Core Components
 memory = ZegaMemory(persistence_path="zega_store")
 
@@ -45,6 +52,17 @@ else:
     zega = ZegaModel(memory=memory)
     print("[API] 📡 Using ZEGA v1.0 - Classic mode")
 
+# Admission control: interactive, agentic and batch work share provider quota fairly
+admission = AdmissionController()
+
+def too_busy(e: AdmissionRejected) -> HTTPException:
+    """429 with Retry-After for a full admission queue"""
+    return HTTPException(
+        status_code=429,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
 class PredictRequest(BaseModel):
     user_id: str
     context: str
@@ -56,24 +74,39 @@ class LearnRequest(BaseModel):
     text: str
     rating: float
 
+def wants_trace(header: Optional[str]) -> bool:
+    """X-Zega-Trace: 1 returns the request's span tree alongside the result"""
+    return bool(header) and header.lower() not in ("0", "false", "no")
+
 @app.post("/predict")
-async def predict(request: PredictRequest):
+async def predict(
+    request: PredictRequest,
+    x_zega_trace: Optional[str] = Header(None)
+):
     try:
-        # zega.predict is now async
-        result = await zega.predict(
-            user_id=request.user_id,
-            context=request.context,
-            instruction=request.instruction,
-            mode=request.mode
-        )
+        with start_trace() if wants_trace(x_zega_trace) else nullcontext() as trace:
+            async with admission.slot(PriorityClass.INTERACTIVE, request.user_id):
+                # zega.predict is now async
+                result = await zega.predict(
+                    user_id=request.user_id,
+                    context=request.context,
+                    instruction=request.instruction,
+                    mode=request.mode
+                )
+        if trace:
+            return {"content": result, "trace": trace.to_dict()}
         return {"content": result}
+    except AdmissionRejected as e:
+        raise too_busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/learn")
 async def learn(request: LearnRequest):
     try:
-        zega.learn(
+        # SQLite and file writes; off the event loop so lock waits don't stall other requests
+        await asyncio.to_thread(
+            zega.learn,
             user_id=request.user_id,
             text=request.text,
             feedback_score=request.rating
@@ -86,15 +119,26 @@ async def learn(request: LearnRequest):
 async def health():
     return {"status": "ZEGA is active", "version": "0.1.0-MVP"}
 
+def wants_prometheus(request: Request, format: Optional[str]) -> bool:
+    """?format=prometheus, or a scraper asking for text/plain / OpenMetrics"""
+    if format:
+        return format == "prometheus"
+    accept = request.headers.get("accept", "")
+    return ("text/plain" in accept or "openmetrics" in accept) and "application/json" not in accept
+
 @app.get("/metrics")
-async def get_metrics():
-    """Get training metrics and system stats."""
+async def get_metrics(request: Request, format: Optional[str] = None):
+    """Get training metrics and system stats (JSON, or Prometheus text for scrapers)."""
     try:
+        if wants_prometheus(request, format):
+            return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
         model_metrics = zega.get_metrics()
         memory_stats = memory.get_stats()
         return {
             "model": model_metrics,
             "memory": memory_stats,
+            "admission": admission.get_stats(),
+            "stages": stage_histograms.get_stats(),
             "status": "healthy"
         }
     except Exception as e:
@@ -120,16 +164,25 @@ if USE_V2:
         mode: str = "scene"
     
     @app.post("/predict/agentic")
-    async def predict_agentic(request: PredictAgenticRequest):
+    async def predict_agentic(
+        request: PredictAgenticRequest,
+        x_zega_trace: Optional[str] = Header(None)
+    ):
         """Agentic prediction with planning and reflection."""
         try:
-            result = await zega.predict_agentic(
-                user_id=request.user_id,
-                context=request.context,
-                instruction=request.instruction,
-                mode=request.mode
-            )
+            with start_trace() if wants_trace(x_zega_trace) else nullcontext() as trace:
+                async with admission.slot(PriorityClass.AGENTIC, request.user_id):
+                    result = await zega.predict_agentic(
+                        user_id=request.user_id,
+                        context=request.context,
+                        instruction=request.instruction,
+                        mode=request.mode
+                    )
+            if trace:
+                result["trace"] = trace.to_dict()
             return result
+        except AdmissionRejected as e:
+            raise too_busy(e)
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
     
@@ -205,15 +258,18 @@ if USE_V2:
                     detail="num_examples must be between 1 and 1000"
                 )
             
-            result = await zega.auto_train(
-                user_id=request.user_id,
-                num_examples=request.num_examples,
-                genres=request.genres,
-                store_in_memory=request.store_in_memory,
-                save_to_database=request.save_to_database
-            )
+            async with admission.slot(PriorityClass.BATCH, request.user_id):
+                result = await zega.auto_train(
+                    user_id=request.user_id,
+                    num_examples=request.num_examples,
+                    genres=request.genres,
+                    store_in_memory=request.store_in_memory,
+                    save_to_database=request.save_to_database
+                )
             
             return result
+        except AdmissionRejected as e:
+            raise too_busy(e)
         except HTTPException:
             raise
         except Exception as e:
@@ -235,26 +291,33 @@ if USE_V2:
                     detail="num_examples must be between 1 and 1000"
                 )
             
+            # Reserve a batch slot before streaming so a full queue gets a real 429
+            await admission.acquire(PriorityClass.BATCH, request.user_id)
+            
+            progress_queue = asyncio.Queue()
+            
+            async def progress_callback(progress_data: Dict[str, Any]):
+                """Callback function to receive progress updates."""
+                await progress_queue.put(progress_data)
+            
+            # Start training in background; it holds the batch slot until it ends,
+            # even if the client disconnects from the stream
+            training_task = asyncio.create_task(
+                zega.auto_train_with_progress(
+                    user_id=request.user_id,
+                    num_examples=request.num_examples,
+                    genres=request.genres,
+                    store_in_memory=request.store_in_memory,
+                    save_to_database=request.save_to_database,
+                    progress_callback=progress_callback
+                )
+            )
+            training_task.add_done_callback(
+                lambda _: admission.release(PriorityClass.BATCH)
+            )
+            
             async def generate_progress():
                 """Generate SSE events for training progress."""
-                progress_queue = asyncio.Queue()
-                
-                async def progress_callback(progress_data: Dict[str, Any]):
-                    """Callback function to receive progress updates."""
-                    await progress_queue.put(progress_data)
-                
-                # Start training in background
-                training_task = asyncio.create_task(
-                    zega.auto_train_with_progress(
-                        user_id=request.user_id,
-                        num_examples=request.num_examples,
-                        genres=request.genres,
-                        store_in_memory=request.store_in_memory,
-                        save_to_database=request.save_to_database,
-                        progress_callback=progress_callback
-                    )
-                )
-                
                 # Stream progress updates
                 while not training_task.done():
                     try:
@@ -287,6 +350,8 @@ if USE_V2:
                     "X-Accel-Buffering": "no"
                 }
             )
+        except AdmissionRejected as e:
+            raise too_busy(e)
         except HTTPException:
             raise
         except Exception as e:
@@ -307,4 +372,11 @@ if USE_V2:
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8002)
+    workers = int(os.getenv("ZEGA_WORKERS", "1"))
+    if workers > 1:
+        # Counters, adapters and profiles are multi-process safe; Chroma needs a server
+        if not os.getenv("ZEGA_CHROMA_URL"):
+            print("[API] ⚠️ ZEGA_WORKERS > 1 without ZEGA_CHROMA_URL: embedded Chroma is single-process")
+        uvicorn.run("api:app", app_dir=str(Path(__file__).parent), host="0.0.0.0", port=8002, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8002)
@@ -0,0 +1,367 @@
+"""
+Mock Provider Server for ZEGA Benchmarks
+Imitates Ollama /api/generate, Groq chat completions, HF inference, Gemini and Replicate predictions locally
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import time
+import struct
+import urllib.request
+import uuid
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional
+import aiohttp
+from aiohttp import web
+
+# Models the ensemble looks for in Ollama /api/tags
+DEFAULT_OLLAMA_MODELS = [
+    "llama3.1:8b-instruct-q4_K_M",
+    "mistral:7b-instruct-v0.3-q4_K_M",
+    "phi3.5:3.8b-mini-instruct-q4_K_M",
+]
+
+def tiny_png(width: int = 64, height: int = 48) -> bytes:
+    """Valid grey PNG so downstream encoders/decoders behave normally"""
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    raw = b"".join(b"\x00" + b"\x80" * width for _ in range(height))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
+
+def signed_webhook_headers(body: bytes) -> Dict[str, str]:
+    """Standard Webhooks headers signed with REPLICATE_WEBHOOK_SECRET, as Replicate sends them"""
+    secret = os.getenv("REPLICATE_WEBHOOK_SECRET")
+    if not secret:
+        return {}
+    webhook_id, timestamp = f"msg_{uuid.uuid4().hex}", str(int(time.time()))
+    key = base64.b64decode(secret.split("_", 1)[1] if secret.startswith("whsec_") else secret)
+    digest = hmac.new(key, f"{webhook_id}.{timestamp}.".encode() + body, hashlib.sha256).digest()
+    return {
+        "webhook-id": webhook_id,
+        "webhook-timestamp": timestamp,
+        "webhook-signature": f"v1,{base64.b64encode(digest).decode()}",
+    }
+
+@dataclass
+class ProviderBehavior:
+    """
+    Latency and failure model for one mock provider.
+
+    latency: "fixed:MS", "uniform:LO:HI", "exp:MEAN" or "lognormal:MEDIAN:SIGMA" (milliseconds)
+    """
+    latency: str = "fixed:50"
+    error_rate: float = 0.0        # HTTP 500
+    rate_limit_rate: float = 0.0   # HTTP 429 (503 "model loading" for HF)
+    timeout_rate: float = 0.0      # Hang for hang_seconds so the client times out
+    hang_seconds: float = 65.0
+
+    def sample_latency(self) -> float:
+        """Seconds to wait before answering"""
+        kind, *args = self.latency.split(":")
+        values = [float(a) for a in args]
+        if kind == "fixed":
+            ms = values[0]
+        elif kind == "uniform":
+            ms = random.uniform(values[0], values[1])
+        elif kind == "exp":
+            ms = random.expovariate(1.0 / values[0])
+        elif kind == "lognormal":
+            ms = random.lognormvariate(0, values[1]) * values[0]
+        else:
+            raise ValueError(f"Unknown latency distribution: {self.latency}")
+        return max(ms, 0.0) / 1000.0
+
+    def sample_outcome(self) -> str:
+        """ok | error | rate_limited | timeout"""
+        roll = random.random()
+        if roll < self.timeout_rate:
+            return "timeout"
+        roll -= self.timeout_rate
+        if roll < self.rate_limit_rate:
+            return "rate_limited"
+        roll -= self.rate_limit_rate
+        if roll < self.error_rate:
+            return "error"
+        return "ok"
+
+@dataclass
+class MockProviderServer:
+    """aiohttp app serving every provider API on one port"""
+    behaviors: Dict[str, ProviderBehavior] = field(default_factory=dict)
+    ollama_models: List[str] = field(default_factory=lambda: list(DEFAULT_OLLAMA_MODELS))
+    host: str = "127.0.0.1"
+    port: int = 0
+
+    def __post_init__(self):
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._runner: Optional[web.AppRunner] = None
+        self.predictions: Dict[str, Dict[str, Any]] = {}
+        self._prediction_tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment variables that point ZEGA teachers at this server"""
+        return {
+            "OLLAMA_BASE_URL": self.base_url,
+            "GROQ_BASE_URL": f"{self.base_url}/openai/v1",
+            "HF_INFERENCE_URL": f"{self.base_url}/models",
+            "GROQ_API_KEY": "bench",
+            "HUGGINGFACEHUB_API_TOKEN": "bench",
+            "REPLICATE_API_URL": f"{self.base_url}/replicate/v1",
+        }
+
+    def build_app(self) -> web.Application:
+        app = web.Application(client_max_size=8 * 1024 * 1024)
+        app.router.add_get("/api/tags", self._ollama_tags)
+        app.router.add_post("/api/generate", self._ollama_generate)
+        app.router.add_post("/openai/v1/chat/completions", self._groq_chat)
+        app.router.add_post("/models/{model:.+}", self._hf_inference)
+        app.router.add_post("/v1beta/models/{model}:generateContent", self._gemini_generate)
+        app.router.add_post("/replicate/v1/predictions", self._replicate_create)
+        app.router.add_get("/replicate/v1/predictions/{id}", self._replicate_get)
+        app.router.add_post("/replicate/v1/predictions/{id}/cancel", self._replicate_cancel)
+        app.router.add_get("/replicate/files/{id}.png", self._replicate_file)
+        return app
+
+    async def start(self):
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # Port 0 -> pick up the port the OS assigned
+        self.port = site._server.sockets[0].getsockname()[1]
+        print(f"[MOCK] 🧪 Mock providers listening on {self.base_url}")
+
+    async def stop(self):
+        for task in self._prediction_tasks.values():
+            task.cancel()
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        return {provider: dict(outcomes) for provider, outcomes in self.stats.items()}
+
+    # === Shared behavior ===
+
+    async def _simulate(self, provider: str) -> Optional[web.Response]:
+        """Apply latency/failures; returns an error response or None to proceed"""
+        behavior = self.behaviors.get(provider, ProviderBehavior())
+        outcome = behavior.sample_outcome()
+        self.stats[provider][outcome] += 1
+
+        if outcome == "timeout":
+            await asyncio.sleep(behavior.hang_seconds)
+            return web.json_response({"error": "mock timeout"}, status=504)
+
+        await asyncio.sleep(behavior.sample_latency())
+
+        if outcome == "rate_limited":
+            if provider == "huggingface":
+                return web.json_response({"error": "Model is currently loading"}, status=503)
+            return web.json_response(
+                {"error": {"message": "Rate limit reached", "type": "rate_limit"}},
+                status=429,
+                headers={"Retry-After": "1"}
+            )
+        if outcome == "error":
+            return web.json_response({"error": "mock internal error"}, status=500)
+        return None
+
+    @staticmethod
+    def _fake_completion(system: str, prompt: str, max_tokens: Optional[int]) -> str:
+        """Output shaped like what each ZEGA mode expects"""
+        system = system or ""
+        if "JSON array" in system:
+            if "titles" in system:
+                return json.dumps(["The Last Star", "Beyond the Void", "Eternal Night",
+                                   "Shadow's Edge", "Rising Dawn"])
+            return json.dumps(["Fantasy", "Adventure"])
+        if "raw JSON object" in system:
+            return json.dumps({
+                "title": "The Meeting",
+                "content": "The hero walked into the hall. " * 20,
+                "new_characters": [{"name": "Alice", "role": "Mentor",
+                                    "description": "Wise sage", "popularity": 7}],
+                "existing_characters_used": []
+            })
+        if '"tasks"' in prompt:
+            return json.dumps({"tasks": [
+                {"task_id": "task_1", "task_type": "style_analysis",
+                 "description": "Retrieve user style", "dependencies": [], "tool": "retrieve_user_style"},
+                {"task_id": "task_2", "task_type": "story_generation",
+                 "description": "Generate story content", "dependencies": ["task_1"],
+                 "tool": "generate_with_ensemble"},
+                {"task_id": "task_3", "task_type": "quality_evaluation",
+                 "description": "Evaluate quality", "dependencies": ["task_2"], "tool": "evaluate_quality"},
+            ]})
+        if "Return JSON" in prompt:
+            return json.dumps({"quality_score": 8, "overall": 8, "feedback": "mock"})
+        words = min(max_tokens or 256, 400)
+        return " ".join(["lorem"] * words)
+
+    # === Ollama ===
+
+    async def _ollama_tags(self, request: web.Request) -> web.Response:
+        return web.json_response({"models": [{"name": m} for m in self.ollama_models]})
+
+    async def _ollama_generate(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        failure = await self._simulate("ollama")
+        if failure:
+            return failure
+        options = body.get("options", {})
+        text = self._fake_completion(body.get("system"), body.get("prompt", ""), options.get("num_predict"))
+        return web.json_response({"model": body.get("model"), "response": text, "done": True})
+
+    # === Groq (OpenAI-compatible) ===
+
+    async def _groq_chat(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        failure = await self._simulate("groq")
+        if failure:
+            return failure
+        messages = body.get("messages", [])
+        system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        prompt = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+        text = self._fake_completion(system, prompt, body.get("max_tokens"))
+        return web.json_response({
+            "id": "mock",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                         "finish_reason": "stop"}]
+        })
+
+    # === HuggingFace inference ===
+
+    async def _hf_inference(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        failure = await self._simulate("huggingface")
+        if failure:
+            return failure
+        inputs = body.get("inputs", "")
+        max_new = body.get("parameters", {}).get("max_new_tokens")
+        text = self._fake_completion(inputs, inputs, max_new)
+        return web.json_response([{"generated_text": text}])
+
+    # === Gemini (the SDK is not HTTP-configurable; see MockGeminiModel) ===
+
+    async def _gemini_generate(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        failure = await self._simulate("gemini")
+        if failure:
+            return failure
+        prompt = body["contents"][0]["parts"][0]["text"]
+        config = body.get("generationConfig", {})
+        text = self._fake_completion(prompt, prompt, config.get("max_output_tokens"))
+        return web.json_response({"candidates": [{"content": {"parts": [{"text": text}]}}]})
+
+    # === Replicate (async predictions: create, then poll or receive a webhook) ===
+
+    async def _replicate_create(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        prediction_id = uuid.uuid4().hex[:16]
+        url = f"{self.base_url}/replicate/v1/predictions/{prediction_id}"
+        prediction = {
+            "id": prediction_id,
+            "version": body.get("version"),
+            "input": body.get("input", {}),
+            "status": "starting",
+            "output": None,
+            "error": None,
+            "urls": {"get": url, "cancel": f"{url}/cancel"},
+        }
+        self.predictions[prediction_id] = prediction
+        self._prediction_tasks[prediction_id] = asyncio.create_task(
+            self._replicate_run(prediction, body.get("webhook"))
+        )
+        return web.json_response(prediction, status=201)
+
+    async def _replicate_run(self, prediction: Dict[str, Any], webhook: Optional[str]):
+        """Latency is the time to finish; failures show up as a failed prediction"""
+        behavior = self.behaviors.get("replicate", ProviderBehavior())
+        outcome = behavior.sample_outcome()
+        self.stats["replicate"][outcome] += 1
+        try:
+            prediction["status"] = "processing"
+            if outcome == "timeout":
+                await asyncio.sleep(behavior.hang_seconds)
+            await asyncio.sleep(behavior.sample_latency())
+            if outcome == "ok":
+                prediction["status"] = "succeeded"
+                prediction["output"] = [f"{self.base_url}/replicate/files/{prediction['id']}.png"]
+            else:
+                prediction["status"] = "failed"
+                prediction["error"] = f"mock {outcome}"
+            if webhook:
+                body = json.dumps(prediction).encode()
+                async with aiohttp.ClientSession() as session:
+                    await session.post(webhook, data=body, headers={
+                        "Content-Type": "application/json", **signed_webhook_headers(body)
+                    })
+        except asyncio.CancelledError:
+            pass
+        except aiohttp.ClientError as e:
+            print(f"[MOCK] ⚠️ Replicate webhook delivery failed: {e}")
+        finally:
+            self._prediction_tasks.pop(prediction["id"], None)
+
+    async def _replicate_get(self, request: web.Request) -> web.Response:
+        prediction = self.predictions.get(request.match_info["id"])
+        if prediction is None:
+            return web.json_response({"detail": "Not found."}, status=404)
+        return web.json_response(prediction)
+
+    async def _replicate_cancel(self, request: web.Request) -> web.Response:
+        prediction = self.predictions.get(request.match_info["id"])
+        if prediction is None:
+            return web.json_response({"detail": "Not found."}, status=404)
+        task = self._prediction_tasks.pop(prediction["id"], None)
+        if task:
+            task.cancel()
+            prediction["status"] = "canceled"
+            self.stats["replicate"]["canceled"] += 1
+        return web.json_response(prediction)
+
+    async def _replicate_file(self, request: web.Request) -> web.Response:
+        return web.Response(body=tiny_png(), content_type="image/png")
+
+class _GeminiResult:
+    def __init__(self, text: str):
+        self.text = text
+
+class MockGeminiModel:
+    """
+    Stand-in for genai.GenerativeModel: blocking generate_content() against the
+    mock server, so it runs in asyncio.to_thread exactly like the real SDK
+    """
+    def __init__(self, base_url: str, model_name: str = "gemini-2.0-flash", timeout: float = 30.0):
+        self.url = f"{base_url}/v1beta/models/{model_name}:generateContent"
+        self.timeout = timeout
+
+    def generate_content(self, prompt: str, generation_config: Dict[str, Any] = None) -> _GeminiResult:
+        payload = json.dumps({
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": generation_config or {}
+        }).encode()
+        request = urllib.request.Request(
+            self.url, data=payload, headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            result = json.loads(response.read())
+        return _GeminiResult(result["candidates"][0]["content"]["parts"][0]["text"])
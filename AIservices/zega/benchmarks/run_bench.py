@@ -0,0 +1,247 @@
+"""
+ZEGA Ensemble Benchmark
+Drives generate_with_voting / predict / predict_agentic against the mock providers
+
+Usage (from the zega directory, no network needed):
+    python -m benchmarks.run_bench --target predict --mode genre_selection -c 16 -n 200
+    python -m benchmarks.run_bench --target ensemble --groq "lognormal:400:0.5" --groq-429 0.2
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Make core.* importable the same way api.py does
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.mock_providers import MockProviderServer, MockGeminiModel, ProviderBehavior
+
+PROVIDERS = ("gemini", "groq", "ollama", "huggingface")
+
+SAMPLE_CONTEXT = (
+    "The wizard raised his staff as the dragon circled the ruined castle. "
+    "Far below, the kingdom's last knights prepared their swords for battle."
+)
+
+MODE_INSTRUCTIONS = {
+    "genre_selection": "Select from these genres: Fantasy, Adventure, Horror, Romance, Sci-Fi",
+    "title_ideas": "Suggest titles for this story",
+    "scene_structured": "Write the next scene",
+}
+
+class BenchMemory:
+    """In-process stand-in for ZegaMemory so runs measure providers, not ChromaDB"""
+
+    def __init__(self):
+        self.experiences: Dict[str, List[str]] = {}
+
+    def add_experience(self, user_id: str, text: str, metadata: Dict[str, Any]):
+        self.experiences.setdefault(user_id, []).append(text)
+
+    def retrieve_context(self, user_id: str, query: str, n_results: int = 5) -> List[str]:
+        return self.experiences.get(user_id, [])[-n_results:]
+
+    def get_user_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"total_documents": sum(len(v) for v in self.experiences.values())}
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (values need not be sorted)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[rank]
+
+async def run_load(
+    call: Callable[[int], Awaitable[Any]],
+    total: int,
+    concurrency: int
+) -> Dict[str, Any]:
+    """Closed-loop load: `concurrency` workers issue `total` calls between them"""
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                result = await call(i)
+                if isinstance(result, str) and result.startswith("Error"):
+                    raise RuntimeError(result[:80])
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                key = str(e)[:80]
+                errors[key] = errors.get(key, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "ok": len(latencies),
+        "errors": sum(errors.values()),
+        "error_breakdown": errors,
+        "duration_s": round(duration, 3),
+        "rps": round(len(latencies) / duration, 2) if duration else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(max(latencies, default=0.0) * 1000, 1),
+    }
+
+def build_behaviors(args: argparse.Namespace) -> Dict[str, ProviderBehavior]:
+    return {
+        provider: ProviderBehavior(
+            latency=getattr(args, provider),
+            error_rate=getattr(args, f"{provider}_errors"),
+            rate_limit_rate=getattr(args, f"{provider}_429"),
+            timeout_rate=getattr(args, f"{provider}_timeouts"),
+            hang_seconds=args.hang_seconds
+        )
+        for provider in PROVIDERS
+    }
+
+def make_call(args: argparse.Namespace, model) -> Callable[[int], Awaitable[Any]]:
+    """Request factory; unique prompts unless --same-prompt (which exercises coalescing)"""
+    instruction = MODE_INSTRUCTIONS.get(args.mode)
+
+    def context_for(i: int) -> str:
+        return SAMPLE_CONTEXT if args.same_prompt else f"{SAMPLE_CONTEXT} (request {i})"
+
+    def user_for(i: int) -> str:
+        return f"bench-user-{i % args.users}"
+
+    if args.target == "ensemble":
+        return lambda i: model.ensemble.generate_with_voting(
+            prompt=context_for(i), instruction=instruction, mode=args.mode
+        )
+    if args.target == "predict":
+        return lambda i: model.predict(
+            user_id=user_for(i), context=context_for(i), instruction=instruction, mode=args.mode
+        )
+    return lambda i: model.predict_agentic(
+        user_id=user_for(i), context=context_for(i), instruction=instruction, mode=args.mode
+    )
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    server = MockProviderServer(behaviors=build_behaviors(args))
+    await server.start()
+    os.environ.update(server.env())
+    os.environ.pop("GOOGLE_API_KEY", None)  # Gemini is injected below instead of via the SDK
+
+    # Imported after the env points at the mock server (teachers read it at init)
+    from core.model_v2 import ZegaModelV2
+
+    verbose = args.verbose
+    log_sink = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+
+    try:
+        with log_sink:
+            # Built off-loop: the ensemble's Ollama check is a blocking call to this loop's server
+            model = await asyncio.to_thread(
+                ZegaModelV2, memory=BenchMemory(), checkpoint_dir="zega_checkpoints"
+            )
+            if "gemini" not in args.disable:
+                model.ensemble.teachers.insert(0, {
+                    "name": "gemini-2.0-flash",
+                    "model": MockGeminiModel(server.base_url),
+                    "provider": "gemini",
+                    "role": "judge",
+                    "strength": "quality",
+                    "speed": "medium"
+                })
+            model.ensemble.teachers = [
+                t for t in model.ensemble.teachers if t["provider"] not in args.disable
+            ]
+            teachers = [t["name"] for t in model.ensemble.teachers]
+
+            call = make_call(args, model)
+            if args.warmup:
+                await run_load(call, args.warmup, min(args.concurrency, args.warmup))
+                server.stats.clear()
+
+            report = await run_load(call, args.requests, args.concurrency)
+    finally:
+        await server.stop()
+
+    report.update({
+        "target": args.target,
+        "mode": args.mode,
+        "concurrency": args.concurrency,
+        "teachers": teachers,
+        "provider_calls": server.get_stats(),
+        "coalescing": {
+            "predict": model.singleflight.get_stats(),
+            "ensemble": model.ensemble.singleflight.get_stats()
+        }
+    })
+    return report
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n[BENCH] 📊 {report['target']} / {report['mode']} @ concurrency {report['concurrency']}")
+    print(f"[BENCH] Teachers: {', '.join(report['teachers']) or 'none'}")
+    print(f"[BENCH] Requests: {report['requests']}  ok: {report['ok']}  errors: {report['errors']}  "
+          f"duration: {report['duration_s']}s  throughput: {report['rps']} req/s")
+    print(f"[BENCH] Latency ms  p50: {report['p50_ms']}  p95: {report['p95_ms']}  "
+          f"p99: {report['p99_ms']}  max: {report['max_ms']}")
+    for provider, outcomes in sorted(report["provider_calls"].items()):
+        summary = "  ".join(f"{k}: {v}" for k, v in sorted(outcomes.items()))
+        print(f"[BENCH]   {provider:<12} {summary}")
+    for error, count in report["error_breakdown"].items():
+        print(f"[BENCH] ❌ {count}x {error}")
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline ZEGA ensemble benchmark")
+    parser.add_argument("--target", choices=["ensemble", "predict", "agentic"], default="predict")
+    parser.add_argument("--mode", default="continuation")
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("-n", "--requests", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--users", type=int, default=4, help="Distinct user ids to rotate through")
+    parser.add_argument("--same-prompt", action="store_true", help="Identical prompts (measures coalescing)")
+    parser.add_argument("--disable", nargs="*", default=[], choices=PROVIDERS, help="Providers to leave out")
+    parser.add_argument("--hang-seconds", type=float, default=65.0, help="How long a simulated timeout hangs")
+    parser.add_argument("--json", dest="json_out", help="Also write the report to this file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Keep ZEGA's own logging")
+
+    defaults = {"gemini": "lognormal:900:0.3", "groq": "lognormal:400:0.3",
+                "ollama": "lognormal:1500:0.4", "huggingface": "lognormal:8000:0.5"}
+    for provider in PROVIDERS:
+        parser.add_argument(f"--{provider}", default=defaults[provider],
+                            help="Latency: fixed:MS | uniform:LO:HI | exp:MEAN | lognormal:MEDIAN:SIGMA")
+        parser.add_argument(f"--{provider}-errors", type=float, default=0.0)
+        parser.add_argument(f"--{provider}-429", type=float, default=0.0)
+        parser.add_argument(f"--{provider}-timeouts", type=float, default=0.0)
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    # Checkpoints, adapters and fine-tune data land in a throwaway directory
+    with tempfile.TemporaryDirectory(prefix="zega-bench-") as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            report = asyncio.run(run(args))
+        finally:
+            os.chdir(cwd)
+
+    print_report(report)
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[BENCH] 💾 Report written to {args.json_out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""
+Admission Control for the ZEGA Core API
+Priority classes (interactive, agentic, batch) with weighted fair queuing per user
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Deque, Dict, Any, Optional, Tuple
+from .tracing import span
+from .telemetry import registry
+
+ADMISSION_QUEUED = registry.gauge(
+    "zega_admission_queued", "Requests waiting for an admission slot", ["priority"])
+ADMISSION_RUNNING = registry.gauge(
+    "zega_admission_running", "Requests holding an admission slot", ["priority"])
+ADMISSION_REJECTED = registry.counter(
+    "zega_admission_rejected_total", "Requests rejected with 429 by admission control", ["priority"])
+
+class PriorityClass(Enum):
+    INTERACTIVE = "interactive"   # Editor completions (/predict)
+    AGENTIC = "agentic"           # Plan/execute/reflect runs (/predict/agentic)
+    BATCH = "batch"               # Auto-training jobs (/auto-train*)
+
+class AdmissionRejected(Exception):
+    """Queue for this priority class is full"""
+    def __init__(self, priority: PriorityClass, retry_after: int):
+        self.priority = priority
+        self.retry_after = retry_after
+        super().__init__(f"{priority.value} queue is full, retry after {retry_after}s")
+
+@dataclass
+class ClassConfig:
+    """Limits and share for one priority class"""
+    weight: float          # Share of free slots relative to other classes
+    max_concurrent: int    # Cap on running requests of this class
+    max_queue: int         # Waiting requests beyond this are rejected with 429
+
+@dataclass
+class _UserQueue:
+    waiters: Deque[Tuple[asyncio.Future, float]] = field(default_factory=deque)
+    vpass: float = 0.0
+
+@dataclass
+class _ClassState:
+    config: ClassConfig
+    users: Dict[str, _UserQueue] = field(default_factory=dict)
+    running: int = 0
+    queued: int = 0
+    vpass: float = 0.0
+    vtime: float = 0.0
+    avg_service: float = 1.0
+    admitted: int = 0
+    rejected: int = 0
+    waited: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+
+DEFAULT_CLASSES = {
+    PriorityClass.INTERACTIVE: ClassConfig(weight=8, max_concurrent=8, max_queue=64),
+    PriorityClass.AGENTIC: ClassConfig(weight=3, max_concurrent=4, max_queue=32),
+    PriorityClass.BATCH: ClassConfig(weight=1, max_concurrent=1, max_queue=8),
+}
+
+class AdmissionController:
+    """
+    Shares `total_slots` concurrent provider-bound requests between priority classes.
+
+    Free slots go to the eligible class with the lowest virtual pass (stride
+    scheduling by class weight), and inside a class to the user with the lowest
+    pass (stride scheduling by user weight). A user queueing many requests only
+    advances their own pass, so other users' requests keep getting through.
+    """
+
+    def __init__(
+        self,
+        total_slots: int = None,
+        classes: Dict[PriorityClass, ClassConfig] = None
+    ):
+        self.total_slots = total_slots or int(os.getenv("ZEGA_ADMISSION_SLOTS", "8"))
+        self.classes = {
+            p: _ClassState(config=c) for p, c in (classes or DEFAULT_CLASSES).items()
+        }
+        self.user_weights: Dict[str, float] = {}
+        self.running = 0
+
+        # Read at scrape time so the gauges never drift from the scheduler state
+        for priority, state in self.classes.items():
+            ADMISSION_QUEUED.labels(priority.value).set_function(lambda s=state: s.queued)
+            ADMISSION_RUNNING.labels(priority.value).set_function(lambda s=state: s.running)
+
+    def set_user_weight(self, user_id: str, weight: float):
+        """Give a user a larger (or smaller) share inside each class"""
+        self.user_weights[user_id] = max(weight, 0.01)
+
+    async def acquire(self, priority: PriorityClass, user_id: str):
+        """Wait for a slot; raises AdmissionRejected when the class queue is full"""
+        state = self.classes[priority]
+
+        if state.queued == 0 and self._has_capacity(state):
+            self._grant(state)
+            return
+
+        if state.queued >= state.config.max_queue:
+            state.rejected += 1
+            ADMISSION_REJECTED.labels(priority.value).inc()
+            raise AdmissionRejected(priority, self._retry_after(state))
+
+        if state.queued == 0:
+            # Re-activating class: no credit banked while idle, like users below
+            active = [s.vpass for s in self.classes.values() if s.queued > 0]
+            if active:
+                state.vpass = max(state.vpass, min(active))
+
+        user = state.users.get(user_id)
+        if user is None:
+            # New users start at the class's virtual time (no banked credit)
+            user = _UserQueue(vpass=state.vtime)
+            state.users[user_id] = user
+        elif not user.waiters:
+            user.vpass = max(user.vpass, state.vtime)
+
+        future = asyncio.get_running_loop().create_future()
+        enqueued_at = time.monotonic()
+        user.waiters.append((future, enqueued_at))
+        state.queued += 1
+
+        try:
+            with span("admission_wait", priority=priority.value):
+                await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted just before cancellation
+                self.release(priority)
+            else:
+                self._remove_waiter(state, user_id, future)
+            raise
+
+        wait = time.monotonic() - enqueued_at
+        state.waited += 1
+        state.wait_total += wait
+        state.wait_max = max(state.wait_max, wait)
+
+    def release(self, priority: PriorityClass, service_time: Optional[float] = None):
+        """Return a slot and hand it to the next waiter"""
+        state = self.classes[priority]
+        state.running -= 1
+        self.running -= 1
+        if service_time is not None:
+            state.avg_service = 0.8 * state.avg_service + 0.2 * service_time
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: PriorityClass, user_id: str):
+        """`async with admission.slot(...)` around provider-bound work"""
+        await self.acquire(priority, user_id)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(priority, time.monotonic() - started)
+
+    def _has_capacity(self, state: _ClassState) -> bool:
+        return self.running < self.total_slots and state.running < state.config.max_concurrent
+
+    def _grant(self, state: _ClassState):
+        state.running += 1
+        state.admitted += 1
+        self.running += 1
+
+    def _dispatch(self):
+        """Hand free slots to waiters: class by weight, then user by weight"""
+        while self.running < self.total_slots:
+            eligible = [
+                s for s in self.classes.values()
+                if s.queued > 0 and s.running < s.config.max_concurrent
+            ]
+            if not eligible:
+                return
+
+            state = min(eligible, key=lambda s: s.vpass)
+            state.vpass += 1.0 / state.config.weight
+
+            user_id, user = min(
+                ((uid, u) for uid, u in state.users.items() if u.waiters),
+                key=lambda item: item[1].vpass
+            )
+            future, _ = user.waiters.popleft()
+            state.queued -= 1
+            state.vtime = user.vpass
+            user.vpass += 1.0 / self.user_weights.get(user_id, 1.0)
+            if not user.waiters:
+                del state.users[user_id]
+
+            if future.done():
+                continue  # Cancelled while queued
+            self._grant(state)
+            future.set_result(None)
+
+    def _remove_waiter(self, state: _ClassState, user_id: str, future: asyncio.Future):
+        user = state.users.get(user_id)
+        if not user:
+            return
+        for item in list(user.waiters):
+            if item[0] is future:
+                user.waiters.remove(item)
+                state.queued -= 1
+                break
+        if not user.waiters:
+            del state.users[user_id]
+
+    def _retry_after(self, state: _ClassState) -> int:
+        """Rough time until the queue drains enough to accept new work"""
+        per_slot = max(state.config.max_concurrent, 1)
+        return max(1, math.ceil(state.avg_service * state.queued / per_slot))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth, admissions, rejections and queue-wait per class"""
+        return {
+            "total_slots": self.total_slots,
+            "running": self.running,
+            "classes": {
+                p.value: {
+                    "running": s.running,
+                    "queued": s.queued,
+                    "waiting_users": len(s.users),
+                    "admitted": s.admitted,
+                    "rejected": s.rejected,
+                    "avg_queue_wait": round(s.wait_total / s.waited, 3) if s.waited else 0.0,
+                    "max_queue_wait": round(s.wait_max, 3),
+                    "avg_service_time": round(s.avg_service, 3),
+                    "max_concurrent": s.config.max_concurrent,
+                    "max_queue": s.config.max_queue
+                }
+                for p, s in self.classes.items()
+            }
+        }
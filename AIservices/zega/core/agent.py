@@ -4,9 +4,13 @@ Autonomous agent with multi-model ensemble, planning, and tool use
 """
 import asyncio
 import json
+import time
 from typing import List, Dict, Any, Optional
 from enum import Enum
 from dataclasses import dataclass, field
+from .json_repair import parse_structured
+from .tracing import span
+from .telemetry import CACHE_REQUESTS
 
 class AgentState(Enum):
     IDLE = "idle"
@@ -60,6 +64,11 @@ class ZegaAgent:
         self.current_plan: Optional[AgentPlan] = None
         self.tool_registry = self._init_tools()
         
+        # Per-user routing and caches (kept alive by AgentSessionPool)
+        self.preferred_model: Optional[str] = None
+        self.style_cache: Dict[str, tuple] = {}
+        self.style_cache_ttl = 300.0
+        
     def _init_tools(self) -> Dict[str, callable]:
         """Initialize available tools for the agent"""
         return {
@@ -78,6 +87,13 @@ class ZegaAgent:
         """
         self.state = AgentState.PLANNING
         
+        # Reuse the last LLM plan for the same mode instead of re-planning
+        if self._can_reuse_plan(context):
+            plan = self._clone_plan(self.current_plan, goal, context)
+            self.current_plan = plan
+            print(f"[AGENT] ♻️ Reusing plan with {len(plan.tasks)} tasks")
+            return plan
+        
         planning_prompt = f"""You are ZEGA, an autonomous AI agent for story generation.
 Your goal: {goal}
 
@@ -113,7 +129,9 @@ Return a JSON plan with this structure:
         )
         
         try:
-            plan_data = json.loads(plan_response)
+            plan_data = parse_structured("planning", plan_response)
+            if plan_data is None:
+                raise ValueError("No usable plan JSON in response")
             tasks = [
                 AgentTask(
                     task_id=t["task_id"],
@@ -139,7 +157,37 @@ Return a JSON plan with this structure:
         except Exception as e:
             print(f"[AGENT] ⚠️ Planning failed: {e}")
             # Fallback to default plan
-            return self._create_default_plan(goal, context)
+            plan = self._create_default_plan(goal, context)
+            self.current_plan = plan
+            return plan
+    
+    def _can_reuse_plan(self, context: Dict[str, Any]) -> bool:
+        """Only LLM-generated plans for the same mode are worth reusing"""
+        plan = self.current_plan
+        return (
+            plan is not None
+            and not plan.plan_id.startswith("default_plan_")
+            and plan.context.get("mode") == context.get("mode")
+        )
+    
+    def _clone_plan(self, plan: AgentPlan, goal: str, context: Dict[str, Any]) -> AgentPlan:
+        """Copy task layout of an existing plan into a fresh plan"""
+        tasks = [
+            AgentTask(
+                task_id=t.task_id,
+                task_type=t.task_type,
+                description=t.description,
+                dependencies=list(t.dependencies),
+                metadata=dict(t.metadata)
+            )
+            for t in plan.tasks
+        ]
+        return AgentPlan(
+            plan_id=f"plan_{asyncio.get_event_loop().time()}",
+            goal=goal,
+            tasks=tasks,
+            context=context
+        )
     
     def _create_default_plan(self, goal: str, context: Dict[str, Any]) -> AgentPlan:
         """Fallback plan if LLM planning fails"""
@@ -177,7 +225,8 @@ Return a JSON plan with this structure:
                 tool = self.tool_registry.get(tool_name)
                 
                 if tool:
-                    result = await tool(task, plan.context, results)
+                    with span(f"agent_tool.{tool_name}"):
+                        result = await tool(task, plan.context, results)
                     task.result = result
                     task.status = "completed"
                     results[task.task_id] = result
@@ -221,21 +270,38 @@ Return JSON:
             mode="reflection"
         )
         
-        try:
-            return json.loads(reflection)
-        except:
+        parsed = parse_structured("reflection", reflection)
+        if parsed is None:
             return {"quality_score": 7, "note": "Reflection parsing failed"}
+        return parsed
     
     # Tool implementations
     async def _tool_retrieve_style(self, task: AgentTask, context: Dict, results: Dict) -> Dict:
         """Tool: Retrieve user's writing style from memory"""
         query = context.get("prompt", "writing style")
+        
+        cached = self.style_cache.get(query)
+        if cached and time.time() - cached[0] < self.style_cache_ttl:
+            CACHE_REQUESTS.labels("style", "hit").inc()
+            return cached[1]
+        CACHE_REQUESTS.labels("style", "miss").inc()
+        
         style_examples = self.memory.retrieve_context(self.user_id, query, n_results=5)
         
-        return {
+        style = {
             "style_examples": style_examples,
             "user_profile": self.memory.get_user_profile(self.user_id)
         }
+        
+        # Bounded cache: keep only the most recent queries
+        if len(self.style_cache) >= 32:
+            self.style_cache.pop(next(iter(self.style_cache)))
+        self.style_cache[query] = (time.time(), style)
+        return style
+    
+    def clear_style_cache(self):
+        """Forget cached style retrieval (memory changed)"""
+        self.style_cache.clear()
     
     async def _tool_generate_ensemble(self, task: AgentTask, context: Dict, results: Dict) -> str:
         """Tool: Generate using ensemble of all models"""
@@ -244,13 +310,27 @@ Return JSON:
         
         prompt = context.get("prompt", "")
         instruction = context.get("instruction", "")
+        mode = context.get("mode", "scene")
+        
+        # Prefer the user's fine-tuned model when one exists
+        if self.preferred_model:
+            try:
+                return await self.ensemble.generate_with_custom_model(
+                    prompt=prompt,
+                    model_name=self.preferred_model,
+                    instruction=instruction,
+                    style_context=style_context,
+                    mode=mode
+                )
+            except Exception as e:
+                print(f"[AGENT] ⚠️ {self.preferred_model} failed, using ensemble: {e}")
         
         # Use ensemble controller
         return await self.ensemble.generate_with_voting(
             prompt=prompt,
             instruction=instruction,
             style_context=style_context,
-            mode=context.get("mode", "scene")
+            mode=mode
         )
     
     async def _tool_evaluate_quality(self, task: AgentTask, context: Dict, results: Dict) -> Dict:
@@ -284,10 +364,10 @@ Return JSON:
             mode="evaluation"
         )
         
-        try:
-            return json.loads(evaluation)
-        except:
+        parsed = parse_structured("evaluation", evaluation)
+        if parsed is None:
             return {"overall": 7, "note": "Could not parse evaluation"}
+        return parsed
     
     async def _tool_select_model(self, task: AgentTask, context: Dict, results: Dict) -> str:
         """Tool: Select best model for specific task"""
@@ -319,6 +399,7 @@ Return JSON:
         quality = results.get("task_3", {}).get("overall", 7)
         
         if quality >= 6:  # Only store good content
+            self.clear_style_cache()
             self.memory.add_experience(
                 user_id=self.user_id,
                 text=content,
@@ -335,13 +416,16 @@ Return JSON:
         """Main agent loop: Plan → Execute → Reflect → Learn"""
         try:
             # 1. Planning phase
-            plan = await self.plan(goal, context)
+            with span("agent_plan"):
+                plan = await self.plan(goal, context)
             
             # 2. Execution phase
-            results = await self.execute(plan)
+            with span("agent_execute", tasks=len(plan.tasks)):
+                results = await self.execute(plan)
             
             # 3. Reflection phase
-            reflection = await self.reflect(results)
+            with span("agent_reflect"):
+                reflection = await self.reflect(results)
             
             # 4. Learning phase (store successful outcomes)
             self.state = AgentState.LEARNING
@@ -0,0 +1,133 @@
+"""
+Agent Session Pool
+Keeps one ZegaAgent per user alive between requests (bounded, idle-evicted)
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional
+from .agent import ZegaAgent
+from .ollama_teacher import OllamaTeacher
+from .telemetry import CACHE_REQUESTS, registry
+
+AGENT_SESSIONS = registry.gauge("zega_agent_sessions", "Live per-user agent sessions")
+
+@dataclass
+class AgentSession:
+    """Per-user agent state reused across predictions"""
+    user_id: str
+    agent: ZegaAgent
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    created_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+    runs: int = 0
+    custom_model: Optional[str] = None
+    model_checked_at: float = 0.0
+
+class AgentSessionPool:
+    """
+    LRU pool of agent sessions keyed by user_id.
+
+    - At most `max_sessions` sessions are kept; the least recently used idle one is evicted
+    - Sessions unused for `idle_ttl` seconds are dropped
+    - Each session remembers whether the user's fine-tuned `zega-{user_id}` Ollama
+      model exists (re-checked every `model_check_ttl` seconds)
+    """
+
+    def __init__(
+        self,
+        ensemble,
+        memory,
+        max_sessions: int = None,
+        idle_ttl: float = None,
+        model_check_ttl: float = 300.0
+    ):
+        self.ensemble = ensemble
+        self.memory = memory
+        self.max_sessions = max_sessions or int(os.getenv("ZEGA_AGENT_POOL_SIZE", "256"))
+        self.idle_ttl = idle_ttl or float(os.getenv("ZEGA_AGENT_IDLE_TTL", "900"))
+        self.model_check_ttl = model_check_ttl
+        self.sessions: "OrderedDict[str, AgentSession]" = OrderedDict()
+        self.stats = {"created": 0, "reused": 0, "evicted": 0}
+        AGENT_SESSIONS.set_function(lambda: len(self.sessions))
+
+    async def acquire(self, user_id: str) -> AgentSession:
+        """Get the user's session, creating it (and evicting others) if needed"""
+        self.evict_idle()
+
+        session = self.sessions.get(user_id)
+        if session:
+            self.sessions.move_to_end(user_id)
+            self.stats["reused"] += 1
+            CACHE_REQUESTS.labels("agent_session", "hit").inc()
+        else:
+            session = AgentSession(
+                user_id=user_id,
+                agent=ZegaAgent(self.ensemble, self.memory, user_id)
+            )
+            self.sessions[user_id] = session
+            self.stats["created"] += 1
+            CACHE_REQUESTS.labels("agent_session", "miss").inc()
+            self._evict_overflow()
+
+        session.last_used = time.time()
+        session.runs += 1
+        await self._refresh_model_routing(session)
+        return session
+
+    async def _refresh_model_routing(self, session: AgentSession):
+        """Route the agent to the user's fine-tuned Ollama model when it exists"""
+        now = time.time()
+        if now - session.model_checked_at < self.model_check_ttl:
+            return
+
+        session.model_checked_at = now
+        model_name = f"zega-{session.user_id}"
+        available = await OllamaTeacher(model_name).is_available()
+        session.custom_model = model_name if available else None
+        session.agent.preferred_model = session.custom_model
+
+        if available:
+            print(f"[AGENT_POOL] 🎯 Routing {session.user_id} to fine-tuned model {model_name}")
+
+    def invalidate_style(self, user_id: str):
+        """Drop cached style retrieval after the user's memory changed"""
+        session = self.sessions.get(user_id)
+        if session:
+            session.agent.clear_style_cache()
+
+    def reset_model_routing(self, user_id: str):
+        """Force a model re-check on next use (e.g. after fine-tuning)"""
+        session = self.sessions.get(user_id)
+        if session:
+            session.model_checked_at = 0.0
+
+    def evict_idle(self):
+        """Remove sessions idle for longer than idle_ttl"""
+        cutoff = time.time() - self.idle_ttl
+        for user_id in list(self.sessions.keys()):
+            session = self.sessions[user_id]
+            if session.last_used < cutoff and not session.lock.locked():
+                del self.sessions[user_id]
+                self.stats["evicted"] += 1
+
+    def _evict_overflow(self):
+        """Evict least recently used idle sessions above max_sessions"""
+        for user_id in list(self.sessions.keys()):
+            if len(self.sessions) <= self.max_sessions:
+                break
+            if not self.sessions[user_id].lock.locked():
+                del self.sessions[user_id]
+                self.stats["evicted"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Pool statistics"""
+        return {
+            **self.stats,
+            "active_sessions": len(self.sessions),
+            "max_sessions": self.max_sessions,
+            "idle_ttl": self.idle_ttl,
+            "custom_models": sum(1 for s in self.sessions.values() if s.custom_model)
+        }
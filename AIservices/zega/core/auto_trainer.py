@@ -8,6 +8,7 @@ import json
 import uuid
 from typing import List, Dict, Any, Optional
 from datetime import datetime
+from .telemetry import AUTOTRAIN_EXAMPLES
 
 class AutoTrainer:
     """
@@ -457,6 +458,7 @@ class AutoTrainer:
                     }
                 )
             
+            AUTOTRAIN_EXAMPLES.labels("success").inc()
             return {
                 "success": True,
                 "genre": selected_genre,
@@ -473,6 +475,7 @@ class AutoTrainer:
             
         except Exception as e:
             print(f"[AutoTrainer] ❌ Error generating example: {e}")
+            AUTOTRAIN_EXAMPLES.labels("failed").inc()
             return {
                 "success": False,
                 "error": str(e)
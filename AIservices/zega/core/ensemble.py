@@ -9,6 +9,10 @@ from typing import List, Dict, Any, Optional
 from dataclasses import dataclass
 import httpx
 from .ollama_teacher import OllamaTeacher
+from .singleflight import SingleFlight, make_key
+from .mode_profiles import ModeProfile, get_profile
+from .tracing import span
+from .telemetry import PROVIDER_CALLS, PROVIDER_RETRIES, GENERATED_CHARS, GENERATED_TOKENS, provider_outcome
 
 # Optional: Google Generative AI
 try:
@@ -32,9 +36,16 @@ class GroqTeacher:
     def __init__(self, model_name: str = "llama-3.1-70b-versatile"):
         self.model_name = model_name
         self.api_key = os.getenv("GROQ_API_KEY")
-        self.base_url = "https://api.groq.com/openai/v1/chat/completions"
+        api_base = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+        self.base_url = f"{api_base}/chat/completions"
     
-    async def generate(self, prompt: str, system: str = None) -> str:
+    async def generate(
+        self,
+        prompt: str,
+        system: str = None,
+        max_tokens: int = None,
+        json_mode: bool = False
+    ) -> str:
         if not self.api_key:
             raise Exception("GROQ_API_KEY not set")
         
@@ -44,18 +55,23 @@ class GroqTeacher:
             messages.append({"role": "system", "content": str(system).strip()[:1200]})
         messages.append({"role": "user", "content": str(prompt).strip()[:3000]})
         
+        payload = {
+            "model": self.model_name,
+            "messages": messages,
+            "temperature": 0.8,
+            "max_tokens": max_tokens or 2000,
+            "top_p": 0.95,
+            "stream": False
+        }
+        if json_mode:
+            # OpenAI-compatible JSON mode (object outputs only)
+            payload["response_format"] = {"type": "json_object"}
+        
         async with httpx.AsyncClient(timeout=20.0) as client:
             try:
                 response = await client.post(
                     self.base_url,
-                    json={
-                        "model": self.model_name,
-                        "messages": messages,
-                        "temperature": 0.8,
-                        "max_tokens": 2000,
-                        "top_p": 0.95,
-                        "stream": False
-                    },
+                    json=payload,
                     headers={
                         "Authorization": f"Bearer {self.api_key}",
                         "Content-Type": "application/json"
@@ -67,6 +83,9 @@ class GroqTeacher:
                     raise Exception(f"Groq API error {response.status_code}: {error_detail}")
                 
                 result = response.json()
+                usage = result.get("usage") or {}
+                if usage.get("completion_tokens"):
+                    GENERATED_TOKENS.labels("groq").inc(usage["completion_tokens"])
                 return result["choices"][0]["message"]["content"]
             except httpx.TimeoutException:
                 raise Exception(f"Groq timeout for {self.model_name}")
@@ -79,9 +98,16 @@ class HuggingFaceTeacher:
         self.model_name = model_name
         self.api_key = os.getenv("HUGGINGFACEHUB_API_TOKEN")
         # Using serverless inference API (free but slower)
-        self.base_url = f"https://api-inference.huggingface.co/models/{model_name}"
+        api_base = os.getenv("HF_INFERENCE_URL", "https://api-inference.huggingface.co/models")
+        self.base_url = f"{api_base}/{model_name}"
     
-    async def generate(self, prompt: str, system: str = None) -> str:
+    async def generate(
+        self,
+        prompt: str,
+        system: str = None,
+        max_tokens: int = None,
+        json_mode: bool = False  # Not supported by serverless inference
+    ) -> str:
         if not self.api_key:
             raise Exception("HUGGINGFACEHUB_API_TOKEN not set")
         
@@ -106,7 +132,7 @@ class HuggingFaceTeacher:
                     json={
                         "inputs": full_prompt[:3000],
                         "parameters": {
-                            "max_new_tokens": 512,  # Reduced for faster response
+                            "max_new_tokens": min(max_tokens or 512, 512),  # Reduced for faster response
                             "temperature": 0.7,
                             "top_p": 0.9,
                             "return_full_text": False,
@@ -155,6 +181,8 @@ class EnsembleController:
     
     def __init__(self):
         self.teachers: List[Dict[str, Any]] = []
+        self.custom_teachers: Dict[str, Dict[str, Any]] = {}  # e.g. fine-tuned zega-{user_id}
+        self.singleflight = SingleFlight("ensemble")  # Coalesce identical in-flight generations
         self._init_all_teachers()
     
     def _init_all_teachers(self):
@@ -237,7 +265,7 @@ class EnsembleController:
                 # Quick availability check
                 import httpx
                 try:
-                    response = httpx.get("http://localhost:11434/api/tags", timeout=2.0)
+                    response = httpx.get(f"{teacher.base_url}/api/tags", timeout=2.0)
                     if response.status_code == 200:
                         models = response.json().get("models", [])
                         if any(m.get("name", "").startswith(model_config["name"]) for m in models):
@@ -261,27 +289,57 @@ class EnsembleController:
         instruction: str = None,
         style_context: str = "",
         mode: str = "scene",
-        min_votes: int = 1  # Reduced from 3 to 1 for better success rate
+        min_votes: int = 1,  # Reduced from 3 to 1 for better success rate
+        profile: ModeProfile = None
     ) -> str:
         """
         Generate from models with smart fallback strategy:
         1. Try Ollama first (local, no rate limits)
         2. Then Groq (fast, generous rate limits)
         3. Finally Gemini/HF as backup
+        
+        The mode's ModeProfile sets provider order, token limits and JSON decoding.
         """
-        import time
+        profile = profile or get_profile(mode)
         
         # Build system prompt - SIMPLIFIED for single element training
         system_prompt = self._build_system_prompt(mode, style_context)
         user_prompt = f"{prompt}\n\nInstruction: {instruction}" if instruction else prompt
         
-        # Priority order: Speed-optimized with complete fallback chain
-        priority_groups = [
-            [t for t in self.teachers if t["provider"] == "gemini"],       # 1. Gemini - fastest (1-2s) but quota limited
-            [t for t in self.teachers if t["provider"] == "groq"],         # 2. Groq - ultra fast (0.5-1s) generous quota
-            [t for t in self.teachers if t["provider"] == "ollama"],       # 3. Ollama - local (2-5s) unlimited but needs install
-            [t for t in self.teachers if t["provider"] == "huggingface"]   # 4. HuggingFace - slowest (10-30s) but free fallback
-        ]
+        # Identical concurrent requests share one provider round trip
+        key = make_key(system_prompt, user_prompt, min_votes, profile)
+        with span("ensemble", mode=mode):
+            return await self.singleflight.do(
+                key,
+                lambda: self._generate_with_fallback(system_prompt, user_prompt, prompt, profile)
+            )
+    
+    def _priority_groups(self, profile: ModeProfile) -> List[List[Dict[str, Any]]]:
+        """Teacher groups in the profile's provider order"""
+        # Default order: Gemini - fastest (1-2s) but quota limited, Groq - ultra fast (0.5-1s),
+        # Ollama - local (2-5s) unlimited, HuggingFace - slowest (10-30s) but free fallback
+        groups = []
+        for provider in profile.providers:
+            group = [
+                t for t in self.teachers
+                if t["provider"] == provider
+                and not (profile.skip_slow_models and t.get("speed") == "slow")
+            ]
+            if profile.skip_slow_models:
+                # Fast-role models (e.g. phi3.5) first inside the group
+                group.sort(key=lambda t: 0 if t.get("role") in ("fast", "fast_backup") else 1)
+            groups.append(group)
+        return groups
+    
+    async def _generate_with_fallback(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        original_prompt: str,
+        profile: ModeProfile
+    ) -> str:
+        """Walk provider priority groups until a valid response is produced"""
+        priority_groups = self._priority_groups(profile)
         
         valid_responses = []
         
@@ -296,7 +354,8 @@ class EnsembleController:
             for teacher in group:
                 try:
                     response = await self._generate_from_teacher_with_retry(
-                        teacher, system_prompt, user_prompt, max_retries=2
+                        teacher, system_prompt, user_prompt,
+                        max_retries=profile.max_retries, profile=profile
                     )
                     
                     if response and response.content and not response.error:
@@ -309,8 +368,8 @@ class EnsembleController:
                     # No delay - move to next model immediately
             
             # Minimal delay between priority groups
-            if not valid_responses and group_idx < len(priority_groups) - 1:
-                await asyncio.sleep(0.2)  # Reduced from 2s to 0.2s for faster switching
+            if not valid_responses and group_idx < len(priority_groups) - 1 and profile.group_delay:
+                await asyncio.sleep(profile.group_delay)  # Reduced from 2s to 0.2s for faster switching
         
         print(f"[ENSEMBLE] ✅ Got {len(valid_responses)} valid response(s)")
         
@@ -319,7 +378,8 @@ class EnsembleController:
         
         # Voting: Use Gemini as judge
         if len(valid_responses) > 1:
-            best_response = await self._vote_best_response(valid_responses, prompt)
+            with span("voting", candidates=len(valid_responses)):
+                best_response = await self._vote_best_response(valid_responses, original_prompt)
             print(f"[ENSEMBLE] 🏆 Winner: {best_response.model_name} ({best_response.provider})")
             return best_response.content
         else:
@@ -330,44 +390,89 @@ class EnsembleController:
         teacher: Dict,
         system_prompt: str,
         user_prompt: str,
-        max_retries: int = 1  # Reduced from 2 to 1 for faster fallback
+        max_retries: int = 1,  # Reduced from 2 to 1 for faster fallback
+        profile: ModeProfile = None
     ) -> ModelResponse:
-        """Generate with exponential backoff retry"""
+        """
+        Generate with jittered backoff retry. Provider failures come back as
+        ModelResponse.error rather than raising, so an error response is
+        retried too; the last attempt's response (or exception) is returned.
+        """
         for attempt in range(max_retries):
+            last_attempt = attempt == max_retries - 1
             try:
-                return await self._generate_from_teacher(teacher, system_prompt, user_prompt)
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    wait_time = 0.5 + random.uniform(0, 0.5)  # Much faster: 0.5-1s instead of 2-3s
-                    print(f"[ENSEMBLE] 🔄 Retry {attempt + 1}/{max_retries} for {teacher['name']} in {wait_time:.1f}s")
-                    await asyncio.sleep(wait_time)
-                else:
-                    raise e
+                response = await self._generate_from_teacher(teacher, system_prompt, user_prompt, profile)
+                if not response.error or last_attempt:
+                    return response
+            except Exception:
+                if last_attempt:
+                    raise
+            wait_time = 0.5 + random.uniform(0, 0.5)  # Much faster: 0.5-1s instead of 2-3s
+            print(f"[ENSEMBLE] 🔄 Retry {attempt + 1}/{max_retries} for {teacher['name']} in {wait_time:.1f}s")
+            PROVIDER_RETRIES.labels(teacher["provider"]).inc()
+            with span("retry_backoff", provider=teacher["provider"], attempt=attempt + 1):
+                await asyncio.sleep(wait_time)
     
     async def _generate_from_teacher(
         self, 
         teacher: Dict, 
         system_prompt: str, 
-        user_prompt: str
+        user_prompt: str,
+        profile: ModeProfile = None
     ) -> ModelResponse:
         """Generate from a single teacher"""
+        with span("provider_attempt", provider=teacher["provider"], model=teacher["name"]) as attempt:
+            response = await self._call_teacher(teacher, system_prompt, user_prompt, profile)
+            if response.error:
+                attempt.set_error(response.error)
+            else:
+                GENERATED_CHARS.labels(teacher["provider"]).inc(len(response.content))
+            PROVIDER_CALLS.labels(teacher["provider"], provider_outcome(response.error)).inc()
+            return response
+    
+    async def _call_teacher(
+        self,
+        teacher: Dict,
+        system_prompt: str,
+        user_prompt: str,
+        profile: ModeProfile = None
+    ) -> ModelResponse:
+        """Provider call; failures come back as ModelResponse.error"""
         import time
-        import random
         start_time = time.time()
+        profile = profile or get_profile("")
+        json_mode = self._use_json_mode(teacher["provider"], profile)
         
         try:
             if teacher["provider"] == "gemini":
                 full_prompt = f"{system_prompt}\n\n{user_prompt}"
-                response = await asyncio.to_thread(
-                    teacher["model"].generate_content,
-                    full_prompt
-                )
+                generation_config = {}
+                if profile.max_tokens:
+                    generation_config["max_output_tokens"] = profile.max_tokens
+                if json_mode:
+                    generation_config["response_mime_type"] = "application/json"
+                if generation_config:
+                    response = await asyncio.to_thread(
+                        teacher["model"].generate_content,
+                        full_prompt,
+                        generation_config=generation_config
+                    )
+                else:
+                    response = await asyncio.to_thread(
+                        teacher["model"].generate_content,
+                        full_prompt
+                    )
                 content = response.text if hasattr(response, 'text') else str(response)
+                usage = getattr(response, "usage_metadata", None)
+                if getattr(usage, "candidates_token_count", None):
+                    GENERATED_TOKENS.labels("gemini").inc(usage.candidates_token_count)
             
             elif teacher["provider"] in ["ollama", "groq", "huggingface"]:
                 content = await teacher["model"].generate(
                     prompt=user_prompt,
-                    system=system_prompt
+                    system=system_prompt,
+                    max_tokens=profile.max_tokens,
+                    json_mode=json_mode
                 )
             
             else:
@@ -392,6 +497,17 @@ class EnsembleController:
                 error=str(e)
             )
     
+    def _use_json_mode(self, provider: str, profile: ModeProfile) -> bool:
+        """
+        Provider-side JSON decoding where supported:
+        Gemini handles arrays and objects; Ollama format=json and Groq json_object only objects.
+        """
+        if profile.json_output == "object":
+            return provider in ("gemini", "ollama", "groq")
+        if profile.json_output == "array":
+            return provider == "gemini"
+        return False
+    
     async def _vote_best_response(
         self, 
         responses: List[ModelResponse], 
@@ -470,6 +586,38 @@ Return ONLY the number (1-{len(responses)}) of the best candidate.
         
         return response.content
     
+    async def generate_with_custom_model(
+        self,
+        prompt: str,
+        model_name: str,
+        instruction: str = None,
+        style_context: str = "",
+        mode: str = "scene"
+    ) -> str:
+        """Generate using an Ollama model outside the teacher list (user fine-tuned models)"""
+        teacher = self.custom_teachers.get(model_name)
+        if not teacher:
+            teacher = {
+                "name": model_name,
+                "model": OllamaTeacher(model_name),
+                "provider": "ollama",
+                "role": "fine_tuned",
+                "strength": "personalized",
+                "speed": "fast"
+            }
+            self.custom_teachers[model_name] = teacher
+        
+        system_prompt = self._build_system_prompt(mode, style_context)
+        user_prompt = f"{prompt}\n\nInstruction: {instruction}" if instruction else prompt
+        response = await self._generate_from_teacher(
+            teacher, system_prompt, user_prompt, get_profile(mode)
+        )
+        
+        if response.error or not response.content:
+            raise Exception(response.error or f"Empty response from {model_name}")
+        
+        return response.content
+    
     def _build_system_prompt(self, mode: str, style_context: str) -> str:
         """Build system prompt based on mode"""
         base = "You are ZEGA, an expert story writer."
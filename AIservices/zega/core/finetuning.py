@@ -8,6 +8,7 @@ from pathlib import Path
 from typing import List, Dict, Any
 from dataclasses import dataclass
 import asyncio
+from .shared_state import SharedState, append_line, atomic_write_json
 
 @dataclass
 class TrainingData:
@@ -19,22 +20,26 @@ class TrainingData:
 class LoRAAdapter:
     """
     User-specific LoRA (Low-Rank Adaptation) adapter
-    Stores lightweight personalization weights
+    Stores lightweight personalization weights (shared across workers via SharedState)
     """
-    def __init__(self, user_id: str, adapter_dir: str = "zega_adapters"):
+    def __init__(self, user_id: str, adapter_dir: str = "zega_adapters", state: SharedState = None):
         self.user_id = user_id
         self.adapter_dir = Path(adapter_dir)
         self.adapter_dir.mkdir(exist_ok=True)
         self.user_adapter_path = self.adapter_dir / f"{user_id}_adapter.json"
+        self.state = state or SharedState(str(self.adapter_dir / "zega_state.db"))
         
-        self.weights = self._load_or_init()
-    
-    def _load_or_init(self) -> Dict:
-        """Load existing adapter or initialize new one"""
+        # Adapters saved by earlier versions only exist as JSON
         if self.user_adapter_path.exists():
             with open(self.user_adapter_path, 'r') as f:
-                return json.load(f)
-        
+                self.state.put_adapter_if_missing(user_id, json.load(f))
+    
+    @property
+    def weights(self) -> Dict:
+        """Latest weights, including updates made by other workers"""
+        return self.state.get_adapter(self.user_id) or self._initial_weights()
+    
+    def _initial_weights(self) -> Dict:
         return {
             "user_id": self.user_id,
             "version": "1.0",
@@ -44,33 +49,35 @@ class LoRAAdapter:
             "quality_scores": []
         }
     
-    def save(self):
-        """Persist adapter to disk"""
-        with open(self.user_adapter_path, 'w') as f:
-            json.dump(self.weights, f, indent=2)
+    def save(self, weights: Dict = None):
+        """Export adapter JSON (a snapshot; the shared database is authoritative)"""
+        atomic_write_json(self.user_adapter_path, weights or self.weights)
     
     def update_from_feedback(self, text: str, score: float, metadata: Dict):
         """Update adapter based on user feedback"""
-        self.weights["training_steps"] += 1
-        self.weights["quality_scores"].append(score)
-        
-        # Keep only last 100 scores
-        if len(self.weights["quality_scores"]) > 100:
-            self.weights["quality_scores"] = self.weights["quality_scores"][-100:]
-        
-        # Update preferences
-        if "genre" in metadata:
-            genre = metadata["genre"]
-            self.weights["preferences"][genre] = self.weights["preferences"].get(genre, 0) + 1
+        def apply(weights: Dict):
+            weights["training_steps"] += 1
+            weights["quality_scores"].append(score)
+            
+            # Keep only last 100 scores
+            if len(weights["quality_scores"]) > 100:
+                weights["quality_scores"] = weights["quality_scores"][-100:]
+            
+            # Update preferences
+            if "genre" in metadata:
+                genre = metadata["genre"]
+                weights["preferences"][genre] = weights["preferences"].get(genre, 0) + 1
         
-        self.save()
+        # Read-modify-write in one transaction: concurrent learns in other workers are not lost
+        self.save(self.state.update_adapter(self.user_id, apply, self._initial_weights))
     
     def get_style_prompt(self) -> str:
         """Generate prompt modifier based on learned style"""
-        avg_score = sum(self.weights["quality_scores"]) / len(self.weights["quality_scores"]) if self.weights["quality_scores"] else 7
+        weights = self.weights
+        avg_score = sum(weights["quality_scores"]) / len(weights["quality_scores"]) if weights["quality_scores"] else 7
         
         top_genres = sorted(
-            self.weights["preferences"].items(),
+            weights["preferences"].items(),
             key=lambda x: x[1],
             reverse=True
         )[:3]
@@ -91,9 +98,11 @@ class FineTuningManager:
     Collects training data and triggers fine-tuning
     """
     
-    def __init__(self, data_dir: str = "fine_tune_data"):
+    def __init__(self, data_dir: str = "fine_tune_data", state: SharedState = None):
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
+        self.state = state or SharedState(str(self.data_dir / "zega_state.db"))
+        # Handles only; weights are re-read from the shared state on access
         self.lora_adapters: Dict[str, LoRAAdapter] = {}
     
     def collect_training_example(
@@ -121,8 +130,7 @@ class FineTuningManager:
             }
         }
         
-        with open(jsonl_file, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(example) + '\n')
+        append_line(jsonl_file, json.dumps(example))
         
         # Update LoRA adapter
         adapter = self.get_or_create_adapter(user_id)
@@ -133,7 +141,7 @@ class FineTuningManager:
     def get_or_create_adapter(self, user_id: str) -> LoRAAdapter:
         """Get or create LoRA adapter for user"""
         if user_id not in self.lora_adapters:
-            self.lora_adapters[user_id] = LoRAAdapter(user_id)
+            self.lora_adapters[user_id] = LoRAAdapter(user_id, state=self.state)
         return self.lora_adapters[user_id]
     
     def get_training_data_count(self, user_id: str) -> int:
@@ -248,15 +256,16 @@ class FineTuningManager:
         adapter = self.get_or_create_adapter(user_id)
         count = self.get_training_data_count(user_id)
         
-        avg_score = sum(adapter.weights["quality_scores"]) / len(adapter.weights["quality_scores"]) if adapter.weights["quality_scores"] else 0
+        weights = adapter.weights
+        avg_score = sum(weights["quality_scores"]) / len(weights["quality_scores"]) if weights["quality_scores"] else 0
         
         return {
             "user_id": user_id,
             "training_examples": count,
-            "training_steps": adapter.weights["training_steps"],
+            "training_steps": weights["training_steps"],
             "avg_quality_score": round(avg_score, 2),
             "top_genres": sorted(
-                adapter.weights["preferences"].items(),
+                weights["preferences"].items(),
                 key=lambda x: x[1],
                 reverse=True
             )[:5],
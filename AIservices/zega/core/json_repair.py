@@ -0,0 +1,353 @@
+"""
+JSON Extraction and Repair for Structured Model Outputs
+Strips fences/prose, closes truncated output, validates per-mode shapes, parses streams incrementally
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*\n?(.*?)(?:```|$)", re.DOTALL)
+_OPENERS = {"{": "}", "[": "]"}
+
+def strip_fences(text: str) -> str:
+    """Return the content of the first ``` fence, or the text unchanged"""
+    match = _FENCE_RE.search(text)
+    return match.group(1) if match else text
+
+def _find_start(text: str, expect: Optional[str]) -> int:
+    """Index of the first '{' or '[' (or the expected one)"""
+    chars = {"object": "{", "array": "["}.get(expect, "{[")
+    positions = [text.find(c) for c in chars if text.find(c) != -1]
+    return min(positions) if positions else -1
+
+def repair_json(text: str, close_strings: bool = True) -> str:
+    """
+    Best-effort repair of one JSON value starting at text[0]:
+    - stops after the top-level value closes (drops trailing prose)
+    - escapes raw newlines/tabs inside strings
+    - removes trailing commas
+    - closes unterminated strings, objects and arrays (truncated output)
+    - drops a truncated number or literal, with its key
+
+    With close_strings=False an unterminated string is dropped (with its key)
+    instead of closed, for values where a cut-off word is not a valid answer.
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    in_string = False
+    escape = False
+    string_start = 0
+
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            elif ch == "\n":
+                out.append("\\n")
+                continue
+            elif ch == "\t":
+                out.append("\\t")
+                continue
+            out.append(ch)
+            continue
+
+        if ch == '"':
+            in_string = True
+            string_start = len(out)
+        elif ch in _OPENERS:
+            stack.append(_OPENERS[ch])
+        elif ch in "}]":
+            if not stack:
+                break
+            _drop_trailing_comma(out)
+            stack.pop()
+            out.append(ch)
+            if not stack:
+                break
+            continue
+        out.append(ch)
+
+    if in_string and not close_strings:
+        del out[string_start:]
+    elif in_string:
+        if escape:
+            out.pop()
+        out.append('"')
+
+    if stack:
+        _trim_incomplete_tail(out, in_object=stack[-1] == "}")
+        while stack:
+            _drop_trailing_comma(out)
+            out.append(stack.pop())
+
+    return "".join(out)
+
+def _drop_trailing_comma(out: List[str]):
+    """Remove a ',' (and whitespace) right before a closing bracket"""
+    i = len(out) - 1
+    while i >= 0 and out[i].isspace():
+        i -= 1
+    if i >= 0 and out[i] == ",":
+        del out[i:]
+
+_KEY = r'"(?:[^"\\]|\\.)*"'
+_DANGLING_KEY_RE = re.compile(r'(,|\{)\s*' + _KEY + r'\s*:?\s*$')
+_PARTIAL_WORD_RE = re.compile(r'([,\[:])\s*([A-Za-z]+)$')
+_PARTIAL_NUMBER_RE = re.compile(r'([,\[:])\s*(-?[0-9.]*(?:[eE][+-]?[0-9]*)?)$')
+_NUMBER_RE = re.compile(r'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?$')
+_LITERALS = ("true", "false", "null")
+
+def _trim_incomplete_tail(out: List[str], in_object: bool):
+    """
+    Drop a dangling key, partial literal or cut-off number left by
+    truncation, e.g. '{"a": 1, "b"' -> '{"a": 1', '[1, tr' -> '[1' and
+    '{"a": 1, "b": 7.' -> '{"a": 1'
+    """
+    text = "".join(out).rstrip()
+
+    word = _PARTIAL_WORD_RE.search(text)
+    if word and word.group(2) not in _LITERALS:
+        text = text[:word.start(2)].rstrip()
+        if word.group(1) == ",":
+            text = text[:-1]
+
+    number = _PARTIAL_NUMBER_RE.search(text)
+    if number and number.group(2) and not _NUMBER_RE.match(number.group(2)):
+        # "7." or "-" or "1e+": the digits that were meant to follow are unknown
+        text = text[:number.start(2)].rstrip()
+        if number.group(1) == ",":
+            text = text[:-1]
+
+    if text.endswith(":"):
+        text = text[:-1].rstrip()
+    key = _DANGLING_KEY_RE.search(text) if in_object else None
+    if key:
+        text = text[:key.start()] + ("{" if key.group(1) == "{" else "")
+
+    out[:] = list(text)
+
+def extract_json(text: str, expect: Optional[str] = None, close_strings: bool = True) -> Optional[Any]:
+    """
+    Parse a JSON value out of model output.
+
+    Args:
+        text: Raw model output (may contain fences, prose, or be truncated)
+        expect: "array" or "object" to pick the right opening bracket
+        close_strings: Close a truncated final string (False drops it)
+
+    Returns:
+        Parsed value, or None if nothing usable was found
+    """
+    if not text:
+        return None
+
+    stripped = text.strip()
+    try:
+        value = json.loads(stripped)
+        if expect is None or _shape(value) == expect:
+            return value
+    except (ValueError, TypeError):
+        pass
+
+    candidate = strip_fences(stripped)
+    start = _find_start(candidate, expect)
+    if start == -1:
+        return None
+
+    try:
+        return json.loads(repair_json(candidate[start:], close_strings))
+    except ValueError:
+        return None
+
+def _shape(value: Any) -> Optional[str]:
+    if isinstance(value, dict):
+        return "object"
+    if isinstance(value, list):
+        return "array"
+    return None
+
+# === Per-mode shapes ===
+
+MODE_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    # A cut-off genre or title is dropped rather than closed into a wrong answer.
+    # Plain-text answers ("Fantasy, Horror") are split on `separators`; items
+    # longer than `max_words` mean prose, not a list.
+    "genre_selection": {
+        "type": "array", "items": "string", "close_strings": False,
+        "separators": r"[,;\n]", "max_words": 3,
+    },
+    "title_ideas": {
+        "type": "array", "items": "string", "close_strings": False,
+        "separators": r"\n", "max_words": 12,
+    },
+    "scene_structured": {
+        "type": "object",
+        "required": {"title": str, "content": str},
+        "defaults": {"new_characters": list, "existing_characters_used": list},
+    },
+    "planning": {"type": "object", "required": {"tasks": list}},
+    "reflection": {"type": "object", "defaults": {"quality_score": lambda: 7}},
+    "evaluation": {"type": "object", "defaults": {"overall": lambda: 7}},
+}
+
+def validate(mode: str, value: Any) -> Tuple[bool, Any]:
+    """
+    Check (and lightly coerce) a parsed value against the mode's shape.
+
+    Returns (ok, value). Coercions: a lone string becomes a one-item list,
+    {"genres": [...]} becomes the list, missing optional keys get defaults.
+    """
+    schema = MODE_SCHEMAS.get(mode)
+    if schema is None:
+        return value is not None, value
+
+    if schema["type"] == "array":
+        if isinstance(value, str):
+            value = [value]
+        elif isinstance(value, dict):
+            lists = [v for v in value.values() if isinstance(v, list)]
+            if len(lists) != 1:
+                return False, value
+            value = lists[0]
+        if not isinstance(value, list):
+            return False, value
+        if schema.get("items") == "string":
+            value = [str(v).strip() for v in value if isinstance(v, (str, int, float)) and str(v).strip()]
+        return bool(value), value
+
+    if not isinstance(value, dict):
+        return False, value
+    for key, typ in schema.get("required", {}).items():
+        if not isinstance(value.get(key), typ):
+            return False, value
+    for key, default in schema.get("defaults", {}).items():
+        value.setdefault(key, default())
+    return True, value
+
+_LIST_MARKER_RE = re.compile(r'^(?:[-*•]|\d+[.)])\s+')
+
+def plain_items(text: str, separators: str, max_words: int) -> Optional[List[str]]:
+    """
+    Items of a list answered without JSON brackets: a bare JSON string or
+    plain text such as 'Fantasy, Horror' or one bullet per line. None when
+    an item reads like a sentence (too long, or a 'label:' lead-in).
+    """
+    text = strip_fences(text).strip()
+    try:
+        value = json.loads(text)
+        if isinstance(value, str):
+            text = value
+    except ValueError:
+        pass
+    items = []
+    for item in re.split(separators, text):
+        item = _LIST_MARKER_RE.sub("", item.strip()).strip(" \"'`.")
+        if not item:
+            continue
+        if ":" in item or len(item.split()) > max_words:
+            return None
+        items.append(item)
+    return items or None
+
+def parse_structured(mode: str, text: str) -> Optional[Any]:
+    """Extract + validate in one step; None if the output is unusable"""
+    schema = MODE_SCHEMAS.get(mode, {})
+    value = extract_json(text, expect=schema.get("type"), close_strings=schema.get("close_strings", True))
+    if value is None and text and schema.get("separators"):
+        value = plain_items(text, schema["separators"], schema["max_words"])
+    if value is None:
+        return None
+    ok, value = validate(mode, value)
+    return value if ok else None
+
+# === Incremental (streaming) parsing ===
+
+class IncrementalJSONParser:
+    """
+    Feed streamed model output chunk by chunk and get completed top-level
+    items as soon as they close: array elements, or (key, value) pairs of an
+    object. Leading fences/prose before the first bracket are skipped.
+
+        parser = IncrementalJSONParser()
+        for chunk in stream:
+            for item in parser.feed(chunk):
+                emit(item)
+        final = parser.result()
+    """
+
+    def __init__(self, expect: Optional[str] = None):
+        self.expect = expect
+        self.buffer = ""
+        self.start = -1
+        self.kind: Optional[str] = None
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._item_start = 0
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Add text; return newly completed items"""
+        self.buffer += chunk
+        if self.start == -1:
+            self.start = _find_start(self.buffer, self.expect)
+            if self.start == -1:
+                return []
+            self.kind = "array" if self.buffer[self.start] == "[" else "object"
+            self._pos = self.start
+        return self._scan()
+
+    def _scan(self) -> List[Any]:
+        items = []
+        buf = self.buffer
+        while self._pos < len(buf) and not self.done:
+            ch = buf[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in _OPENERS:
+                self._depth += 1
+                if self._depth == 1:
+                    self._item_start = self._pos + 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    items.extend(self._emit(buf[self._item_start:self._pos]))
+                    self.done = True
+            elif ch == "," and self._depth == 1:
+                items.extend(self._emit(buf[self._item_start:self._pos]))
+                self._item_start = self._pos + 1
+            self._pos += 1
+        return items
+
+    def _emit(self, raw: str) -> List[Any]:
+        raw = raw.strip()
+        if not raw:
+            return []
+        try:
+            if self.kind == "array":
+                return [json.loads(raw)]
+            pair = json.loads("{" + raw + "}")
+            return list(pair.items())
+        except ValueError:
+            return []
+
+    def result(self) -> Optional[Any]:
+        """Best-effort value for everything received so far (repairs truncation)"""
+        if self.start == -1:
+            return None
+        try:
+            return json.loads(repair_json(self.buffer[self.start:]))
+        except ValueError:
+            return None
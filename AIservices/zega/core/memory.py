@@ -2,14 +2,29 @@ import chromadb
 from chromadb.config import Settings
 import os
 import json
+import time
 from pathlib import Path
 from typing import List, Dict, Any, Optional
+from urllib.parse import urlparse
+from .telemetry import MEMORY_QUERY_SECONDS
+from .shared_state import file_lock, atomic_write_json
 
 class ZegaMemory:
     def __init__(self, persistence_path: str = "zega_memory"):
         self.persistence_path = Path(persistence_path)
         self.persistence_path.mkdir(exist_ok=True)
-        self.client = chromadb.PersistentClient(path=str(self.persistence_path))
+        # Embedded Chroma is single-process; multi-worker deployments point every
+        # worker at one Chroma server instead (ZEGA_CHROMA_URL=http://localhost:8000)
+        chroma_url = os.getenv("ZEGA_CHROMA_URL")
+        if chroma_url:
+            parsed = urlparse(chroma_url)
+            self.client = chromadb.HttpClient(
+                host=parsed.hostname,
+                port=parsed.port or 8000,
+                ssl=parsed.scheme == "https"
+            )
+        else:
+            self.client = chromadb.PersistentClient(path=str(self.persistence_path))
         self.collection = self.client.get_or_create_collection(name="zega_user_style")
         self.user_profiles_path = self.persistence_path / "user_profiles"
         self.user_profiles_path.mkdir(exist_ok=True)
@@ -20,11 +35,13 @@ class ZegaMemory:
         """
         try:
             doc_id = f"{user_id}_{metadata.get('timestamp', 'unknown')}_{abs(hash(text))}"
+            start = time.perf_counter()
             self.collection.add(
                 documents=[text],
                 metadatas=[{**metadata, "user_id": user_id}],
                 ids=[doc_id]
             )
+            MEMORY_QUERY_SECONDS.labels("add").observe(time.perf_counter() - start)
             
             # Update user profile
             self._update_user_profile(user_id, text, metadata)
@@ -36,6 +53,11 @@ class ZegaMemory:
         """Update user profile with writing statistics."""
         profile_file = self.user_profiles_path / f"{user_id}.json"
         
+        # Locked read-modify-write: workers learning for the same user don't lose samples
+        with file_lock(profile_file):
+            self._apply_profile_update(profile_file, user_id, text, metadata)
+    
+    def _apply_profile_update(self, profile_file: Path, user_id: str, text: str, metadata: Dict[str, Any]):
         profile = {
             "user_id": user_id,
             "total_samples": 0,
@@ -54,19 +76,20 @@ class ZegaMemory:
         profile["total_words"] += word_count
         profile["last_updated"] = metadata.get("timestamp")
         
-        with open(profile_file, 'w') as f:
-            json.dump(profile, f, indent=2)
+        atomic_write_json(profile_file, profile)
 
     def retrieve_context(self, user_id: str, query: str, n_results: int = 5) -> List[str]:
         """
         Retrieves relevant past writings to use as context/style reference.
         """
+        start = time.perf_counter()
         try:
             results = self.collection.query(
                 query_texts=[query],
                 n_results=n_results,
                 where={"user_id": user_id}
             )
+            MEMORY_QUERY_SECONDS.labels("query").observe(time.perf_counter() - start)
             
             if results and results['documents']:
                 return results['documents'][0]
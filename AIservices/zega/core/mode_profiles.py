@@ -0,0 +1,119 @@
+"""
+Mode Execution Profiles
+Per-mode generation settings: token limits, RAG use, provider routing, JSON decoding
+"""
+import re
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+DEFAULT_PROVIDER_ORDER = ("gemini", "groq", "ollama", "huggingface")
+
+@dataclass(frozen=True)
+class ModeProfile:
+    """How a generation mode is executed"""
+    max_tokens: Optional[int] = None          # None keeps each provider's default
+    use_rag: bool = True                      # Retrieve user style examples
+    rag_results: int = 5
+    use_adapter: bool = True                  # Add LoRA adapter style hints
+    providers: Tuple[str, ...] = DEFAULT_PROVIDER_ORDER
+    skip_slow_models: bool = False            # Drop teachers with speed == "slow"
+    json_output: Optional[str] = None         # "array" | "object" -> constrained decoding
+    max_retries: int = 2
+    group_delay: float = 0.2                  # Pause between provider groups
+    heuristic_fallback: Optional[str] = None  # Local fallback when all providers fail
+
+# Short structured modes: small outputs, fastest providers first, no RAG
+MODE_PROFILES = {
+    "genre_selection": ModeProfile(
+        max_tokens=64,
+        use_rag=False,
+        use_adapter=False,
+        providers=("groq", "ollama", "gemini"),
+        skip_slow_models=True,
+        json_output="array",
+        max_retries=1,
+        group_delay=0.0,
+        heuristic_fallback="genre_hints"
+    ),
+    "title_ideas": ModeProfile(
+        max_tokens=200,
+        use_rag=False,
+        use_adapter=False,
+        providers=("groq", "ollama", "gemini"),
+        skip_slow_models=True,
+        json_output="array",
+        max_retries=1,
+        group_delay=0.0
+    ),
+    "description_autocomplete": ModeProfile(
+        max_tokens=256,
+        rag_results=2,
+        providers=("groq", "gemini", "ollama", "huggingface"),
+        max_retries=1,
+        group_delay=0.0
+    ),
+    "scene_structured": ModeProfile(
+        json_output="object"
+    ),
+}
+
+DEFAULT_PROFILE = ModeProfile()
+
+def get_profile(mode: str) -> ModeProfile:
+    """Execution profile for a mode (full-length default for unknown modes)"""
+    return MODE_PROFILES.get(mode, DEFAULT_PROFILE)
+
+# === Local genre heuristic (reuses the docparser keyword detector) ===
+
+GENRE_ALIASES = {
+    "sci-fi": ["science fiction", "sci-fi", "scifi"],
+    "historical": ["historical fiction", "historical"],
+}
+
+_scene_parser = None
+
+def _get_scene_parser():
+    """Lazily import zega_docparser's SceneParser (sibling package in AIservices)"""
+    global _scene_parser
+    if _scene_parser is None:
+        services_dir = str(Path(__file__).resolve().parents[2])
+        if services_dir not in sys.path:
+            sys.path.insert(0, services_dir)
+        from zega_docparser.parser import SceneParser
+        _scene_parser = SceneParser()
+    return _scene_parser
+
+def _allowed_genres(instruction: Optional[str]) -> List[str]:
+    """Parse 'Select from these genres: A, B, C' sent by the frontend"""
+    if not instruction:
+        return []
+    match = re.search(r"genres?\s*:\s*(.+)", instruction, re.IGNORECASE | re.DOTALL)
+    if not match:
+        return []
+    return [g.strip() for g in match.group(1).split(",") if g.strip()]
+
+def heuristic_genres(context: str, instruction: Optional[str] = None) -> List[str]:
+    """
+    Keyword-based genre guess used when no provider answers.
+    Names are mapped onto the allowed genre list from the instruction when given.
+    """
+    try:
+        hints = _get_scene_parser()._detect_genre_hints(context or "")
+    except Exception as e:
+        print(f"[MODE_PROFILES] ⚠️ Genre heuristic unavailable: {e}")
+        return []
+
+    allowed = _allowed_genres(instruction)
+    if not allowed:
+        return [GENRE_ALIASES.get(h, [h])[0].title() for h in hints]
+
+    by_lower = {g.lower(): g for g in allowed}
+    genres = []
+    for hint in hints:
+        for candidate in GENRE_ALIASES.get(hint, [hint]):
+            if candidate in by_lower and by_lower[candidate] not in genres:
+                genres.append(by_lower[candidate])
+                break
+    return genres
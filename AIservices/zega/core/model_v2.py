@@ -10,9 +10,14 @@ from pathlib import Path
 from typing import List, Dict, Any, Optional
 from .memory import ZegaMemory
 from .ensemble import EnsembleController
-from .agent import ZegaAgent
+from .agent_pool import AgentSessionPool
 from .finetuning import FineTuningManager
 from .auto_trainer import AutoTrainer
+from .singleflight import SingleFlight, make_key
+from .mode_profiles import get_profile, heuristic_genres
+from .json_repair import parse_structured
+from .tracing import span
+from .shared_state import SharedState, atomic_write_json
 
 class ZegaModelV2:
     """
@@ -31,40 +36,58 @@ class ZegaModelV2:
         self.checkpoint_dir = Path(checkpoint_dir)
         self.checkpoint_dir.mkdir(exist_ok=True)
         
+        # Counters, feedback and adapters live in SQLite so uvicorn workers share them
+        self.state = SharedState(str(self.checkpoint_dir / "zega_state.db"))
+        self.model_version = "2.0.0-agentic"
+        
         # Initialize components
         self.ensemble = EnsembleController()
-        self.finetuning = FineTuningManager()
+        self.finetuning = FineTuningManager(state=self.state)
         self.auto_trainer = AutoTrainer(self.ensemble, self.memory, self.finetuning)
+        self.agent_pool = AgentSessionPool(self.ensemble, self.memory)
+        self.singleflight = SingleFlight("predict")  # Coalesce double-fired /predict calls
         
-        # Training metrics
-        self.training_metrics = {
-            "total_predictions": 0,
-            "total_learns": 0,
-            "user_feedback_scores": [],
-            "model_version": "2.0.0-agentic"
-        }
         self._load_checkpoint()
         
         print("[ZEGA v2] 🚀 Initialized Agentic AI System")
         print(f"[ZEGA v2] 🎓 Available models: {len(self.ensemble.teachers)}")
     
+    @property
+    def training_metrics(self) -> Dict[str, Any]:
+        """Training metrics summed over all workers"""
+        return {
+            "total_predictions": self.state.get_counter("total_predictions"),
+            "total_learns": self.state.get_counter("total_learns"),
+            "user_feedback_scores": self.state.get_feedback_scores(),
+            "model_version": self.model_version
+        }
+    
     def _load_checkpoint(self):
-        """Load training metrics from checkpoint"""
+        """Import a pre-SQLite training_metrics.json once"""
         checkpoint_file = self.checkpoint_dir / "training_metrics.json"
         if checkpoint_file.exists():
             try:
                 with open(checkpoint_file, 'r') as f:
-                    self.training_metrics = json.load(f)
-                print(f"[ZEGA v2] 📊 Loaded: {self.training_metrics['total_predictions']} predictions")
+                    if self.state.import_metrics(json.load(f)):
+                        print("[ZEGA v2] 📊 Imported training_metrics.json into shared state")
             except Exception as e:
                 print(f"[ZEGA v2] ⚠️ Checkpoint load failed: {e}")
+        print(f"[ZEGA v2] 📊 Loaded: {self.state.get_counter('total_predictions')} predictions")
+    
+    def _count_prediction(self):
+        """Bump the shared counter and export a snapshot every 10 predictions (blocking; run off the loop)"""
+        if self.state.incr("total_predictions") % 10 == 0:
+            self._save_checkpoint()
+    
+    def _style_hints(self, user_id: str) -> str:
+        """The user's adapter style prompt (a SQLite read/write; run off the loop)"""
+        return self.finetuning.get_or_create_adapter(user_id).get_style_prompt()
     
     def _save_checkpoint(self):
-        """Save training metrics to checkpoint"""
+        """Export a training_metrics.json snapshot (the shared state is authoritative)"""
         checkpoint_file = self.checkpoint_dir / "training_metrics.json"
         try:
-            with open(checkpoint_file, 'w') as f:
-                json.dump(self.training_metrics, f, indent=2)
+            atomic_write_json(checkpoint_file, self.training_metrics)
         except Exception as e:
             print(f"[ZEGA v2] ⚠️ Checkpoint save failed: {e}")
     
@@ -80,27 +103,25 @@ class ZegaModelV2:
         
         Returns complete agent execution details
         """
-        # Check if user has custom fine-tuned model
-        custom_model = f"zega-{user_id}"
-        
-        # Create agent instance
-        agent = ZegaAgent(self.ensemble, self.memory, user_id)
+        # Reuse the user's pooled agent (style cache, last plan, model routing)
+        session = await self.agent_pool.acquire(user_id)
         
         # Define goal
         goal = f"Generate {mode} content based on: {context[:100]}..."
         
-        # Run agent
-        result = await agent.run(goal, {
-            "prompt": context,
-            "instruction": instruction,
-            "mode": mode,
-            "user_id": user_id
-        })
+        # One run per user at a time: the agent keeps per-run state
+        async with session.lock:
+            with span("predict_agentic", mode=mode):
+                result = await session.agent.run(goal, {
+                    "prompt": context,
+                    "instruction": instruction,
+                    "mode": mode,
+                    "user_id": user_id
+                })
+        result["model_routing"] = session.custom_model or "ensemble"
         
-        # Track metrics
-        self.training_metrics["total_predictions"] += 1
-        if self.training_metrics["total_predictions"] % 10 == 0:
-            self._save_checkpoint()
+        # Track metrics; SQLite writes wait on other workers' locks, so keep them off the loop
+        await asyncio.to_thread(self._count_prediction)
         
         return result
     
@@ -122,48 +143,99 @@ class ZegaModelV2:
             mode: Generation mode
             use_agent: If True, use agentic workflow
         """
+        # Use agentic mode if requested
+        if use_agent:
+            result = await self.predict_agentic(user_id, context, instruction, mode)
+            return result.get("final_output", "")
+        
+        # Concurrent identical requests (same normalized inputs) share one prediction
+        key = make_key(user_id, context, instruction, mode)
+        with span("predict", mode=mode):
+            return await self.singleflight.do(
+                key,
+                lambda: self._predict_once(user_id, context, instruction, mode)
+            )
+    
+    async def _predict_once(
+        self,
+        user_id: str,
+        context: str,
+        instruction: str,
+        mode: str
+    ) -> str:
+        """Run a single RAG + ensemble prediction"""
+        profile = get_profile(mode)
         try:
-            # Use agentic mode if requested
-            if use_agent:
-                result = await self.predict_agentic(user_id, context, instruction, mode)
-                return result.get("final_output", "")
-            
-            # 1. Retrieve Memory (RAG)
-            style_examples = self.memory.retrieve_context(user_id, context, n_results=5)
-            style_context = "\n---\n".join(style_examples)
+            # 1. Retrieve Memory (RAG) - skipped for short structured modes
+            style_context = ""
+            if profile.use_rag:
+                with span("retrieval", n_results=profile.rag_results):
+                    style_examples = self.memory.retrieve_context(
+                        user_id, context, n_results=profile.rag_results
+                    )
+                style_context = "\n---\n".join(style_examples)
             
             # Get user's LoRA adapter for style hints
-            adapter = self.finetuning.get_or_create_adapter(user_id)
-            style_hints = adapter.get_style_prompt()
-            
-            if style_hints:
-                style_context += f"\n\nStyle Preferences: {style_hints}"
+            if profile.use_adapter:
+                with span("adapter_lookup"):
+                    style_hints = await asyncio.to_thread(self._style_hints, user_id)
+                
+                if style_hints:
+                    style_context += f"\n\nStyle Preferences: {style_hints}"
             
-            # Track prediction
-            self.training_metrics["total_predictions"] += 1
+            # Track prediction; SQLite writes wait on other workers' locks, so keep them off the loop
+            await asyncio.to_thread(self._count_prediction)
             
             # 2. Build Prompts
-            system_prompt = self._build_system_prompt(mode, style_context)
-            user_prompt = self._build_user_prompt(context, instruction, mode)
+            with span("prompt_build"):
+                system_prompt = self._build_system_prompt(mode, style_context)
+                user_prompt = self._build_user_prompt(context, instruction, mode)
             
             # 3. Generate with Ensemble Voting
             result = await self.ensemble.generate_with_voting(
                 prompt=user_prompt,
                 instruction=instruction,
                 style_context=style_context,
-                mode=mode
+                mode=mode,
+                profile=profile
             )
             
-            # Save checkpoint periodically
-            if self.training_metrics["total_predictions"] % 10 == 0:
-                self._save_checkpoint()
+            # Structured modes: hand the frontend clean JSON even if the model
+            # wrapped it in fences/prose or was cut off at max_tokens
+            if profile.json_output:
+                result = self._normalize_structured(result, mode, context, instruction)
             
             return result
             
         except Exception as e:
             print(f"[ZEGA v2] ❌ Prediction error: {e}")
+            if profile.heuristic_fallback == "genre_hints":
+                genres = heuristic_genres(context, instruction)
+                print(f"[ZEGA v2] 🧭 Heuristic genre fallback: {genres}")
+                return json.dumps(genres)
             return f"Error generating content: {str(e)}"
     
+    def _normalize_structured(
+        self,
+        result: str,
+        mode: str,
+        context: str,
+        instruction: Optional[str]
+    ) -> str:
+        """Re-serialize structured output; fall back to heuristics when unparseable"""
+        parsed = parse_structured(mode, result)
+        if parsed is not None:
+            return json.dumps(parsed)
+        
+        profile = get_profile(mode)
+        if profile.heuristic_fallback == "genre_hints":
+            genres = heuristic_genres(context, instruction)
+            print(f"[ZEGA v2] 🧭 Unparseable {mode} output, heuristic genres: {genres}")
+            return json.dumps(genres)
+        
+        print(f"[ZEGA v2] ⚠️ Could not parse {mode} output as JSON, returning raw text")
+        return result
+    
     def learn(
         self, 
         user_id: str, 
@@ -174,6 +246,8 @@ class ZegaModelV2:
         """
         Enhanced learning with fine-tuning data collection
         
+        Blocking (SQLite and file writes): async callers run it in a thread.
+        
         Args:
             user_id: User identifier
             text: Generated text that was accepted
@@ -183,13 +257,14 @@ class ZegaModelV2:
         try:
             # 1. Store in RAG memory (original behavior)
             if feedback_score > 0.5:
+                self.agent_pool.invalidate_style(user_id)
                 self.memory.add_experience(
                     user_id=user_id,
                     text=text,
                     metadata={
                         "timestamp": str(time.time()),
                         "score": feedback_score,
-                        "model_version": self.training_metrics["model_version"],
+                        "model_version": self.model_version,
                         **(context or {})
                     }
                 )
@@ -205,13 +280,8 @@ class ZegaModelV2:
                     )
                 
                 # 3. Track metrics
-                self.training_metrics["total_learns"] += 1
-                self.training_metrics["user_feedback_scores"].append(feedback_score)
-                
-                # Keep only last 1000 scores
-                if len(self.training_metrics["user_feedback_scores"]) > 1000:
-                    self.training_metrics["user_feedback_scores"] = \
-                        self.training_metrics["user_feedback_scores"][-1000:]
+                self.state.incr("total_learns")
+                self.state.add_feedback_score(feedback_score)  # Keeps only the last 1000
                 
                 # 4. Check if ready for fine-tuning
                 if self.finetuning.should_trigger_fine_tuning(user_id, threshold=50):
@@ -226,7 +296,10 @@ class ZegaModelV2:
     
     async def trigger_user_fine_tuning(self, user_id: str) -> bool:
         """Manually trigger fine-tuning for a user"""
-        return await self.finetuning.trigger_fine_tuning(user_id)
+        success = await self.finetuning.trigger_fine_tuning(user_id)
+        if success:
+            self.agent_pool.reset_model_routing(user_id)
+        return success
     
     def get_user_training_stats(self, user_id: str) -> Dict[str, Any]:
         """Get training statistics for user"""
@@ -299,17 +372,23 @@ class ZegaModelV2:
     
     def get_metrics(self) -> Dict[str, Any]:
         """Get system metrics"""
+        training_metrics = self.training_metrics
         avg_score = (
-            sum(self.training_metrics["user_feedback_scores"]) / 
-            len(self.training_metrics["user_feedback_scores"])
-            if self.training_metrics["user_feedback_scores"] else 0
+            sum(training_metrics["user_feedback_scores"]) / 
+            len(training_metrics["user_feedback_scores"])
+            if training_metrics["user_feedback_scores"] else 0
         )
         
         return {
-            **self.training_metrics,
+            **training_metrics,
             "average_feedback_score": round(avg_score, 2),
             "active_models": self.ensemble.get_available_models(),
-            "total_models": len(self.ensemble.teachers)
+            "total_models": len(self.ensemble.teachers),
+            "agent_sessions": self.agent_pool.get_stats(),
+            "coalescing": {
+                "predict": self.singleflight.get_stats(),
+                "ensemble": self.ensemble.singleflight.get_stats()
+            }
         }
     
     def _build_system_prompt(self, mode: str, style_context: str) -> str:
@@ -3,23 +3,34 @@ Ollama Teacher Integration for ZEGA
 Adds local Ollama models as teachers in the ensemble
 """
 import asyncio
+import os
 import httpx
 import json
 from typing import Dict, Any, Optional
+from .telemetry import GENERATED_TOKENS
 
 class OllamaTeacher:
-    def __init__(self, model_name: str, base_url: str = "http://localhost:11434"):
+    def __init__(self, model_name: str, base_url: str = None):
         self.model_name = model_name
-        self.base_url = base_url
-        self.api_url = f"{base_url}/api/generate"
+        # OLLAMA_BASE_URL lets benchmarks point teachers at a local mock server
+        self.base_url = base_url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+        self.api_url = f"{self.base_url}/api/generate"
         
-    async def generate(self, prompt: str, system: str = None) -> str:
+    async def generate(
+        self,
+        prompt: str,
+        system: str = None,
+        max_tokens: int = None,
+        json_mode: bool = False
+    ) -> str:
         """
         Generate text using Ollama model.
         
         Args:
             prompt: The user prompt
             system: Optional system message
+            max_tokens: Override num_predict (default 2048)
+            json_mode: Constrain output to a JSON object (Ollama format="json")
             
         Returns:
             Generated text content
@@ -33,10 +44,13 @@ class OllamaTeacher:
                     "temperature": 0.8,
                     "top_p": 0.9,
                     "top_k": 40,
-                    "num_predict": 2048,  # Max tokens
+                    "num_predict": max_tokens or 2048,  # Max tokens
                 }
             }
             
+            if json_mode:
+                payload["format"] = "json"
+            
             # Add system message if provided
             if system:
                 payload["system"] = system
@@ -48,6 +62,8 @@ class OllamaTeacher:
                 )
                 response.raise_for_status()
                 result = response.json()
+                if result.get("eval_count"):
+                    GENERATED_TOKENS.labels("ollama").inc(result["eval_count"])
                 return result.get("response", "")
                 
         except httpx.TimeoutException:
@@ -64,7 +80,12 @@ class OllamaTeacher:
                 response = await client.get(f"{self.base_url}/api/tags")
                 if response.status_code == 200:
                     models = response.json().get("models", [])
-                    return any(m.get("name", "").startswith(self.model_name) for m in models)
+                    # Exact name or name:tag, so "zega-user1" never matches "zega-user10"
+                    return any(
+                        m.get("name", "") == self.model_name
+                        or m.get("name", "").startswith(f"{self.model_name}:")
+                        for m in models
+                    )
         except:
             pass
         return False
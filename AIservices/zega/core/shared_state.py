@@ -0,0 +1,185 @@
+"""
+Shared State for ZEGA
+Multi-process-safe metrics and adapter storage (SQLite WAL) plus file-locking helpers
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows (start-*.bat)
+    fcntl = None
+    import msvcrt
+
+MAX_FEEDBACK_SCORES = 1000
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Exclusive advisory lock on `<path>.lock`, held across uvicorn workers"""
+    lock_path = Path(f"{path}.lock")
+    with open(lock_path, "a+") as handle:
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+def atomic_write_json(path: Path, data: Any):
+    """Write to a temp file and rename, so readers never see a half-written file"""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+def append_line(path: Path, line: str):
+    """Append one JSONL record; the lock keeps long lines from interleaving"""
+    with file_lock(path):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line if line.endswith("\n") else line + "\n")
+
+class SharedState:
+    """
+    Counters, feedback scores and LoRA adapter weights in one SQLite database.
+
+    WAL mode lets every uvicorn worker read while one writes; increments and
+    adapter updates run as single transactions, so concurrent /predict and
+    /learn calls in different workers never overwrite each other.
+    """
+
+    def __init__(self, db_path: str = "zega_checkpoints/zega_state.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connection().executescript("""
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS feedback_scores (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                score REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS adapters (
+                user_id TEXT PRIMARY KEY,
+                weights TEXT NOT NULL
+            );
+        """)
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread (to_thread workers included)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """BEGIN IMMEDIATE takes the write lock up front, so read-modify-write is atomic"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    # === Counters and feedback ===
+
+    def incr(self, name: str, amount: int = 1) -> int:
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO counters (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (name, amount)
+            )
+            return conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()[0]
+
+    def get_counter(self, name: str) -> int:
+        row = self._connection().execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def add_feedback_score(self, score: float):
+        """Record a score, keeping only the most recent MAX_FEEDBACK_SCORES"""
+        with self._transaction() as conn:
+            cursor = conn.execute("INSERT INTO feedback_scores (score) VALUES (?)", (score,))
+            conn.execute(
+                "DELETE FROM feedback_scores WHERE id <= ?",
+                (cursor.lastrowid - MAX_FEEDBACK_SCORES,)
+            )
+
+    def get_feedback_scores(self) -> List[float]:
+        rows = self._connection().execute("SELECT score FROM feedback_scores ORDER BY id").fetchall()
+        return [r[0] for r in rows]
+
+    def import_metrics(self, metrics: Dict[str, Any]) -> bool:
+        """One-time import of a legacy training_metrics.json; skipped once counters exist"""
+        with self._transaction() as conn:
+            if conn.execute("SELECT COUNT(*) FROM counters").fetchone()[0]:
+                return False
+            for name in ("total_predictions", "total_learns"):
+                conn.execute(
+                    "INSERT INTO counters (name, value) VALUES (?, ?)",
+                    (name, int(metrics.get(name, 0)))
+                )
+            conn.executemany(
+                "INSERT INTO feedback_scores (score) VALUES (?)",
+                [(s,) for s in metrics.get("user_feedback_scores", [])[-MAX_FEEDBACK_SCORES:]]
+            )
+            return True
+
+    # === LoRA adapters ===
+
+    def get_adapter(self, user_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            "SELECT weights FROM adapters WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update_adapter(
+        self,
+        user_id: str,
+        update: Callable[[Dict[str, Any]], None],
+        default: Callable[[], Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Apply `update` to the latest stored weights inside one write transaction"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT weights FROM adapters WHERE user_id = ?", (user_id,)).fetchone()
+            weights = json.loads(row[0]) if row else default()
+            update(weights)
+            conn.execute(
+                "INSERT INTO adapters (user_id, weights) VALUES (?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET weights = excluded.weights",
+                (user_id, json.dumps(weights))
+            )
+            return weights
+
+    def put_adapter_if_missing(self, user_id: str, weights: Dict[str, Any]):
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO adapters (user_id, weights) VALUES (?, ?)",
+                (user_id, json.dumps(weights))
+            )
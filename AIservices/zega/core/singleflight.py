@@ -0,0 +1,59 @@
+"""
+Single-Flight Request Coalescing
+Concurrent calls with the same key share one in-flight execution
+"""
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict
+from .telemetry import CACHE_REQUESTS
+
+def make_key(*parts: Any) -> str:
+    """Build a stable key from normalized request parts"""
+    normalized = [
+        " ".join(p.split()) if isinstance(p, str) else p
+        for p in parts
+    ]
+    raw = json.dumps(normalized, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class SingleFlight:
+    """
+    Deduplicates identical in-flight async calls.
+
+    The first caller for a key (the leader) runs the work as a task; callers
+    arriving while it runs await the same task. Results are not cached after
+    completion. The task is shielded, so one cancelled caller does not cancel
+    the shared work for the others.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {"leaders": 0, "coalesced": 0, "errors": 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn() once per key across concurrent callers"""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            CACHE_REQUESTS.labels(self.name, "coalesced").inc()
+            print(f"[SINGLEFLIGHT] 🔗 {self.name}: joined in-flight call")
+            return await asyncio.shield(task)
+
+        self.stats["leaders"] += 1
+        CACHE_REQUESTS.labels(self.name, "leader").inc()
+        task = asyncio.ensure_future(fn())
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["errors"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Coalescing counters"""
+        return {**self.stats, "inflight": len(self._inflight)}
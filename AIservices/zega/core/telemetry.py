@@ -0,0 +1,36 @@
+"""
+Core Telemetry
+Core-side access to the shared zega_telemetry registry (sibling package in AIservices)
+"""
+import sys
+from pathlib import Path
+
+# api.py only puts zega/ on the path; zega_telemetry lives next to it
+_services_dir = str(Path(__file__).resolve().parents[2])
+if _services_dir not in sys.path:
+    sys.path.insert(0, _services_dir)
+
+from zega_telemetry import (
+    registry,
+    instrument_app,
+    render_metrics,
+    PROMETHEUS_CONTENT_TYPE,
+    PROVIDER_CALLS,
+    PROVIDER_RETRIES,
+    GENERATED_CHARS,
+    GENERATED_TOKENS,
+    CACHE_REQUESTS,
+    MEMORY_QUERY_SECONDS,
+    AUTOTRAIN_EXAMPLES,
+)
+
+def provider_outcome(error: str = None) -> str:
+    """Bucket a provider error message into ok / rate_limited / timeout / error"""
+    if not error:
+        return "ok"
+    lowered = error.lower()
+    if "429" in lowered or "rate limit" in lowered or "quota" in lowered:
+        return "rate_limited"
+    if "timeout" in lowered or "timed out" in lowered:
+        return "timeout"
+    return "error"
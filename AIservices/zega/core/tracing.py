@@ -0,0 +1,142 @@
+"""
+Request Tracing for ZEGA
+Spans with async context propagation, per-stage latency histograms, Prometheus export
+"""
+import json
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+from .logger import get_logger
+from .telemetry import registry
+
+trace_logger = get_logger('zega.trace')
+
+@dataclass
+class Span:
+    """One timed stage of a request"""
+    name: str
+    span_id: str
+    parent_id: Optional[str]
+    start: float
+    end: Optional[float] = None
+    status: str = "ok"
+    error: Optional[str] = None
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def set_error(self, error: Any):
+        """Mark failed without raising (e.g. providers returning ModelResponse.error)"""
+        self.status = "error"
+        self.error = str(error)[:200]
+
+@dataclass
+class Trace:
+    """All spans recorded under one traced request"""
+    trace_id: str
+    start: float = field(default_factory=time.perf_counter)
+    spans: List[Span] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "duration_ms": round((time.perf_counter() - self.start) * 1000, 2),
+            "spans": [
+                {
+                    "name": s.name,
+                    "span_id": s.span_id,
+                    "parent_id": s.parent_id,
+                    "start_ms": round((s.start - self.start) * 1000, 2),
+                    "duration_ms": round(s.duration * 1000, 2),
+                    "status": s.status,
+                    **({"error": s.error} if s.error else {}),
+                    **({"attrs": s.attrs} if s.attrs else {}),
+                }
+                for s in sorted(self.spans, key=lambda s: s.start)
+            ]
+        }
+
+class StageHistograms:
+    """Per-stage latency histograms keyed by (stage, provider), kept in the shared registry"""
+
+    def __init__(self):
+        self.durations = registry.histogram(
+            "zega_stage_duration_seconds", "Latency of prediction pipeline stages", ["stage", "provider"])
+        self.errors = registry.counter(
+            "zega_stage_errors_total", "Failed pipeline stages", ["stage", "provider"])
+
+    def observe(self, stage: str, seconds: float, provider: str = "", error: bool = False):
+        self.durations.labels(stage, provider).observe(seconds)
+        if error:
+            self.errors.labels(stage, provider).inc()
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """JSON summary: count, errors and mean per stage"""
+        errors = {values: child.value for values, child in self.errors.items()}
+        return {
+            f"{stage}:{provider}" if provider else stage: {
+                "count": h.count,
+                "errors": int(errors.get((stage, provider), 0)),
+                "mean_ms": round(h.sum / h.count * 1000, 2) if h.count else 0.0
+            }
+            for (stage, provider), h in self.durations.items()
+        }
+
+stage_histograms = StageHistograms()
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("zega_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("zega_span", default=None)
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[Span]:
+    """
+    Time a stage. Nested spans (including ones in tasks spawned inside, since
+    asyncio copies context) become children. Always feeds stage_histograms;
+    spans are only kept when a trace is active.
+    """
+    parent = _current_span.get()
+    current = Span(
+        name=name,
+        span_id=uuid.uuid4().hex[:8],
+        parent_id=parent.span_id if parent else None,
+        start=time.perf_counter(),
+        attrs=attrs
+    )
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set_error(e)
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+        stage_histograms.observe(
+            name, current.end - current.start,
+            provider=str(attrs.get("provider", "")),
+            error=current.status == "error"
+        )
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append(current)
+
+@contextmanager
+def start_trace(trace_id: Optional[str] = None) -> Iterator[Trace]:
+    """Collect every span opened inside this block into one Trace"""
+    trace = Trace(trace_id=trace_id or uuid.uuid4().hex)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        if trace_logger.isEnabledFor(logging.DEBUG):
+            trace_logger.debug(json.dumps(trace.to_dict()))
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
@@ -0,0 +1,26 @@
+"""
+ZEGA Artifacts
+Content-addressed storage for generated images and audio, shared by the image and voice services
+"""
+
+__version__ = "1.0.0"
+
+from .store import (
+    Artifact,
+    ArtifactStore,
+    get_store,
+    sniff_content_type,
+)
+from .routes import (
+    add_artifact_routes,
+    artifact_url,
+    parse_range,
+)
+from .streams import (
+    ZipStreamWriter,
+    extension_for,
+    iter_source,
+    multipart_part_head,
+    multipart_close,
+    new_boundary,
+)
@@ -0,0 +1,120 @@
+"""
+Artifact Routes
+Serves stored artifacts by ID with ETag revalidation and HTTP Range requests
+"""
+import asyncio
+import re
+from typing import Optional, Tuple
+
+from .store import ArtifactStore
+
+CHUNK_SIZE = 256 * 1024
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (start, end) for a single `bytes=` range, or None to serve the
+    whole body (absent, malformed or multi-range headers). Raises ValueError
+    if the range cannot be satisfied.
+    """
+    match = _RANGE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("range outside the artifact")
+    return start, end
+
+async def _iter_file(path, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+def artifact_url(request, artifact_id: str) -> str:
+    """Absolute URL of an artifact on the serving app, mount prefix included"""
+    return str(request.url_for("get_artifact", artifact_id=artifact_id))
+
+def add_artifact_routes(app, store: ArtifactStore, prefix: str = "/artifacts", transform=None):
+    """
+    GET/HEAD {prefix}/{id} for the bytes, GET {prefix}/{id}/meta for the index entry.
+
+    `transform(artifact, request)` may return a derived artifact to serve in
+    place of the original (a resized or transcoded image); responses then
+    carry `Vary: Accept`.
+    """
+    from fastapi import HTTPException, Request
+    from fastapi.responses import Response, StreamingResponse
+
+    async def get_artifact(artifact_id: str, request: Request):
+        artifact = await asyncio.to_thread(store.get, artifact_id)
+        if artifact is None:
+            raise HTTPException(status_code=404, detail="Artifact not found")
+        if transform:
+            artifact = await transform(artifact, request)
+
+        headers = {
+            "ETag": artifact.etag,
+            "Accept-Ranges": "bytes",
+            # Same ID always means the same bytes
+            "Cache-Control": "public, max-age=31536000, immutable",
+        }
+        if transform:
+            headers["Vary"] = "Accept"
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or artifact.etag in if_none_match):
+            return Response(status_code=304, headers=headers)
+
+        byte_range = None
+        range_header = request.headers.get("range")
+        if_range = request.headers.get("if-range")
+        if range_header and (not if_range or if_range.strip() == artifact.etag):
+            try:
+                byte_range = parse_range(range_header, artifact.size)
+            except ValueError:
+                return Response(
+                    status_code=416,
+                    headers={**headers, "Content-Range": f"bytes */{artifact.size}"}
+                )
+
+        status = 200
+        start, length = 0, artifact.size
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{artifact.size}"
+        headers["Content-Length"] = str(length)
+
+        if request.method == "HEAD":
+            return Response(status_code=status, headers=headers, media_type=artifact.content_type)
+        return StreamingResponse(
+            _iter_file(store.path(artifact.id), start, length),
+            status_code=status,
+            headers=headers,
+            media_type=artifact.content_type
+        )
+
+    async def get_artifact_meta(artifact_id: str):
+        artifact = await asyncio.to_thread(store.get, artifact_id, False)
+        if artifact is None:
+            raise HTTPException(status_code=404, detail="Artifact not found")
+        return artifact.to_dict()
+
+    app.add_api_route(f"{prefix}/{{artifact_id}}", get_artifact, methods=["GET", "HEAD"], name="get_artifact")
+    app.add_api_route(f"{prefix}/{{artifact_id}}/meta", get_artifact_meta, methods=["GET"])
@@ -0,0 +1,365 @@
+"""
+Artifact Store
+Content-addressed blob storage (sha256, hash-sharded directories) with a SQLite metadata index
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+DEFAULT_ROOT = Path(__file__).parent.parent / "artifact_store"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+# Eviction trims to this fraction of the budget so every put doesn't evict again
+EVICT_LOW_WATERMARK = 0.9
+
+# last_access is only rewritten when older than this, so hot reads stay read-only
+TOUCH_INTERVAL = 60.0
+
+_MAGIC = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"ID3", "audio/mpeg"),
+    (b"OggS", "audio/ogg"),
+    (b"fLaC", "audio/flac"),
+]
+
+def sniff_content_type(data: bytes, default: str = "application/octet-stream") -> str:
+    """Content type from the leading bytes; providers don't always return what they claim"""
+    for magic, content_type in _MAGIC:
+        if data.startswith(magic):
+            return content_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        return "audio/wav"
+    if len(data) > 1 and data[0] == 0xFF and data[1] & 0xE0 == 0xE0:
+        return "audio/mpeg"  # Bare MPEG frame sync, no ID3 tag
+    return default
+
+@dataclass
+class Artifact:
+    """One stored blob; `id` is the hex sha256 of its bytes"""
+    id: str
+    size: int
+    content_type: str
+    kind: str
+    created_at: float
+    last_access: float
+    pinned: bool = False
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def etag(self) -> str:
+        # Content-addressed, so the hash is a strong validator
+        return f'"{self.id}"'
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "size": self.size,
+            "content_type": self.content_type,
+            "kind": self.kind,
+            "created_at": self.created_at,
+            "pinned": self.pinned,
+            "metadata": self.metadata,
+        }
+
+class ArtifactStore:
+    """
+    Blobs live at `<root>/objects/ab/cd/<sha256>`; the index (size, type,
+    access time, metadata) is a SQLite WAL database next to them, so the
+    image and voice services, and their uvicorn workers, can share one store.
+
+    Identical bytes are stored once. Unpinned artifacts are evicted least
+    recently used first once the store exceeds `max_bytes`; pinned ones
+    (e.g. training data) are never evicted.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.root = Path(root or os.getenv("ZEGA_ARTIFACT_DIR", str(DEFAULT_ROOT)))
+        self.objects = self.root / "objects"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes or int(os.getenv("ZEGA_ARTIFACT_MAX_BYTES", str(DEFAULT_MAX_BYTES)))
+        self.max_age = float(os.getenv("ZEGA_ARTIFACT_MAX_AGE_DAYS", "0")) * 86400
+        self._local = threading.local()
+        # Schema outside _transaction: executescript commits implicitly
+        self._connection().executescript("""
+            CREATE TABLE IF NOT EXISTS artifacts (
+                id TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                content_type TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                pinned INTEGER NOT NULL DEFAULT 0,
+                metadata TEXT NOT NULL DEFAULT '{}'
+            );
+            CREATE INDEX IF NOT EXISTS artifacts_lru ON artifacts (pinned, last_access);
+            CREATE TABLE IF NOT EXISTS derived (
+                source_id TEXT NOT NULL,
+                variant TEXT NOT NULL,
+                artifact_id TEXT NOT NULL,
+                PRIMARY KEY (source_id, variant)
+            );
+            CREATE INDEX IF NOT EXISTS derived_artifact ON derived (artifact_id);
+        """)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.root / "index.db", timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def path(self, artifact_id: str) -> Path:
+        return self.objects / artifact_id[:2] / artifact_id[2:4] / artifact_id
+
+    @staticmethod
+    def _row_to_artifact(row) -> Artifact:
+        return Artifact(
+            id=row[0], size=row[1], content_type=row[2], kind=row[3],
+            created_at=row[4], last_access=row[5], pinned=bool(row[6]),
+            metadata=json.loads(row[7])
+        )
+
+    # === Write ===
+
+    def put(
+        self,
+        data: bytes,
+        kind: str,
+        content_type: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        pin: bool = False
+    ) -> Artifact:
+        """Store `data` (once per distinct content) and return its index entry"""
+        artifact_id = hashlib.sha256(data).hexdigest()
+        content_type = content_type or sniff_content_type(data)
+        path = self.path(artifact_id)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{artifact_id[:8]}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                raise
+
+        now = time.time()
+        with self._transaction() as conn:
+            # A repeat put refreshes recency and can pin, but keeps the first metadata
+            conn.execute(
+                "INSERT INTO artifacts (id, size, content_type, kind, created_at, last_access, pinned, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET last_access = excluded.last_access, "
+                "pinned = MAX(pinned, excluded.pinned)",
+                (artifact_id, len(data), content_type, kind, now, now, int(pin), json.dumps(metadata or {}))
+            )
+            row = conn.execute("SELECT * FROM artifacts WHERE id = ?", (artifact_id,)).fetchone()
+
+        self.evict()
+        return self._row_to_artifact(row)
+
+    def pin(self, artifact_id: str, pinned: bool = True) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute("UPDATE artifacts SET pinned = ? WHERE id = ?", (int(pinned), artifact_id))
+            return cursor.rowcount > 0
+
+    def delete(self, artifact_id: str) -> bool:
+        with self._transaction() as conn:
+            cursor = conn.execute("DELETE FROM artifacts WHERE id = ?", (artifact_id,))
+            self._forget_derived(conn, [artifact_id])
+        self._unlink(artifact_id)
+        return cursor.rowcount > 0
+
+    # === Derived artifacts (thumbnails, transcodes) ===
+
+    def put_derived(
+        self,
+        source_id: str,
+        variant: str,
+        data: bytes,
+        kind: str,
+        content_type: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Artifact:
+        """Store a rendition of `source_id`; it is unpinned and dropped with its source"""
+        artifact = self.put(data, kind, content_type, {**(metadata or {}), "source": source_id, "variant": variant})
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO derived (source_id, variant, artifact_id) VALUES (?, ?, ?) "
+                "ON CONFLICT(source_id, variant) DO UPDATE SET artifact_id = excluded.artifact_id",
+                (source_id, variant, artifact.id)
+            )
+        return artifact
+
+    def get_derived(self, source_id: str, variant: str) -> Optional[Artifact]:
+        row = self._connection().execute(
+            "SELECT artifact_id FROM derived WHERE source_id = ? AND variant = ?", (source_id, variant)
+        ).fetchone()
+        if row is None:
+            return None
+        artifact = self.get(row[0])
+        if artifact is None:
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM derived WHERE source_id = ? AND variant = ?", (source_id, variant))
+        return artifact
+
+    @staticmethod
+    def _forget_derived(conn: sqlite3.Connection, artifact_ids: List[str]):
+        # Renditions of a removed source go too; their own blobs age out through LRU
+        conn.executemany(
+            "DELETE FROM derived WHERE source_id = ? OR artifact_id = ?",
+            [(a, a) for a in artifact_ids]
+        )
+
+    # === Read ===
+
+    def get(self, artifact_id: str, touch: bool = True) -> Optional[Artifact]:
+        """Index entry for `artifact_id`, or None if unknown or its blob is gone"""
+        if len(artifact_id) != 64:
+            return None
+        row = self._connection().execute("SELECT * FROM artifacts WHERE id = ?", (artifact_id,)).fetchone()
+        if row is None:
+            return None
+        if not self.path(artifact_id).exists():
+            # Lost a race with eviction in another process; drop the stale row
+            self.delete(artifact_id)
+            return None
+        artifact = self._row_to_artifact(row)
+        now = time.time()
+        if touch and now - artifact.last_access > TOUCH_INTERVAL:
+            with self._transaction() as conn:
+                conn.execute("UPDATE artifacts SET last_access = ? WHERE id = ?", (now, artifact_id))
+            artifact.last_access = now
+        return artifact
+
+    def read(self, artifact_id: str) -> Optional[bytes]:
+        if self.get(artifact_id) is None:
+            return None
+        try:
+            return self.path(artifact_id).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def list(self, kind: Optional[str] = None, limit: int = 100) -> List[Artifact]:
+        query = "SELECT * FROM artifacts"
+        params: tuple = ()
+        if kind:
+            query += " WHERE kind = ?"
+            params = (kind,)
+        rows = self._connection().execute(
+            query + " ORDER BY created_at DESC LIMIT ?", params + (limit,)
+        ).fetchall()
+        return [self._row_to_artifact(r) for r in rows]
+
+    # === Retention ===
+
+    def _unlink(self, artifact_id: str):
+        try:
+            self.path(artifact_id).unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # Windows refuses to delete a file another worker is still serving
+            print(f"[ARTIFACTS] ⚠️ Could not remove {artifact_id[:12]}: {e}")
+
+    def total_bytes(self) -> int:
+        return self._connection().execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+
+    def evict(self) -> int:
+        """
+        Drop expired unpinned artifacts, then least recently used ones until
+        the store is under EVICT_LOW_WATERMARK of `max_bytes`. Returns bytes freed.
+        """
+        expired_before = time.time() - self.max_age if self.max_age else None
+        if expired_before is None and self.total_bytes() <= self.max_bytes:
+            return 0
+
+        victims: List[str] = []
+        freed = 0
+        with self._transaction() as conn:
+            if expired_before is not None:
+                for artifact_id, size in conn.execute(
+                    "SELECT id, size FROM artifacts WHERE pinned = 0 AND last_access < ?", (expired_before,)
+                ).fetchall():
+                    victims.append(artifact_id)
+                    freed += size
+
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0] - freed
+            if total > self.max_bytes:
+                target = self.max_bytes * EVICT_LOW_WATERMARK
+                for artifact_id, size in conn.execute(
+                    "SELECT id, size FROM artifacts WHERE pinned = 0 ORDER BY last_access"
+                ):
+                    if total <= target:
+                        break
+                    if artifact_id in victims:
+                        continue
+                    victims.append(artifact_id)
+                    freed += size
+                    total -= size
+
+            conn.executemany("DELETE FROM artifacts WHERE id = ?", [(v,) for v in victims])
+            self._forget_derived(conn, victims)
+
+        # Rows are gone first, so no new request is handed a blob we are about to unlink
+        for artifact_id in victims:
+            self._unlink(artifact_id)
+        if victims:
+            print(f"[ARTIFACTS] 🧹 Evicted {len(victims)} artifacts ({freed / 1024 ** 2:.1f} MB)")
+        return freed
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connection()
+        by_kind = {
+            kind: {"count": count, "bytes": size}
+            for kind, count, size in conn.execute(
+                "SELECT kind, COUNT(*), SUM(size) FROM artifacts GROUP BY kind"
+            ).fetchall()
+        }
+        pinned = conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts WHERE pinned = 1").fetchone()[0]
+        return {
+            "root": str(self.root),
+            "total_bytes": self.total_bytes(),
+            "pinned_bytes": pinned,
+            "max_bytes": self.max_bytes,
+            "by_kind": by_kind,
+        }
+
+_default_store: Optional[ArtifactStore] = None
+_default_lock = threading.Lock()
+
+def get_store() -> ArtifactStore:
+    """Process-wide store at ZEGA_ARTIFACT_DIR, shared by the image and voice services"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = ArtifactStore()
+        return _default_store
@@ -20,6 +20,7 @@ from dotenv import load_dotenv
 load_dotenv(dotenv_path=Path(__file__).parent.parent / '.env')
 
 from zega_docparser.parser import ZegaDocParser, ParsedScene
+from zega_telemetry import instrument_app
 
 app = FastAPI(
     title="ZEGA Document Parser Service",
@@ -36,6 +37,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Shared metrics: request timing, loop lag and Prometheus text on /metrics
+instrument_app(app, "docparser")
+
 # Initialize parser
 parser = ZegaDocParser(
     training_data_path=str(Path(__file__).parent / "training_data")
@@ -10,19 +10,28 @@ from pathlib import Path
 # Add parent directory for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response, StreamingResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
+import asyncio
 import base64
 import io
+import json
 from dotenv import load_dotenv
 
 # Load environment
 load_dotenv(dotenv_path=Path(__file__).parent.parent / '.env')
 
 from zega_image.generator import ZegaImageGenerator, SceneContext
+from zega_image.postprocess import ImagePostProcessor, THUMBNAIL_WIDTH
+from zega_image.jobs import verify_webhook
+from zega_telemetry import instrument_app
+from zega_artifacts import (
+    get_store, add_artifact_routes, artifact_url, sniff_content_type,
+    ZipStreamWriter, extension_for, iter_source, multipart_part_head, multipart_close, new_boundary
+)
 
 app = FastAPI(
     title="ZEGA Image Generation Service",
@@ -39,10 +48,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Shared metrics: request timing, loop lag and Prometheus text on /metrics
+instrument_app(app, "image")
+
+# Generated images are served by reference from the shared artifact store;
+# ?w= and the Accept header select resized / WebP / AVIF renditions
+artifacts = get_store()
+postprocessor = ImagePostProcessor(artifacts)
+add_artifact_routes(app, artifacts, transform=postprocessor.transform)
+app.add_event_handler("shutdown", postprocessor.close)
+
 # Initialize generator
 generator = ZegaImageGenerator(
-    training_data_path=str(Path(__file__).parent / "training_data")
+    training_data_path=str(Path(__file__).parent / "training_data"),
+    artifact_store=artifacts
 )
+for _provider in generator.providers:
+    if hasattr(_provider, "tracker"):
+        app.add_event_handler("shutdown", _provider.tracker.close)
 
 # Request/Response Models
 class CharacterInfo(BaseModel):
@@ -61,6 +84,103 @@ class GenerateImageRequest(BaseModel):
     style_preferences: Optional[str] = None
     story_genre: Optional[str] = None
     num_variations: int = 1
+    include_data: bool = False  # Also inline the image as a base64 data URI
+    use_cache: bool = True
+    deadline_seconds: Optional[float] = None  # Return what is ready by then (ZEGA_IMAGE_DEADLINE)
+    response_mode: Optional[str] = None  # json | urls | binary | multipart | zip; None: from Accept
+
+RESPONSE_MODES = ("json", "urls", "binary", "multipart", "zip")
+
+def _response_mode(request: GenerateImageRequest, http_request: Request) -> str:
+    """Explicit response_mode wins; otherwise the Accept header picks a binary format"""
+    if request.response_mode:
+        if request.response_mode not in RESPONSE_MODES:
+            raise HTTPException(status_code=400, detail=f"response_mode must be one of {', '.join(RESPONSE_MODES)}")
+        return request.response_mode
+    accept = http_request.headers.get("accept", "")
+    if "application/zip" in accept:
+        return "zip"
+    if "multipart/mixed" in accept:
+        return "multipart"
+    if accept.startswith("image/"):
+        return "binary"
+    return "json"
+
+def _image_source(result):
+    """(body source, content type): the artifact file when stored, else the in-memory bytes"""
+    content_type = sniff_content_type(result.image_data, "image/png")
+    if result.artifact_id:
+        return artifacts.path(result.artifact_id), content_type
+    return result.image_data, content_type
+
+def _image_headers(result) -> Dict[str, str]:
+    headers = {
+        "X-Provider": result.provider,
+        "X-Model": result.model_used,
+        "X-Cache": _cache_header([result]),
+    }
+    if result.artifact_id:
+        headers["X-Artifact-Id"] = result.artifact_id
+        headers["ETag"] = f'"{result.artifact_id}"'
+    return headers
+
+def _scene_context(request: GenerateImageRequest) -> SceneContext:
+    return SceneContext(
+        scene_title=request.scene_title,
+        scene_description=request.scene_description,
+        characters=[c.dict() for c in request.characters],
+        previous_scene_description=request.previous_scene_description,
+        previous_scene_images=request.previous_scene_images,
+        user_uploaded_images=request.user_uploaded_images,
+        style_preferences=request.style_preferences,
+        story_genre=request.story_genre
+    )
+
+def _image_payload(result, include_data: bool, http_request: Request) -> Optional[Dict[str, Any]]:
+    """One entry of ImageResponse.images; None for a failed result"""
+    if result.success and result.image_data:
+        content_type = sniff_content_type(result.image_data, "image/png")
+        url = artifact_url(http_request, result.artifact_id) if result.artifact_id else None
+        image = {
+            "artifact_id": result.artifact_id,
+            "artifact_url": url,
+            "thumbnail_url": f"{url}?w={THUMBNAIL_WIDTH}" if url and postprocessor.available else None,
+            "srcset": postprocessor.srcset(url) if url and postprocessor.available else None,
+            "content_type": content_type,
+            "size": len(result.image_data),
+            "provider": result.provider,
+            "model": result.model_used,
+            "generation_time": result.generation_time,
+            "url": result.image_url,  # Some providers return URLs
+            "cache": result.cache_status
+        }
+        if include_data or not result.artifact_id:
+            image_b64 = base64.b64encode(result.image_data).decode('utf-8')
+            image["data"] = f"data:{content_type};base64,{image_b64}"
+        return image
+    if result.image_url:
+        return {
+            "url": result.image_url,
+            "provider": result.provider,
+            "model": result.model_used,
+            "generation_time": result.generation_time
+        }
+    return None
+
+def _wants_cache(use_cache: bool, http_request: Request) -> bool:
+    """Request flag, overridable per call with Cache-Control: no-cache"""
+    return use_cache and "no-cache" not in http_request.headers.get("cache-control", "")
+
+def _cache_header(results) -> str:
+    """X-Cache value: HIT / NEAR when everything came from the cache, PARTIAL if some did"""
+    statuses = {r.cache_status for r in results if r.success}
+    if not statuses or statuses == {None}:
+        return "BYPASS"
+    if statuses == {"miss"}:
+        return "MISS"
+    if "miss" in statuses:
+        return "PARTIAL"
+    return "NEAR" if "near" in statuses else "HIT"
 
 class ImageResponse(BaseModel):
     success: bool
@@ -78,53 +198,42 @@ async def health():
     }
 
 @app.post("/generate", response_model=ImageResponse)
-async def generate_image(request: GenerateImageRequest):
+async def generate_image(request: GenerateImageRequest, http_request: Request, response: Response):
     """
     Generate scene image(s) based on context
     
     This endpoint uses multiple AI providers (Pollinations, HuggingFace, Stability AI)
-    to generate images that match your scene description and characters.
+    concurrently to generate images that match your scene description and characters.
+    Images are returned as artifact IDs/URLs; set include_data for inline base64,
+    or response_mode (or Accept) for binary, multipart/mixed or zip output.
+    Repeat (or near-identical) scene prompts are served from the image cache;
+    the X-Cache header says whether they were.
     """
     try:
-        # Build scene context
-        context = SceneContext(
-            scene_title=request.scene_title,
-            scene_description=request.scene_description,
-            characters=[c.dict() for c in request.characters],
-            previous_scene_description=request.previous_scene_description,
-            previous_scene_images=request.previous_scene_images,
-            user_uploaded_images=request.user_uploaded_images,
-            style_preferences=request.style_preferences,
-            story_genre=request.story_genre
-        )
+        mode = _response_mode(request, http_request)
+        if mode in ("binary", "multipart", "zip"):
+            return await _binary_response(request, http_request, mode)
         
         # Generate images
         results = await generator.generate_scene_image(
-            context=context,
+            context=_scene_context(request),
             num_variations=request.num_variations,
-            save_for_training=True
+            save_for_training=True,
+            use_cache=_wants_cache(request.use_cache, http_request),
+            deadline=request.deadline_seconds
         )
+        response.headers["X-Cache"] = _cache_header(results)
         
         # Format response
-        images = []
-        for result in results:
-            if result.success and result.image_data:
-                # Convert to base64 for JSON response
-                image_b64 = base64.b64encode(result.image_data).decode('utf-8')
-                images.append({
-                    "data": f"data:image/png;base64,{image_b64}",
-                    "provider": result.provider,
-                    "model": result.model_used,
-                    "generation_time": result.generation_time,
-                    "url": result.image_url  # Some providers return URLs
-                })
-            elif result.image_url:
-                images.append({
-                    "url": result.image_url,
-                    "provider": result.provider,
-                    "model": result.model_used,
-                    "generation_time": result.generation_time
-                })
+        images = [
+            image for image in (_image_payload(r, request.include_data, http_request) for r in results)
+            if image
+        ]
+        if mode == "urls":
+            images = [
+                {key: image.get(key) for key in ("artifact_id", "artifact_url", "content_type", "size")}
+                for image in images if image.get("artifact_id")
+            ]
         
         return ImageResponse(
             success=len(images) > 0,
@@ -133,31 +242,191 @@ async def generate_image(request: GenerateImageRequest):
             error=results[0].error if not images and results else None
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _binary_response(request: GenerateImageRequest, http_request: Request, mode: str):
+    """
+    Raw image bytes instead of JSON: one image as the body (binary), or every
+    variation as a multipart/mixed part or ZIP entry, each sent as soon as it
+    is generated and read from the artifact file in chunks.
+    """
+    if mode == "binary" and request.num_variations != 1:
+        raise HTTPException(status_code=400, detail="binary returns one image; use multipart or zip for variations")
+    
+    images = generator.stream_scene_images(
+        context=_scene_context(request),
+        num_variations=request.num_variations,
+        save_for_training=True,
+        use_cache=_wants_cache(request.use_cache, http_request),
+        deadline=request.deadline_seconds
+    )
+    # Wait for the first image before committing to a 200
+    try:
+        first = await images.__anext__()
+    except StopAsyncIteration:
+        raise HTTPException(status_code=502, detail="All providers failed")
+    except BaseException:
+        await images.aclose()
+        raise
+    
+    if mode == "binary":
+        await images.aclose()
+        headers = _image_headers(first)
+        fmt = postprocessor.negotiate(http_request.headers.get("accept", ""))
+        stored = await asyncio.to_thread(artifacts.get, first.artifact_id) if first.artifact_id else None
+        rendition = None
+        if stored and fmt:
+            # Transcoded for the client (WebP/AVIF), metadata stripped
+            try:
+                rendition = await postprocessor.variant(stored, fmt, None)
+            except Exception as e:
+                # The image was generated; send it as stored rather than fail the request
+                print(f"[ZEGA_ImageGen] ⚠️ Post-processing failed for {stored.id[:12]}: {e}")
+        if rendition:
+            headers.update({"ETag": rendition.etag, "X-Artifact-Id": rendition.id, "Vary": "Accept"})
+            return StreamingResponse(
+                iter_source(artifacts.path(rendition.id)),
+                media_type=rendition.content_type,
+                headers={**headers, "Content-Length": str(rendition.size)}
+            )
+        source, content_type = _image_source(first)
+        return StreamingResponse(
+            iter_source(source),
+            media_type=content_type,
+            headers={**headers, "Content-Length": str(len(first.image_data))}
+        )
+    
+    async def results():
+        yield first
+        async for result in images:
+            yield result
+    
+    if mode == "multipart":
+        boundary = new_boundary()
+        
+        async def body():
+            try:
+                index = 0
+                async for result in results():
+                    source, content_type = _image_source(result)
+                    if index:
+                        yield b"\r\n"
+                    yield multipart_part_head(
+                        boundary, content_type, len(result.image_data),
+                        f"variation-{index + 1}.{extension_for(content_type)}", _image_headers(result)
+                    )
+                    async for chunk in iter_source(source):
+                        yield chunk
+                    index += 1
+                yield multipart_close(boundary)
+            finally:
+                await images.aclose()
+        
+        return StreamingResponse(body(), media_type=f"multipart/mixed; boundary={boundary}")
+    
+    async def zip_body():
+        writer = ZipStreamWriter()
+        try:
+            index = 0
+            async for result in results():
+                source, content_type = _image_source(result)
+                name = f"variation-{index + 1}.{extension_for(content_type)}"
+                async for chunk in writer.add(name, source, comment=result.artifact_id):
+                    yield chunk
+                index += 1
+            yield writer.close()
+        finally:
+            await images.aclose()
+    
+    return StreamingResponse(
+        zip_body(),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="variations.zip"'}
+    )
+
+@app.post("/generate/stream")
+async def generate_image_stream(request: GenerateImageRequest, http_request: Request):
+    """
+    Same as /generate, but as Server-Sent Events: one "image" event per image
+    as soon as it is ready, then "complete". Disconnecting cancels the
+    provider calls still running.
+    """
+    images = generator.stream_scene_images(
+        context=_scene_context(request),
+        num_variations=request.num_variations,
+        save_for_training=True,
+        use_cache=_wants_cache(request.use_cache, http_request),
+        deadline=request.deadline_seconds
+    )
+    
+    async def events():
+        count = 0
+        try:
+            async for result in images:
+                image = _image_payload(result, request.include_data, http_request)
+                if image:
+                    count += 1
+                    yield f"data: {json.dumps({'type': 'image', 'index': count - 1, 'image': image})}\n\n"
+            yield f"data: {json.dumps({'type': 'complete', 'success': count > 0, 'count': count, 'requested': request.num_variations})}\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+        finally:
+            await images.aclose()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
 @app.get("/generate/quick")
 async def generate_quick(
+    http_request: Request,
+    response: Response,
     prompt: str,
     style: str = "cinematic",
     width: int = 1024,
-    height: int = 768
+    height: int = 768,
+    use_cache: bool = True,
+    response_mode: str = "binary",
+    include_data: bool = False
 ):
     """
     Quick image generation with just a prompt
-    Returns image directly (not JSON)
+    Returns image directly (not JSON) unless response_mode=json, which returns
+    an ImageResponse like /generate; repeats of a prompt and size come from the cache
     """
+    if response_mode not in ("binary", "json"):
+        raise HTTPException(status_code=400, detail="response_mode must be binary or json")
     try:
-        from zega_image.generator import PollinationsProvider
-        provider = PollinationsProvider()
-        
         full_prompt = f"{prompt}, {style}, high quality, detailed"
-        result = await provider.generate(full_prompt, width, height)
+        result = await generator.generate_quick(
+            full_prompt, width, height, use_cache=_wants_cache(use_cache, http_request)
+        )
         
+        if result.success and result.image_data and response_mode == "json":
+            response.headers["X-Cache"] = _cache_header([result])
+            return ImageResponse(
+                success=True,
+                images=[_image_payload(result, include_data, http_request)],
+                prompt_used=result.prompt_used
+            )
         if result.success and result.image_data:
+            headers = {"X-Cache": _cache_header([result])}
+            if result.artifact_id:
+                headers["ETag"] = f'"{result.artifact_id}"'
+                headers["X-Artifact-Id"] = result.artifact_id
             return Response(
                 content=result.image_data,
-                media_type="image/png"
+                media_type=sniff_content_type(result.image_data, "image/png"),
+                headers=headers
             )
         else:
             raise HTTPException(status_code=500, detail=result.error or "Generation failed")
@@ -165,10 +434,56 @@ async def generate_quick(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Image cache size and hit counts"""
+    if not generator.cache:
+        return {"enabled": False}
+    return {"enabled": True, **await asyncio.to_thread(generator.cache.stats)}
+
+@app.post("/webhooks/replicate")
+async def replicate_webhook(request: Request):
+    """
+    Completion callback for Replicate predictions (set ZEGA_REPLICATE_WEBHOOK_URL
+    to this route's public URL). Only deliveries signed with
+    REPLICATE_WEBHOOK_SECRET are accepted.
+    """
+    provider = next((p for p in generator.providers if p.name == "replicate"), None)
+    if provider is None or not provider.webhook_secret:
+        raise HTTPException(status_code=403, detail="Replicate webhooks are not enabled")
+    body = await request.body()
+    if not verify_webhook(request.headers, body, provider.webhook_secret):
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+    try:
+        prediction = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a prediction JSON object")
+    # Unknown IDs are acknowledged too: the waiter may be on another worker, which polls instead
+    matched = provider.tracker.complete(prediction)
+    return {"received": True, "matched": matched}
+
 @app.get("/training/stats")
 async def training_stats():
     """Get statistics about collected training data"""
-    return generator.get_training_stats()
+    return await asyncio.to_thread(generator.get_training_stats)
+
+@app.post("/training/export")
+async def training_export(format: str = "parquet", include_images: bool = False):
+    """
+    Export the training catalog as a Parquet (columnar, needs pyarrow) or JSONL
+    dataset under training_data/exports and download it
+    """
+    if format not in ("parquet", "jsonl"):
+        raise HTTPException(status_code=400, detail="format must be parquet or jsonl")
+    try:
+        export = await asyncio.to_thread(generator.export_training_data, format, include_images)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return FileResponse(
+        export["path"],
+        filename=Path(export["path"]).name,
+        headers={"X-Export-Rows": str(export["rows"])}
+    )
 
 @app.get("/providers")
 async def list_providers():
@@ -206,7 +521,8 @@ MCP_TOOLS = {
                     "description": "Characters appearing in the scene"
                 },
                 "story_genre": {"type": "string", "description": "Genre like Fantasy, Sci-Fi, etc."},
-                "style_preferences": {"type": "string", "description": "Visual style preferences"}
+                "style_preferences": {"type": "string", "description": "Visual style preferences"},
+                "include_data": {"type": "boolean", "description": "Inline base64 image data besides the artifact URL"}
             },
             "required": ["scene_title", "scene_description"]
         }
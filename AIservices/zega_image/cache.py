@@ -0,0 +1,324 @@
+"""
+ZEGA Image Cache
+Prompt-keyed cache of generated images, with near-duplicate prompt matching and variant reuse
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from zega_artifacts import ArtifactStore
+from zega_telemetry import CACHE_REQUESTS
+
+# Dropped before comparing prompts; they carry no visual information
+_STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "in", "on", "at", "to", "with",
+    "is", "are", "was", "were", "by", "for", "from", "as", "into", "their", "his", "her", "its",
+}
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Bumped when cache keys or stored tokens change format
+KEY_VERSION = 2
+
+# Rows scanned per near-duplicate lookup (most recently hit first)
+NEAR_SCAN_LIMIT = 500
+
+# Pruning trims to this fraction of the byte budget
+PRUNE_LOW_WATERMARK = 0.9
+
+def _stem(token: str) -> str:
+    # Just enough to fold "dragons"/"dragon" and "glowing"/"glow"
+    for suffix in ("ing", "es", "ed", "s"):
+        if len(token) > len(suffix) + 2 and token.endswith(suffix):
+            return token[:-len(suffix)]
+    return token
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercased words in their original order; only case, punctuation and spacing are ignored"""
+    return " ".join(_TOKEN.findall(prompt.lower()))
+
+def prompt_tokens(prompt: str, boilerplate: Iterable[str] = ()) -> Dict[str, List[str]]:
+    """
+    {"style": boilerplate phrases found, sorted; "words": the remaining
+    content words in order, lightly stemmed and without stopwords}
+    """
+    text = prompt.lower()
+    style = []
+    for phrase in boilerplate:
+        phrase = phrase.lower()
+        if phrase in text:
+            style.append(phrase)
+            text = text.replace(phrase, " ")
+    return {
+        "style": sorted(style),
+        "words": [_stem(t) for t in _TOKEN.findall(text) if t not in _STOPWORDS],
+    }
+
+def edit_distance(a: Sequence[str], b: Sequence[str], limit: int) -> int:
+    """
+    Words inserted or deleted to turn `a` into `b` (a substitution counts as
+    two), or `limit + 1` as soon as it is known to exceed `limit`
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    counts = Counter(a)
+    counts.subtract(b)
+    if sum(abs(n) for n in counts.values()) > limit:
+        return limit + 1  # Multiset difference is a lower bound; skips the LCS for most rows
+    previous = [0] * (len(b) + 1)
+    for word in a:
+        current = [0]
+        for j, other in enumerate(b):
+            current.append(previous[j] + 1 if word == other else max(previous[j + 1], current[j]))
+        previous = current
+    return len(a) + len(b) - 2 * previous[-1]
+
+def is_near_duplicate(a: Dict[str, List[str]], b: Dict[str, List[str]], max_edits: int) -> bool:
+    """
+    Same style tags, and content words within `max_edits` insertions or
+    deletions. The budget does not grow with prompt length, so a swapped
+    word is a miss however long the scene description is:
+
+    >>> scene = "Mara ties her red scarf and climbs the wall of the burning keep at dusk " * 4
+    >>> is_near_duplicate(prompt_tokens(scene), prompt_tokens(scene.replace("red", "blue", 1)), 1)
+    False
+    >>> is_near_duplicate(prompt_tokens(scene), prompt_tokens(scene + " smoke"), 1)
+    True
+    """
+    return a["style"] == b["style"] and edit_distance(a["words"], b["words"], max_edits) <= max_edits
+
+@dataclass
+class CachedImage:
+    """One cached variant; the bytes live in the artifact store"""
+    artifact_id: str
+    provider: str
+    model: str
+    prompt: str
+    size: int
+
+class ImageCache:
+    """
+    Maps (normalized prompt, width x height, provider) to generated images.
+
+    A key can hold several variants, so a request for N variations reuses
+    what is cached and only generates the rest. The exact key keeps word
+    order ("man bites dog" is not "dog bites man"). When no exact key
+    exists, a prompt counts as a near hit if it has the same `boilerplate`
+    style/quality tags and its remaining words differ by at most `max_edits`
+    insertions or deletions (default 1: one added or dropped word). A
+    swapped word ("red" -> "blue", another character name) costs two, so
+    it is always a miss.
+
+    The index is a SQLite WAL database in the artifact store root, shared by
+    every image worker. The images are ordinary artifacts, so disk usage
+    stays within the store's LRU budget; this index is pruned LRU to
+    `max_bytes` of referenced images.
+    """
+
+    def __init__(
+        self,
+        store: ArtifactStore,
+        db_path: Optional[str] = None,
+        max_edits: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+        boilerplate: Iterable[str] = ()
+    ):
+        self.store = store
+        self.db_path = Path(db_path or store.root / "image_cache.db")
+        self.max_edits = max_edits if max_edits is not None else int(os.getenv("ZEGA_IMAGE_CACHE_MAX_EDITS", "1"))
+        # Longest first, so a phrase contained in another is not stripped out of it
+        self.boilerplate = sorted(boilerplate, key=len, reverse=True)
+        self.max_bytes = max_bytes or int(os.getenv("ZEGA_IMAGE_CACHE_MAX_BYTES", str(512 * 1024 ** 2)))
+        self.ttl = ttl if ttl is not None else float(os.getenv("ZEGA_IMAGE_CACHE_TTL", str(7 * 86400)))
+        self._local = threading.local()
+        self._connection().executescript("""
+            CREATE TABLE IF NOT EXISTS image_cache (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                cache_key TEXT NOT NULL,
+                tokens TEXT NOT NULL,
+                width INTEGER NOT NULL,
+                height INTEGER NOT NULL,
+                provider TEXT NOT NULL,
+                artifact_id TEXT NOT NULL,
+                source_provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_hit REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                UNIQUE (cache_key, artifact_id)
+            );
+            CREATE INDEX IF NOT EXISTS image_cache_key ON image_cache (cache_key);
+            CREATE INDEX IF NOT EXISTS image_cache_shape ON image_cache (width, height, provider, last_hit);
+        """)
+        if self._connection().execute("PRAGMA user_version").fetchone()[0] < KEY_VERSION:
+            # Keys and tokens from an older format would never match; start over
+            with self._transaction() as conn:
+                conn.execute("DELETE FROM image_cache")
+                conn.execute(f"PRAGMA user_version = {KEY_VERSION}")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def make_key(prompt: str, width: int = 0, height: int = 0, provider: str = "") -> str:
+        """Stable key; width/height 0 means the provider's default size, provider "" means any"""
+        normalized = normalize_prompt(prompt)
+        return hashlib.sha256(f"{normalized}|{width}x{height}|{provider}".encode()).hexdigest()
+
+    def _variants(self, conn: sqlite3.Connection, cache_key: str, limit: int) -> List[Tuple[int, CachedImage]]:
+        rows = conn.execute(
+            "SELECT id, artifact_id, source_provider, model, prompt, size FROM image_cache "
+            "WHERE cache_key = ? AND created_at >= ? ORDER BY created_at LIMIT ?",
+            (cache_key, self._fresh_after(), limit)
+        ).fetchall()
+        return [(r[0], CachedImage(r[1], r[2], r[3], r[4], r[5])) for r in rows]
+
+    def _fresh_after(self) -> float:
+        return time.time() - self.ttl if self.ttl else 0.0
+
+    def lookup(
+        self,
+        prompt: str,
+        width: int = 0,
+        height: int = 0,
+        provider: str = "",
+        limit: int = 1
+    ) -> Tuple[str, List[CachedImage]]:
+        """
+        ("hit" | "near" | "miss", up to `limit` cached variants). Variants
+        whose artifact has been evicted are dropped from the index.
+        """
+        conn = self._connection()
+        status = "hit"
+        variants = self._variants(conn, self.make_key(prompt, width, height, provider), limit)
+
+        if not variants and self.max_edits > 0:
+            status = "near"
+            wanted = prompt_tokens(prompt, self.boilerplate)
+            best_key, best_distance = None, self.max_edits + 1
+            for cache_key, tokens in conn.execute(
+                "SELECT cache_key, tokens FROM image_cache "
+                "WHERE width = ? AND height = ? AND provider = ? AND created_at >= ? "
+                "ORDER BY last_hit DESC LIMIT ?",
+                (width, height, provider, self._fresh_after(), NEAR_SCAN_LIMIT)
+            ).fetchall():
+                tokens = json.loads(tokens)
+                if tokens["style"] != wanted["style"]:
+                    continue
+                distance = edit_distance(wanted["words"], tokens["words"], self.max_edits)
+                if distance < best_distance:
+                    best_key, best_distance = cache_key, distance
+                    if distance == 0:
+                        break
+            if best_key:
+                variants = self._variants(conn, best_key, limit)
+
+        live, stale = [], []
+        for row_id, variant in variants:
+            (live if self.store.get(variant.artifact_id) else stale).append((row_id, variant))
+        if stale:
+            with self._transaction() as tx:
+                tx.executemany("DELETE FROM image_cache WHERE id = ?", [(row_id,) for row_id, _ in stale])
+        if live:
+            with self._transaction() as tx:
+                tx.executemany(
+                    "UPDATE image_cache SET last_hit = ?, hits = hits + 1 WHERE id = ?",
+                    [(time.time(), row_id) for row_id, _ in live]
+                )
+
+        if not live:
+            status = "miss"
+        CACHE_REQUESTS.labels("image", status).inc()
+        return status, [variant for _, variant in live]
+
+    def add(
+        self,
+        prompt: str,
+        artifact_id: str,
+        source_provider: str,
+        model: str,
+        size: int,
+        width: int = 0,
+        height: int = 0,
+        provider: str = ""
+    ):
+        """Record a generated image under its prompt key (a new variant if the key exists)"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO image_cache (cache_key, tokens, width, height, provider, artifact_id, "
+                "source_provider, model, prompt, size, created_at, last_hit) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(cache_key, artifact_id) DO UPDATE SET last_hit = excluded.last_hit",
+                (self.make_key(prompt, width, height, provider), json.dumps(prompt_tokens(prompt, self.boilerplate)),
+                 width, height, provider, artifact_id, source_provider, model, prompt, size, now, now)
+            )
+        self.prune()
+
+    def prune(self) -> int:
+        """Drop expired entries, then least recently hit ones past `max_bytes`; returns rows removed"""
+        removed = 0
+        with self._transaction() as conn:
+            if self.ttl:
+                removed += conn.execute(
+                    "DELETE FROM image_cache WHERE created_at < ?", (self._fresh_after(),)
+                ).rowcount
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM image_cache").fetchone()[0]
+            if total > self.max_bytes:
+                target = self.max_bytes * PRUNE_LOW_WATERMARK
+                victims = []
+                for row_id, size in conn.execute("SELECT id, size FROM image_cache ORDER BY last_hit").fetchall():
+                    if total <= target:
+                        break
+                    victims.append((row_id,))
+                    total -= size
+                conn.executemany("DELETE FROM image_cache WHERE id = ?", victims)
+                removed += len(victims)
+        return removed
+
+    def clear(self) -> int:
+        with self._transaction() as conn:
+            return conn.execute("DELETE FROM image_cache").rowcount
+
+    def stats(self) -> dict:
+        conn = self._connection()
+        entries, keys, size, hits = conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT cache_key), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) FROM image_cache"
+        ).fetchone()
+        return {
+            "entries": entries,
+            "prompts": keys,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "max_edits": self.max_edits,
+            "ttl_seconds": self.ttl,
+        }
@@ -0,0 +1,237 @@
+"""
+ZEGA Image Training Catalog
+SQLite index of image training records: written at save time, queried for stats, exported for training
+"""
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+EXPORT_BATCH = 5000
+
+# Column order for exports; "characters" is stored as a JSON array
+COLUMNS = [
+    "record_key", "timestamp", "prompt", "scene_title", "scene_description", "story_genre",
+    "characters", "provider", "model", "generation_time", "artifact_id", "content_type",
+    "width", "height", "image_path",
+]
+
+class TrainingCatalog:
+    """
+    One row per saved training image, keyed by the metadata file stem.
+
+    The JSON sidecars stay the source of truth; this catalog mirrors them so
+    /training/stats is a few indexed queries instead of opening every file.
+    Records saved before the catalog existed are imported once by
+    `backfill()`; it can be re-run safely and skips keys it already has.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connection().executescript("""
+            CREATE TABLE IF NOT EXISTS records (
+                record_key TEXT PRIMARY KEY,
+                timestamp TEXT,
+                prompt TEXT,
+                scene_title TEXT,
+                scene_description TEXT,
+                story_genre TEXT,
+                characters TEXT,
+                provider TEXT,
+                model TEXT,
+                generation_time REAL,
+                artifact_id TEXT,
+                content_type TEXT,
+                width INTEGER,
+                height INTEGER,
+                image_path TEXT,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS records_provider ON records (provider);
+            CREATE INDEX IF NOT EXISTS records_genre ON records (story_genre);
+            CREATE TABLE IF NOT EXISTS catalog_meta (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _row(record_key: str, metadata: Dict[str, Any], image_path: Optional[str] = None) -> tuple:
+        return (
+            record_key,
+            metadata.get("timestamp"),
+            metadata.get("prompt"),
+            metadata.get("scene_title"),
+            metadata.get("scene_description"),
+            metadata.get("story_genre"),
+            json.dumps(metadata.get("characters") or []),
+            metadata.get("provider"),
+            metadata.get("model"),
+            metadata.get("generation_time"),
+            metadata.get("artifact_id"),
+            metadata.get("content_type"),
+            metadata.get("width"),
+            metadata.get("height"),
+            image_path,
+            time.time(),
+        )
+
+    _INSERT = (
+        "INSERT OR IGNORE INTO records (" + ", ".join(COLUMNS + ["created_at"]) + ") "
+        "VALUES (" + ", ".join("?" * (len(COLUMNS) + 1)) + ")"
+    )
+
+    def add(self, record_key: str, metadata: Dict[str, Any], image_path: Optional[str] = None):
+        with self._transaction() as conn:
+            conn.execute(self._INSERT, self._row(record_key, metadata, image_path))
+
+    # === Backfill ===
+
+    def is_backfilled(self, directory: Path) -> bool:
+        row = self._connection().execute(
+            "SELECT value FROM catalog_meta WHERE name = ?", (f"backfill:{Path(directory).resolve()}",)
+        ).fetchone()
+        return row is not None
+
+    def backfill(self, directory: Path) -> int:
+        """Import JSON sidecars (and legacy .png files next to them) not yet in the catalog"""
+        directory = Path(directory)
+        known = {r[0] for r in self._connection().execute("SELECT record_key FROM records")}
+        rows = []
+        for meta_file in directory.glob("*.json"):
+            if meta_file.stem in known:
+                continue
+            try:
+                with open(meta_file) as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[ZEGA_ImageGen] ⚠️ Skipping unreadable training record {meta_file.name}: {e}")
+                continue
+            png = meta_file.with_suffix(".png")
+            if png.exists() and not metadata.get("content_type"):
+                metadata["content_type"] = "image/png"
+            rows.append(self._row(meta_file.stem, metadata, str(png) if png.exists() else None))
+
+        with self._transaction() as conn:
+            conn.executemany(self._INSERT, rows)
+            conn.execute(
+                "INSERT OR REPLACE INTO catalog_meta (name, value) VALUES (?, ?)",
+                (f"backfill:{directory.resolve()}", str(time.time()))
+            )
+        if rows:
+            print(f"[ZEGA_ImageGen] 📚 Backfilled {len(rows)} training records into the catalog")
+        return len(rows)
+
+    # === Queries ===
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connection()
+        total, images = conn.execute(
+            "SELECT COUNT(*), COUNT(CASE WHEN artifact_id IS NOT NULL OR image_path IS NOT NULL THEN 1 END) FROM records"
+        ).fetchone()
+        return {
+            "total_images": images,
+            "total_metadata": total,
+            "by_provider": dict(conn.execute(
+                "SELECT COALESCE(provider, 'unknown'), COUNT(*) FROM records GROUP BY 1"
+            ).fetchall()),
+            "by_genre": dict(conn.execute(
+                "SELECT COALESCE(story_genre, 'unknown'), COUNT(*) FROM records GROUP BY 1"
+            ).fetchall()),
+        }
+
+    def iter_batches(self, batch_size: int = EXPORT_BATCH) -> Iterator[List[Dict[str, Any]]]:
+        cursor = self._connection().execute(f"SELECT {', '.join(COLUMNS)} FROM records ORDER BY record_key")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield [dict(zip(COLUMNS, row)) for row in rows]
+
+    # === Export ===
+
+    def export(self, path: Path, format: str = "parquet", read_image=None) -> int:
+        """
+        Write every record to `path` as Parquet (needs pyarrow) or JSONL, in
+        batches. With `read_image(record) -> bytes`, Parquet gets an `image`
+        binary column. Returns the number of rows written.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        written = 0
+
+        if format == "jsonl":
+            with open(path, "w", encoding="utf-8") as f:
+                for batch in self.iter_batches():
+                    for record in batch:
+                        record["characters"] = json.loads(record["characters"] or "[]")
+                        f.write(json.dumps(record) + "\n")
+                    written += len(batch)
+            return written
+
+        if format != "parquet":
+            raise ValueError("format must be parquet or jsonl")
+        if pa is None:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+        fields = [
+            pa.field("record_key", pa.string()),
+            pa.field("timestamp", pa.string()),
+            pa.field("prompt", pa.string()),
+            pa.field("scene_title", pa.string()),
+            pa.field("scene_description", pa.string()),
+            pa.field("story_genre", pa.string()),
+            pa.field("characters", pa.list_(pa.string())),
+            pa.field("provider", pa.string()),
+            pa.field("model", pa.string()),
+            pa.field("generation_time", pa.float64()),
+            pa.field("artifact_id", pa.string()),
+            pa.field("content_type", pa.string()),
+            pa.field("width", pa.int32()),
+            pa.field("height", pa.int32()),
+            pa.field("image_path", pa.string()),
+        ]
+        if read_image:
+            fields.append(pa.field("image", pa.binary()))
+        schema = pa.schema(fields)
+
+        with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+            for batch in self.iter_batches():
+                for record in batch:
+                    record["characters"] = json.loads(record["characters"] or "[]")
+                    if read_image:
+                        record["image"] = read_image(record)
+                writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+                written += len(batch)
+        return written
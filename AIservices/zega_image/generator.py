@@ -13,11 +13,36 @@ import asyncio
 import httpx
 import base64
 import json
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator
 from dataclasses import dataclass
 from pathlib import Path
 from datetime import datetime
 import hashlib
+import time
+import uuid
+from zega_telemetry import IMAGE_PROVIDER_SECONDS
+from zega_artifacts import ArtifactStore, get_store
+from zega_image.cache import ImageCache
+from zega_image.variations import VariationEngine
+from zega_image.postprocess import image_info
+from zega_image.catalog import TrainingCatalog
+from zega_image.jobs import PredictionTracker
+
+# Style based on genre
+GENRE_STYLES = {
+    "Fantasy": "fantasy art style, magical, ethereal lighting",
+    "Sci-Fi": "futuristic, sci-fi art, cyberpunk aesthetic",
+    "Horror": "dark atmospheric, horror movie style, ominous",
+    "Romance": "romantic, soft lighting, warm colors, cinematic",
+    "Thriller": "suspenseful, noir style, dramatic shadows",
+    "Comedy": "bright, colorful, cartoon-like",
+    "Drama": "cinematic, emotional, dramatic lighting",
+    "Action": "dynamic, action-packed, intense",
+    "Mystery": "mysterious, fog, dim lighting",
+    "Historical": "period accurate, classical art style"
+}
+DEFAULT_STYLE = "cinematic, high quality, detailed"
+QUALITY_TAGS = "masterpiece, best quality, highly detailed, 8k resolution"
 
 @dataclass
 class ImageGenerationResult:
@@ -30,6 +55,8 @@ class ImageGenerationResult:
     error: Optional[str] = None
     generation_time: float = 0.0
     model_used: str = ""
+    artifact_id: Optional[str] = None  # Set once image_data is in the artifact store
+    cache_status: Optional[str] = None  # hit / near (served from ImageCache) or miss
 
 @dataclass
 class SceneContext:
@@ -50,7 +77,13 @@ class PollinationsProvider:
         self.base_url = "https://image.pollinations.ai/prompt"
         self.name = "pollinations"
     
-    async def generate(self, prompt: str, width: int = 1024, height: int = 768) -> ImageGenerationResult:
+    async def generate(
+        self,
+        prompt: str,
+        width: int = 1024,
+        height: int = 768,
+        seed: Optional[int] = None
+    ) -> ImageGenerationResult:
         """Generate image using Pollinations AI"""
         import time
         start_time = time.time()
@@ -62,6 +95,8 @@ class PollinationsProvider:
             
             # Pollinations uses a simple URL-based API
             image_url = f"{self.base_url}/{encoded_prompt}?width={width}&height={height}&nologo=true"
+            if seed is not None:
+                image_url += f"&seed={seed}"
             
             async with httpx.AsyncClient(timeout=120.0) as client:
                 response = await client.get(image_url)
@@ -100,7 +135,7 @@ class HuggingFaceImageProvider:
         self.base_url = f"https://api-inference.huggingface.co/models/{model}"
         self.name = "huggingface"
     
-    async def generate(self, prompt: str, negative_prompt: str = "") -> ImageGenerationResult:
+    async def generate(self, prompt: str, negative_prompt: str = "", seed: Optional[int] = None) -> ImageGenerationResult:
         """Generate image using HuggingFace Inference API"""
         import time
         start_time = time.time()
@@ -127,6 +162,9 @@ class HuggingFaceImageProvider:
                 }
             }
             
+            if seed is not None:
+                payload["parameters"]["seed"] = seed
+            
             async with httpx.AsyncClient(timeout=120.0) as client:
                 response = await client.post(
                     self.base_url,
@@ -174,7 +212,7 @@ class StabilityAIProvider:
         self.name = "stability"
         self.engine = "stable-diffusion-xl-1024-v1-0"
     
-    async def generate(self, prompt: str, negative_prompt: str = "") -> ImageGenerationResult:
+    async def generate(self, prompt: str, negative_prompt: str = "", seed: Optional[int] = None) -> ImageGenerationResult:
         """Generate image using Stability AI"""
         import time
         start_time = time.time()
@@ -199,6 +237,8 @@ class StabilityAIProvider:
                 "samples": 1,
                 "steps": 30
             }
+            if seed is not None:
+                payload["seed"] = seed
             
             async with httpx.AsyncClient(timeout=120.0) as client:
                 response = await client.post(
@@ -243,10 +283,22 @@ class ReplicateProvider:
     def __init__(self, model: str = "stability-ai/sdxl:39ed52f2a78e934b3ba6e2a89f5b1c712de7dfea535525255b1aa35c5565e08b"):
         self.api_key = os.getenv("REPLICATE_API_TOKEN")
         self.model = model
-        self.base_url = "https://api.replicate.com/v1/predictions"
+        self.base_url = os.getenv("REPLICATE_API_URL", "https://api.replicate.com/v1").rstrip("/") + "/predictions"
         self.name = "replicate"
+        # Public URL of POST /webhooks/replicate; without it results are polled only
+        self.webhook_url = os.getenv("ZEGA_REPLICATE_WEBHOOK_URL")
+        self.webhook_secret = os.getenv("REPLICATE_WEBHOOK_SECRET")
+        if self.webhook_url and not self.webhook_secret:
+            # Unsigned deliveries could resolve jobs with an arbitrary output URL that is then fetched
+            raise RuntimeError("ZEGA_REPLICATE_WEBHOOK_URL is set but REPLICATE_WEBHOOK_SECRET is not")
+        self.timeout = float(os.getenv("ZEGA_REPLICATE_TIMEOUT", "120"))
+        self.tracker = PredictionTracker(
+            self.name,
+            headers={"Authorization": f"Token {self.api_key}"},
+            webhook=bool(self.webhook_url)
+        )
     
-    async def generate(self, prompt: str, negative_prompt: str = "") -> ImageGenerationResult:
+    async def generate(self, prompt: str, negative_prompt: str = "", seed: Optional[int] = None) -> ImageGenerationResult:
         """Generate image using Replicate"""
         import time
         start_time = time.time()
@@ -269,6 +321,11 @@ class ReplicateProvider:
                     "height": 768
                 }
             }
+            if seed is not None:
+                payload["input"]["seed"] = seed
+            if self.webhook_url:
+                payload["webhook"] = self.webhook_url
+                payload["webhook_events_filter"] = ["completed"]
             
             async with httpx.AsyncClient(timeout=180.0) as client:
                 # Create prediction
@@ -289,46 +346,44 @@ class ReplicateProvider:
                         error=f"HTTP {response.status_code}: {response.text[:200]}"
                     )
                 
-                prediction = response.json()
-                prediction_url = prediction["urls"]["get"]
+                # Wait on the shared tracker (webhook or backoff polling)
+                try:
+                    status_data = await self.tracker.wait(response.json(), self.timeout)
+                except asyncio.TimeoutError:
+                    return ImageGenerationResult(
+                        success=False,
+                        provider=self.name,
+                        prompt_used=prompt,
+                        error="Timeout waiting for generation"
+                    )
                 
-                # Poll for completion
-                for _ in range(60):  # Max 60 attempts (2 minutes)
-                    await asyncio.sleep(2)
-                    status_response = await client.get(
-                        prediction_url,
-                        headers={"Authorization": f"Token {self.api_key}"}
+                if status_data["status"] != "succeeded":
+                    return ImageGenerationResult(
+                        success=False,
+                        provider=self.name,
+                        prompt_used=prompt,
+                        error=status_data.get("error") or f"Generation {status_data['status']}"
                     )
-                    status_data = status_response.json()
-                    
-                    if status_data["status"] == "succeeded":
-                        output = status_data.get("output", [])
-                        if output:
-                            image_url = output[0] if isinstance(output, list) else output
-                            # Download the image
-                            image_response = await client.get(image_url)
-                            return ImageGenerationResult(
-                                success=True,
-                                image_data=image_response.content,
-                                image_url=image_url,
-                                provider=self.name,
-                                prompt_used=prompt,
-                                generation_time=time.time() - start_time,
-                                model_used=self.model
-                            )
-                    elif status_data["status"] == "failed":
-                        return ImageGenerationResult(
-                            success=False,
-                            provider=self.name,
-                            prompt_used=prompt,
-                            error=status_data.get("error", "Generation failed")
-                        )
                 
+                output = status_data.get("output") or []
+                if not output:
+                    return ImageGenerationResult(
+                        success=False,
+                        provider=self.name,
+                        prompt_used=prompt,
+                        error="Prediction succeeded without output"
+                    )
+                image_url = output[0] if isinstance(output, list) else output
+                # Download the image
+                image_response = await client.get(image_url)
                 return ImageGenerationResult(
-                    success=False,
+                    success=True,
+                    image_data=image_response.content,
+                    image_url=image_url,
                     provider=self.name,
                     prompt_used=prompt,
-                    error="Timeout waiting for generation"
+                    generation_time=time.time() - start_time,
+                    model_used=self.model
                 )
         except Exception as e:
             return ImageGenerationResult(
@@ -344,14 +399,26 @@ class ZegaImageGenerator:
     Uses ensemble of providers with fallback and quality selection
     """
     
-    def __init__(self, training_data_path: str = "zega_image_training"):
+    def __init__(self, training_data_path: str = "zega_image_training", artifact_store: Optional[ArtifactStore] = None):
         self.providers = []
         self.training_data_path = Path(training_data_path)
         self.training_data_path.mkdir(exist_ok=True)
+        self.artifacts = artifact_store or get_store()
+        self._catalog: Optional[TrainingCatalog] = None
+        self.cache = ImageCache(
+            self.artifacts, boilerplate=[*GENRE_STYLES.values(), DEFAULT_STYLE, QUALITY_TAGS]
+        ) if os.getenv("ZEGA_IMAGE_CACHE", "true").lower() == "true" else None
         
         self._init_providers()
         print(f"[ZEGA_ImageGen] 🎨 Initialized with {len(self.providers)} providers")
     
+    @property
+    def catalog(self) -> TrainingCatalog:
+        """Opened on first use, so importing the service doesn't create catalog.db"""
+        if self._catalog is None:
+            self._catalog = TrainingCatalog(self.training_data_path / "catalog.db")
+        return self._catalog
+    
     def _init_providers(self):
         """Initialize all available image providers"""
         # Always add Pollinations (free, no API key)
@@ -384,25 +451,11 @@ class ZegaImageGenerator:
         """Build an optimized prompt from scene context"""
         prompt_parts = []
         
-        # Style based on genre
-        genre_styles = {
-            "Fantasy": "fantasy art style, magical, ethereal lighting",
-            "Sci-Fi": "futuristic, sci-fi art, cyberpunk aesthetic",
-            "Horror": "dark atmospheric, horror movie style, ominous",
-            "Romance": "romantic, soft lighting, warm colors, cinematic",
-            "Thriller": "suspenseful, noir style, dramatic shadows",
-            "Comedy": "bright, colorful, cartoon-like",
-            "Drama": "cinematic, emotional, dramatic lighting",
-            "Action": "dynamic, action-packed, intense",
-            "Mystery": "mysterious, fog, dim lighting",
-            "Historical": "period accurate, classical art style"
-        }
-        
         # Add genre style
-        if context.story_genre and context.story_genre in genre_styles:
-            prompt_parts.append(genre_styles[context.story_genre])
+        if context.story_genre and context.story_genre in GENRE_STYLES:
+            prompt_parts.append(GENRE_STYLES[context.story_genre])
         else:
-            prompt_parts.append("cinematic, high quality, detailed")
+            prompt_parts.append(DEFAULT_STYLE)
         
         # Add scene description
         if context.scene_description:
@@ -424,7 +477,7 @@ class ZegaImageGenerator:
             prompt_parts.append(context.style_preferences)
         
         # Final quality tags
-        prompt_parts.append("masterpiece, best quality, highly detailed, 8k resolution")
+        prompt_parts.append(QUALITY_TAGS)
         
         return ", ".join(prompt_parts)
     
@@ -432,55 +485,175 @@ class ZegaImageGenerator:
         self, 
         context: SceneContext,
         num_variations: int = 1,
-        save_for_training: bool = True
+        save_for_training: bool = True,
+        use_cache: bool = True,
+        deadline: Optional[float] = None
     ) -> List[ImageGenerationResult]:
         """
-        Generate image(s) for a scene using the best available provider
+        Generate image(s) for a scene using the available providers concurrently
         
         Args:
             context: Scene context with all relevant information
             num_variations: Number of image variations to generate
             save_for_training: Whether to save successful generations for training
+            use_cache: Reuse cached images for this (or a near-identical) prompt
+            deadline: Seconds to wait for images (ZEGA_IMAGE_DEADLINE by default)
             
         Returns:
             List of ImageGenerationResult objects
         """
-        prompt = self._build_scene_prompt(context)
-        print(f"[ZEGA_ImageGen] 📝 Generated prompt: {prompt[:100]}...")
-        
         results = []
-        
-        # Try providers in priority order
-        for provider in self.providers:
-            try:
-                print(f"[ZEGA_ImageGen] 🎯 Trying {provider.name}...")
-                result = await provider.generate(prompt)
-                
-                if result.success:
-                    print(f"[ZEGA_ImageGen] ✅ Success from {provider.name}")
-                    results.append(result)
-                    
-                    # Save for training
-                    if save_for_training and result.image_data:
-                        await self._save_training_data(context, prompt, result)
-                    
-                    if len(results) >= num_variations:
-                        break
-                else:
-                    print(f"[ZEGA_ImageGen] ⚠️ {provider.name} failed: {result.error}")
-            except Exception as e:
-                print(f"[ZEGA_ImageGen] ❌ {provider.name} error: {e}")
+        images = self.stream_scene_images(context, num_variations, save_for_training, use_cache, deadline)
+        try:
+            async for result in images:
+                results.append(result)
+        finally:
+            await images.aclose()
         
         if not results:
             # Return a failure result
             results.append(ImageGenerationResult(
                 success=False,
-                prompt_used=prompt,
+                prompt_used=self._build_scene_prompt(context),
                 error="All providers failed"
             ))
         
         return results
     
+    async def stream_scene_images(
+        self,
+        context: SceneContext,
+        num_variations: int = 1,
+        save_for_training: bool = True,
+        use_cache: bool = True,
+        deadline: Optional[float] = None
+    ) -> AsyncIterator[ImageGenerationResult]:
+        """
+        Yield successful images as they are ready: cached variants first, then
+        the rest from VariationEngine. Closing the iterator cancels provider
+        calls still in flight.
+        """
+        prompt = self._build_scene_prompt(context)
+        print(f"[ZEGA_ImageGen] 📝 Generated prompt: {prompt[:100]}...")
+        
+        delivered = 0
+        if use_cache:
+            for result in await self._from_cache(prompt, num_variations):
+                delivered += 1
+                yield result
+            if delivered >= num_variations:
+                print(f"[ZEGA_ImageGen] ⚡ Served {delivered} cached image(s)")
+                return
+        
+        engine = VariationEngine(self.providers)
+        generated = engine.run(prompt, num_variations - delivered, deadline)
+        try:
+            async for result in generated:
+                if result.image_data:
+                    await self._store_artifact(result, pin=save_for_training)
+                    if use_cache:
+                        await self._add_to_cache(prompt, result)
+                    
+                    # Save for training
+                    if save_for_training:
+                        await self._save_training_data(context, prompt, result)
+                yield result
+        finally:
+            await generated.aclose()
+    
+    async def generate_quick(
+        self,
+        prompt: str,
+        width: int = 1024,
+        height: int = 768,
+        use_cache: bool = True
+    ) -> ImageGenerationResult:
+        """Single Pollinations image for a raw prompt, cached per prompt and size"""
+        if use_cache:
+            cached = await self._from_cache(prompt, 1, width, height, "pollinations")
+            if cached:
+                return cached[0]
+        
+        provider = PollinationsProvider()
+        started = time.perf_counter()
+        result = await provider.generate(prompt, width, height)
+        IMAGE_PROVIDER_SECONDS.labels(provider.name, "ok" if result.success else "failed").observe(
+            time.perf_counter() - started
+        )
+        if result.success and result.image_data:
+            await self._store_artifact(result)
+            if use_cache:
+                await self._add_to_cache(prompt, result, width, height, "pollinations")
+        return result
+    
+    async def _from_cache(
+        self,
+        prompt: str,
+        limit: int,
+        width: int = 0,
+        height: int = 0,
+        provider: str = ""
+    ) -> List[ImageGenerationResult]:
+        """Cached variants as results (empty on a miss or when caching is off)"""
+        if not self.cache:
+            return []
+        started = time.time()
+        try:
+            status, entries = await asyncio.to_thread(self.cache.lookup, prompt, width, height, provider, limit)
+        except Exception as e:
+            print(f"[ZEGA_ImageGen] ⚠️ Cache lookup failed: {e}")
+            return []
+        
+        results = []
+        for entry in entries:
+            data = await asyncio.to_thread(self.artifacts.read, entry.artifact_id)
+            if data:
+                results.append(ImageGenerationResult(
+                    success=True,
+                    image_data=data,
+                    provider=entry.provider,
+                    prompt_used=prompt,
+                    generation_time=time.time() - started,
+                    model_used=entry.model,
+                    artifact_id=entry.artifact_id,
+                    cache_status=status
+                ))
+        return results
+    
+    async def _add_to_cache(
+        self,
+        prompt: str,
+        result: ImageGenerationResult,
+        width: int = 0,
+        height: int = 0,
+        provider: str = ""
+    ):
+        result.cache_status = "miss"
+        if not (self.cache and result.artifact_id):
+            return
+        try:
+            await asyncio.to_thread(
+                self.cache.add, prompt, result.artifact_id, result.provider, result.model_used,
+                len(result.image_data), width, height, provider
+            )
+        except Exception as e:
+            print(f"[ZEGA_ImageGen] ⚠️ Failed to cache image: {e}")
+    
+    async def _store_artifact(self, result: ImageGenerationResult, pin: bool = False):
+        """Put the image bytes in the shared artifact store; identical images are stored once"""
+        try:
+            artifact = await asyncio.to_thread(
+                self.artifacts.put,
+                result.image_data,
+                "image",
+                None,
+                {"provider": result.provider, "model": result.model_used},
+                pin
+            )
+            result.artifact_id = artifact.id
+        except Exception as e:
+            print(f"[ZEGA_ImageGen] ⚠️ Failed to store artifact: {e}")
+    
     async def _save_training_data(
         self, 
         context: SceneContext, 
@@ -489,16 +662,15 @@ class ZegaImageGenerator:
     ):
         """Save successful generation for future model training"""
         try:
-            # Create unique filename
+            # Create unique filename (also the catalog key); the suffix keeps
+            # same-prompt generations within one second from colliding
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             prompt_hash = hashlib.md5(prompt.encode()).hexdigest()[:8]
-            filename = f"{timestamp}_{prompt_hash}"
+            filename = f"{timestamp}_{prompt_hash}_{uuid.uuid4().hex[:8]}"
             
-            # Save image
-            if result.image_data:
-                image_path = self.training_data_path / f"{filename}.png"
-                with open(image_path, "wb") as f:
-                    f.write(result.image_data)
+            # The image itself lives in the artifact store (pinned, so never evicted)
+            if result.image_data and not result.artifact_id:
+                await self._store_artifact(result, pin=True)
             
             # Save metadata
             metadata = {
@@ -510,40 +682,44 @@ class ZegaImageGenerator:
                 "provider": result.provider,
                 "model": result.model_used,
                 "generation_time": result.generation_time,
-                "timestamp": timestamp
+                "timestamp": timestamp,
+                "artifact_id": result.artifact_id,
+                # Providers return PNG or JPEG; record what this one actually is
+                **(image_info(result.image_data) if result.image_data else {})
             }
             
             metadata_path = self.training_data_path / f"{filename}.json"
             with open(metadata_path, "w") as f:
                 json.dump(metadata, f, indent=2)
+            await asyncio.to_thread(self.catalog.add, filename, metadata)
             
             print(f"[ZEGA_ImageGen] 💾 Saved training data: {filename}")
         except Exception as e:
             print(f"[ZEGA_ImageGen] ⚠️ Failed to save training data: {e}")
     
     def get_training_stats(self) -> Dict[str, Any]:
-        """Get statistics about collected training data"""
+        """Get statistics about collected training data (indexed catalog queries)"""
         try:
-            images = list(self.training_data_path.glob("*.png"))
-            metadata_files = list(self.training_data_path.glob("*.json"))
-            
-            providers = {}
-            genres = {}
-            
-            for meta_file in metadata_files:
-                with open(meta_file) as f:
-                    meta = json.load(f)
-                    provider = meta.get("provider", "unknown")
-                    genre = meta.get("story_genre", "unknown")
-                    providers[provider] = providers.get(provider, 0) + 1
-                    genres[genre] = genres.get(genre, 0) + 1
-            
-            return {
-                "total_images": len(images),
-                "total_metadata": len(metadata_files),
-                "by_provider": providers,
-                "by_genre": genres,
-                "path": str(self.training_data_path)
-            }
+            if not self.catalog.is_backfilled(self.training_data_path):
+                self.catalog.backfill(self.training_data_path)
+            return {**self.catalog.stats(), "path": str(self.training_data_path)}
         except Exception as e:
             return {"error": str(e)}
+    
+    def export_training_data(self, format: str = "parquet", include_images: bool = False) -> Dict[str, Any]:
+        """Write the catalog to training_data/exports as Parquet or JSONL"""
+        if not self.catalog.is_backfilled(self.training_data_path):
+            self.catalog.backfill(self.training_data_path)
+        
+        def read_image(record: Dict[str, Any]) -> Optional[bytes]:
+            if record.get("artifact_id"):
+                return self.artifacts.read(record["artifact_id"])
+            if record.get("image_path") and Path(record["image_path"]).exists():
+                return Path(record["image_path"]).read_bytes()
+            return None
+        
+        suffix = "parquet" if format == "parquet" else "jsonl"
+        path = self.training_data_path / "exports" / f"image_training_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{suffix}"
+        rows = self.catalog.export(path, format, read_image if include_images else None)
+        print(f"[ZEGA_ImageGen] 📦 Exported {rows} training records to {path.name}")
+        return {"path": str(path), "rows": rows, "format": format}
@@ -0,0 +1,223 @@
+"""
+ZEGA Image Jobs
+Tracks long-running provider predictions with one shared polling loop, completed early by webhooks
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Mapping, Optional, Set
+
+import httpx
+
+from zega_telemetry import IMAGE_JOB_UPDATES, IMAGE_JOBS_IN_FLIGHT
+
+TERMINAL_STATUSES = {"succeeded", "failed", "canceled"}
+
+POLL_INITIAL = float(os.getenv("ZEGA_JOB_POLL_INITIAL", "1.0"))
+POLL_MAX = float(os.getenv("ZEGA_JOB_POLL_MAX", "15.0"))
+POLL_FACTOR = 1.5
+# With a webhook configured, polling is only the fallback for a lost delivery
+WEBHOOK_POLL_INITIAL = float(os.getenv("ZEGA_JOB_WEBHOOK_POLL_INITIAL", "10.0"))
+WEBHOOK_POLL_MAX = float(os.getenv("ZEGA_JOB_WEBHOOK_POLL_MAX", "30.0"))
+# Status requests sent at once when many jobs are due together
+MAX_CONCURRENT_POLLS = int(os.getenv("ZEGA_JOB_MAX_CONCURRENT_POLLS", "8"))
+# Webhook timestamps older than this are rejected as replays
+WEBHOOK_TOLERANCE = 300
+# Seconds close() gives outstanding upstream cancels before abandoning them
+CANCEL_GRACE = 5.0
+
+@dataclass
+class _Job:
+    id: str
+    get_url: str
+    cancel_url: Optional[str]
+    future: asyncio.Future
+    interval: float
+    next_poll: float
+    polls: int = 0
+    created: float = field(default_factory=time.monotonic)
+
+def verify_webhook(headers: Mapping[str, str], body: bytes, secret: str) -> bool:
+    """
+    Standard Webhooks signature check (what Replicate sends): HMAC-SHA256 of
+    "<webhook-id>.<webhook-timestamp>.<body>" keyed with the base64 part of
+    `whsec_...`, compared against every "v1,<sig>" in webhook-signature.
+    """
+    webhook_id = headers.get("webhook-id")
+    timestamp = headers.get("webhook-timestamp")
+    signatures = headers.get("webhook-signature")
+    if not (webhook_id and timestamp and signatures):
+        return False
+    try:
+        if abs(time.time() - int(timestamp)) > WEBHOOK_TOLERANCE:
+            return False
+        key = base64.b64decode(secret.split("_", 1)[1] if secret.startswith("whsec_") else secret)
+    except ValueError:
+        return False
+    signed = f"{webhook_id}.{timestamp}.".encode() + body
+    expected = base64.b64encode(hmac.new(key, signed, hashlib.sha256).digest()).decode()
+    for candidate in signatures.split():
+        version, _, signature = candidate.partition(",")
+        if version == "v1" and hmac.compare_digest(signature, expected):
+            return True
+    return False
+
+class PredictionTracker:
+    """
+    Waits on many in-flight predictions with a single scheduler task.
+
+    Each job is polled on its own exponential backoff (POLL_INITIAL growing
+    by 1.5x with jitter up to POLL_MAX); the scheduler sleeps until the next
+    job is due and polls every due job concurrently over one HTTP client,
+    then exits once nothing is left. `complete()` resolves a job straight
+    from a webhook delivery; when a webhook URL is configured the polls
+    start later and back off further, since they only cover deliveries that
+    went missing or landed on another worker. A waiter that gives up
+    (deadline or cancellation) drops its job and cancels the prediction
+    upstream so it stops using credits.
+    """
+
+    def __init__(self, provider: str, headers: Dict[str, str], webhook: bool = False):
+        self.provider = provider
+        self.headers = headers
+        self.webhook = webhook
+        self._jobs: Dict[str, _Job] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cancels: Set[asyncio.Task] = set()
+        IMAGE_JOBS_IN_FLIGHT.labels(provider).set_function(lambda: len(self._jobs))
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._jobs)
+
+    async def wait(self, prediction: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """The prediction in a terminal state; raises asyncio.TimeoutError after `timeout` seconds"""
+        if prediction.get("status") in TERMINAL_STATUSES:
+            return prediction
+        initial = WEBHOOK_POLL_INITIAL if self.webhook else POLL_INITIAL
+        job = _Job(
+            id=prediction["id"],
+            get_url=prediction["urls"]["get"],
+            cancel_url=prediction["urls"].get("cancel"),
+            future=asyncio.get_running_loop().create_future(),
+            interval=initial,
+            next_poll=time.monotonic() + initial,
+        )
+        self._jobs[job.id] = job
+        self._ensure_scheduler()
+        try:
+            return await asyncio.wait_for(asyncio.shield(job.future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            if self._jobs.pop(job.id, None) is not None and job.cancel_url:
+                task = asyncio.ensure_future(self._cancel(job.cancel_url))
+                # Held until done so the task isn't garbage-collected mid-request
+                self._cancels.add(task)
+                task.add_done_callback(self._cancels.discard)
+            raise
+        finally:
+            self._jobs.pop(job.id, None)
+
+    def complete(self, prediction: Dict[str, Any]) -> bool:
+        """Resolve a job from a webhook body; False if it is unknown here or not finished"""
+        if prediction.get("status") not in TERMINAL_STATUSES:
+            return False
+        job = self._jobs.pop(prediction.get("id"), None)
+        if job is None:
+            return False
+        IMAGE_JOB_UPDATES.labels(self.provider, "webhook").inc()
+        if not job.future.done():
+            job.future.set_result(prediction)
+        return True
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for job in self._jobs.values():
+            if not job.future.done():
+                job.future.cancel()
+        self._jobs.clear()
+        if self._cancels:
+            # Let pending upstream cancels finish on the shared client before it closes
+            _, pending = await asyncio.wait(set(self._cancels), timeout=CANCEL_GRACE)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    # === Scheduler ===
+
+    def _ensure_scheduler(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        else:
+            self._wakeup.set()  # A new job may be due before the current sleep ends
+
+    async def _run(self):
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_POLLS)
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=30.0, headers=self.headers)
+
+        async def poll(job: _Job):
+            async with semaphore:
+                await self._poll(job)
+
+        while self._jobs:
+            now = time.monotonic()
+            due = [job for job in self._jobs.values() if job.next_poll <= now]
+            if due:
+                await asyncio.gather(*(poll(job) for job in due))
+                continue
+            delay = min(job.next_poll for job in self._jobs.values()) - now
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _backoff(self, job: _Job):
+        ceiling = WEBHOOK_POLL_MAX if self.webhook else POLL_MAX
+        job.interval = min(job.interval * POLL_FACTOR, ceiling)
+        job.next_poll = time.monotonic() + job.interval * random.uniform(0.8, 1.2)
+
+    async def _poll(self, job: _Job):
+        job.polls += 1
+        try:
+            response = await self._client.get(job.get_url)
+            if response.status_code == 429:
+                retry_after = float(response.headers.get("retry-after", job.interval))
+                job.interval = max(job.interval, retry_after)
+            response.raise_for_status()
+            prediction = response.json()
+        except Exception as e:
+            print(f"[ZEGA_ImageGen] ⚠️ {self.provider} status check failed for {job.id}: {e}")
+            self._backoff(job)
+            return
+
+        if prediction.get("status") in TERMINAL_STATUSES:
+            if self._jobs.pop(job.id, None) is not None:
+                IMAGE_JOB_UPDATES.labels(self.provider, "poll").inc()
+                if not job.future.done():
+                    job.future.set_result(prediction)
+        else:
+            self._backoff(job)
+
+    async def _cancel(self, cancel_url: str):
+        try:
+            client = self._client or httpx.AsyncClient(timeout=10.0, headers=self.headers)
+            await client.post(cancel_url)
+            if client is not self._client:
+                await client.aclose()
+        except Exception as e:
+            print(f"[ZEGA_ImageGen] ⚠️ Could not cancel {self.provider} prediction: {e}")
@@ -0,0 +1,203 @@
+"""
+ZEGA Image Post-Processing
+Pillow pipeline for format detection, WebP/AVIF transcoding, thumbnails/srcset and metadata stripping
+"""
+import asyncio
+import io
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from zega_artifacts import Artifact, ArtifactStore, sniff_content_type
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+# Requested widths snap up to one of these, so each image has a bounded set of renditions
+SRCSET_WIDTHS = [int(w) for w in os.getenv("ZEGA_IMAGE_SRCSET_WIDTHS", "320,640,1024").split(",") if w.strip()]
+THUMBNAIL_WIDTH = SRCSET_WIDTHS[0] if SRCSET_WIDTHS else 320
+
+QUALITY = {"webp": 80, "avif": 60, "jpeg": 85}
+CONTENT_TYPES = {"webp": "image/webp", "avif": "image/avif", "jpeg": "image/jpeg", "png": "image/png"}
+
+def avif_supported() -> bool:
+    """Pillow 11.2+ encodes AVIF natively; older versions need the pillow-avif-plugin"""
+    if Image is None:
+        return False
+    try:
+        if features.check("avif"):
+            return True
+    except ValueError:
+        pass  # Feature name unknown to this Pillow
+    try:
+        import pillow_avif  # noqa: F401 (registers the codec)
+        return True
+    except ImportError:
+        return False
+
+def image_info(data: bytes) -> Dict[str, Any]:
+    """Detected content type and, with Pillow, pixel size (only the header is parsed)"""
+    info: Dict[str, Any] = {"content_type": sniff_content_type(data, "application/octet-stream")}
+    if Image is not None:
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                info["width"], info["height"] = img.size
+                if img.format:
+                    info["content_type"] = Image.MIME.get(img.format, info["content_type"])
+        except Exception:
+            pass
+    return info
+
+def render_variant(data: bytes, fmt: str, width: Optional[int]) -> bytes:
+    """
+    Decode, apply EXIF orientation, downscale to `width` (never up) and
+    re-encode as `fmt`. Only the ICC profile is carried over; EXIF, XMP and
+    PNG text chunks (which often hold the generation prompt) are dropped.
+    Module-level so a process pool can pickle it.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        icc_profile = img.info.get("icc_profile")
+        img = ImageOps.exif_transpose(img)
+        if width and img.width > width:
+            img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+
+        if fmt == "jpeg":
+            img = img.convert("RGB")
+        elif img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+
+        out = io.BytesIO()
+        options: Dict[str, Any] = {}
+        if icc_profile:
+            options["icc_profile"] = icc_profile
+        if fmt == "webp":
+            img.save(out, "WEBP", quality=QUALITY["webp"], method=4, **options)
+        elif fmt == "avif":
+            img.save(out, "AVIF", quality=QUALITY["avif"], speed=6, **options)
+        elif fmt == "jpeg":
+            img.save(out, "JPEG", quality=QUALITY["jpeg"], optimize=True, progressive=True, **options)
+        else:
+            img.save(out, "PNG", optimize=True, **options)
+        return out.getvalue()
+
+def snap_width(width: Optional[int]) -> Optional[int]:
+    if not width or not SRCSET_WIDTHS:
+        return width
+    return next((w for w in sorted(SRCSET_WIDTHS) if w >= width), max(SRCSET_WIDTHS))
+
+class ImagePostProcessor:
+    """
+    Produces resized/transcoded renditions of image artifacts on demand.
+
+    Encoding runs in a thread pool by default (Pillow releases the GIL while
+    resampling and encoding) or a process pool with
+    ZEGA_IMAGE_POSTPROCESS_POOL=process. Renditions are stored as derived
+    artifacts, so each (image, format, width) is encoded once across all
+    workers, and concurrent requests for the same one share a single encode.
+    Without Pillow every request gets the original bytes.
+    """
+
+    def __init__(self, store: ArtifactStore, workers: int = None, pool: str = None):
+        self.store = store
+        self.available = Image is not None
+        self.avif = avif_supported()
+        workers = workers or int(os.getenv("ZEGA_IMAGE_POSTPROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+        pool = pool or os.getenv("ZEGA_IMAGE_POSTPROCESS_POOL", "thread")
+        self.executor: Executor = (
+            ProcessPoolExecutor(max_workers=workers) if pool == "process"
+            else ThreadPoolExecutor(max_workers=workers, thread_name_prefix="zega-imgproc")
+        )
+        self._inflight: Dict[str, asyncio.Future] = {}
+        if self.available:
+            print(f"[ZEGA_ImageGen] ✅ Post-processing: WebP{', AVIF' if self.avif else ''} ({pool} pool, {workers} workers)")
+        else:
+            print("[ZEGA_ImageGen] ⚠️ Pillow not available; serving images as generated")
+
+    def negotiate(self, accept: str, requested: Optional[str] = None) -> Optional[str]:
+        """
+        Output format for a request: an explicit `format` wins ("original" or
+        unknown values mean no transcode), otherwise the best one the Accept
+        header lists. None keeps the original encoding.
+        """
+        if requested and requested != "auto":
+            if requested == "avif" and not self.avif:
+                return "webp"
+            return requested if requested in CONTENT_TYPES else None
+        accept = accept or ""
+        if self.avif and "image/avif" in accept:
+            return "avif"
+        if "image/webp" in accept:
+            return "webp"
+        return None
+
+    async def variant(self, artifact: Artifact, fmt: Optional[str], width: Optional[int]) -> Artifact:
+        """The rendition of `artifact` in `fmt` at `width` (either may be None), encoding it on first use"""
+        width = snap_width(width)
+        if not self.available or artifact.kind != "image" or (fmt is None and width is None):
+            return artifact
+        fmt = fmt or {"image/jpeg": "jpeg", "image/webp": "webp"}.get(artifact.content_type, "png")
+        if width is None and CONTENT_TYPES[fmt] == artifact.content_type:
+            return artifact  # Same format, same size: re-encoding would only lose quality
+        key = f"{fmt}:{width or 0}"
+
+        existing = await asyncio.to_thread(self.store.get_derived, artifact.id, key)
+        if existing:
+            return existing
+
+        flight_key = f"{artifact.id}:{key}"
+        if flight_key in self._inflight:
+            return await asyncio.shield(self._inflight[flight_key])
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[flight_key] = future
+        try:
+            data = await asyncio.to_thread(self.store.read, artifact.id)
+            if data is None:
+                result = artifact
+            else:
+                encoded = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, render_variant, data, fmt, width
+                )
+                result = await asyncio.to_thread(
+                    self.store.put_derived, artifact.id, key, encoded, "image", CONTENT_TYPES[fmt],
+                    {"width": width}
+                )
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when no one else was waiting
+            raise
+        finally:
+            del self._inflight[flight_key]
+
+    async def transform(self, artifact: Artifact, request) -> Artifact:
+        """Artifact route hook: ?w=<px> and ?format=auto|webp|avif|jpeg|png|original, else Accept"""
+        from fastapi import HTTPException
+
+        if artifact.metadata.get("source") and not request.query_params:
+            return artifact  # Already a rendition
+        width = request.query_params.get("w")
+        if width is not None and not width.isdigit():
+            raise HTTPException(status_code=400, detail="w must be a positive integer")
+        fmt = self.negotiate(request.headers.get("accept", ""), request.query_params.get("format"))
+        try:
+            return await self.variant(artifact, fmt, int(width) if width else None)
+        except HTTPException:
+            raise
+        except Exception as e:
+            # A corrupt or unsupported source is still served as stored
+            print(f"[ZEGA_ImageGen] ⚠️ Post-processing failed for {artifact.id[:12]}: {e}")
+            return artifact
+
+    @staticmethod
+    def srcset(url: str, widths: List[int] = None) -> str:
+        """`<url>?w=320 320w, ...` for an <img srcset>; the format still follows Accept"""
+        return ", ".join(f"{url}?w={w} {w}w" for w in (widths or SRCSET_WIDTHS))
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,134 @@
+"""
+ZEGA Variation Engine
+Concurrent image generation across providers and seeds, with a global deadline
+"""
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+from zega_telemetry import IMAGE_PROVIDER_SECONDS
+
+DEFAULT_DEADLINE = float(os.getenv("ZEGA_IMAGE_DEADLINE", "90"))
+MAX_PARALLEL = int(os.getenv("ZEGA_IMAGE_MAX_PARALLEL", "4"))
+# Attempts launched beyond num_variations, so one slow provider doesn't set the pace
+HEDGE = int(os.getenv("ZEGA_IMAGE_HEDGE", "1"))
+# Failures before a provider is dropped for the rest of a run
+MAX_PROVIDER_FAILURES = 2
+
+class VariationEngine:
+    """
+    Fans one prompt out over (provider, seed) attempts and yields successful
+    images in completion order.
+
+    Attempts are queued round by round (every provider with seed 0, then
+    every provider with seed 1, ...), so variations spread across providers
+    first. Up to `num_variations + HEDGE` run at once, capped at
+    MAX_PARALLEL. A failed attempt starts the next queued one, preferring
+    providers with nothing in flight; a provider that just delivered gets
+    its next seed right away, so a stalled provider (an HF cold start) does
+    not hold the remaining variations. A provider that fails
+    MAX_PROVIDER_FAILURES times is not tried again in this run. Once enough images are in, or the deadline passes, the
+    remaining attempts are cancelled.
+    """
+
+    def __init__(self, providers: List, max_parallel: int = None, hedge: int = None):
+        self.providers = providers
+        self.max_parallel = max_parallel or MAX_PARALLEL
+        self.hedge = HEDGE if hedge is None else hedge
+
+    async def _attempt(self, provider, prompt: str, seed: int):
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await provider.generate(prompt, seed=seed)
+            outcome = "ok" if result.success else "failed"
+            return result
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            IMAGE_PROVIDER_SECONDS.labels(provider.name, outcome).observe(time.perf_counter() - started)
+
+    async def run(
+        self,
+        prompt: str,
+        num_variations: int = 1,
+        deadline: Optional[float] = None,
+        base_seed: Optional[int] = None
+    ) -> AsyncIterator:
+        """Yield up to `num_variations` successful results within `deadline` seconds"""
+        if num_variations <= 0 or not self.providers:
+            return
+        deadline_at = time.monotonic() + (deadline or DEFAULT_DEADLINE)
+        base_seed = random.randrange(1 << 30) if base_seed is None else base_seed
+
+        queue: Deque[Tuple[object, int]] = deque(
+            (provider, base_seed + rnd)
+            for rnd in range(num_variations)
+            for provider in self.providers
+        )
+        failures: Dict[int, int] = {}
+        pending: Set[asyncio.Task] = set()
+        delivered = 0
+        parallel = min(num_variations + self.hedge, self.max_parallel)
+
+        def start(index: int):
+            provider, seed = queue[index]
+            del queue[index]
+            task = asyncio.create_task(self._attempt(provider, prompt, seed))
+            task.provider = provider
+            pending.add(task)
+
+        def launch(proven=None):
+            for i in range(len(queue) - 1, -1, -1):
+                if failures.get(id(queue[i][0]), 0) >= MAX_PROVIDER_FAILURES:
+                    del queue[i]
+            wanted = num_variations - delivered
+            # A provider that just delivered gets the next seed; it is demonstrably fast
+            if proven is not None and wanted > 0 and len(pending) < self.max_parallel:
+                for i, (provider, _) in enumerate(queue):
+                    if provider is proven:
+                        start(i)
+                        break
+            while queue and len(pending) < min(parallel, wanted + self.hedge):
+                busy = {id(t.provider) for t in pending}
+                idle = next((i for i, (provider, _) in enumerate(queue) if id(provider) not in busy), 0)
+                start(idle)
+
+        try:
+            launch()
+            while pending and delivered < num_variations:
+                remaining = deadline_at - time.monotonic()
+                if remaining <= 0:
+                    print(f"[ZEGA_ImageGen] ⏱️ Deadline reached with {delivered}/{num_variations} images")
+                    break
+                done, _ = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                proven = None
+                for task in done:
+                    pending.discard(task)
+                    provider = task.provider
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        print(f"[ZEGA_ImageGen] ❌ {provider.name} error: {e}")
+                        failures[id(provider)] = failures.get(id(provider), 0) + 1
+                        continue
+                    if not result.success:
+                        print(f"[ZEGA_ImageGen] ⚠️ {provider.name} failed: {result.error}")
+                        failures[id(provider)] = failures.get(id(provider), 0) + 1
+                        continue
+                    if delivered < num_variations:
+                        print(f"[ZEGA_ImageGen] ✅ Success from {provider.name}")
+                        delivered += 1
+                        proven = provider
+                        yield result
+                launch(proven)
+        finally:
+            # Enough images, deadline, or the consumer went away: drop the stragglers
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
@@ -0,0 +1,42 @@
+"""
+ZEGA Telemetry
+Shared metrics registry and service instrumentation for all ZEGA services
+"""
+
+__version__ = "1.0.0"
+
+from .metrics import (
+    registry,
+    Counter,
+    Gauge,
+    Histogram,
+    Registry,
+    DEFAULT_BUCKETS,
+    PROVIDER_CALLS,
+    PROVIDER_RETRIES,
+    GENERATED_CHARS,
+    GENERATED_TOKENS,
+    CACHE_REQUESTS,
+    MEMORY_QUERY_SECONDS,
+    AUTOTRAIN_EXAMPLES,
+    IMAGE_PROVIDER_SECONDS,
+    IMAGE_JOBS_IN_FLIGHT,
+    IMAGE_JOB_UPDATES,
+    VOICE_PROVIDER_SECONDS,
+    LOOP_LAG_SECONDS,
+    HTTP_REQUEST_SECONDS,
+)
+from .instrument import (
+    instrument_app,
+    render_metrics,
+    LoopLagMonitor,
+    MetricsMiddleware,
+    PROMETHEUS_CONTENT_TYPE,
+)
+from .profiler import (
+    profiler,
+    SamplingProfiler,
+    ProfilerBusy,
+    to_collapsed,
+    to_speedscope,
+)
@@ -0,0 +1,98 @@
+"""
+Service Instrumentation
+ASGI request timing, event-loop lag sampling and a Prometheus /metrics route
+"""
+import asyncio
+import os
+import time
+from typing import Optional
+from .metrics import HTTP_REQUEST_SECONDS, LOOP_LAG_SECONDS, registry
+from .profiler import add_profile_route, profiler_token
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class LoopLagMonitor:
+    """Records how late a periodic timer fires; blocking handlers show up as lag"""
+
+    def __init__(self, service: str, interval: float = None):
+        self.interval = interval or float(os.getenv("ZEGA_LOOP_LAG_INTERVAL", "0.25"))
+        self.histogram = LOOP_LAG_SECONDS.labels(service)
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.histogram.observe(max(0.0, loop.time() - expected))
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+class MetricsMiddleware:
+    """Pure ASGI middleware (no BaseHTTPMiddleware overhead) timing each HTTP request"""
+
+    def __init__(self, app, service: str):
+        self.app = app
+        self.service = service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Route template, not the raw path, keeps label cardinality bounded
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                self.service,
+                getattr(route, "path", "unmatched"),
+                scope.get("method", ""),
+                str(status["code"])
+            ).observe(time.perf_counter() - start)
+
+def render_metrics() -> str:
+    return registry.render()
+
+def instrument_app(app, service: str, metrics_path: Optional[str] = "/metrics") -> LoopLagMonitor:
+    """
+    Wire a FastAPI app into the shared registry: request timing middleware,
+    event-loop lag sampling while the app runs, (unless metrics_path is
+    None) a GET route serving Prometheus text, and the token-protected
+    /admin/profile capture when ZEGA_PROFILER_ENABLED is on.
+    """
+    from fastapi.responses import Response
+
+    app.add_middleware(MetricsMiddleware, service=service)
+
+    monitor = LoopLagMonitor(service)
+    app.add_event_handler("startup", monitor.start)
+    app.add_event_handler("shutdown", monitor.stop)
+
+    if metrics_path:
+        async def metrics():
+            return Response(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+        app.add_api_route(metrics_path, metrics, methods=["GET"], include_in_schema=False)
+
+    token = profiler_token()
+    if token:
+        add_profile_route(app, service, token)
+
+    return monitor
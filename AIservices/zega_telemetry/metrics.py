@@ -0,0 +1,251 @@
+"""
+ZEGA Metrics Registry
+Counters, gauges and histograms shared by all services, rendered as Prometheus text
+"""
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds; from cache hits (ms) up to slow HF cold starts and image generation
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _fmt(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+def _label_str(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric:
+    """Base: one metric family with a fixed label set; children cached per label values"""
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **kwargs):
+        """Child for these label values (positional or by name)"""
+        if kwargs:
+            values = tuple(str(kwargs[n]) for n in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _default(self):
+        return self.labels() if not self.labelnames else None
+
+    def items(self) -> List[Tuple[Tuple[str, ...], object]]:
+        """Snapshot of (label values, child) pairs"""
+        with self._lock:
+            return sorted(self._children.items())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self.items():
+            lines.extend(self._render_child(values, child))
+        return lines
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+class Counter(_Metric):
+    """Monotonic count, e.g. provider calls by outcome"""
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def _render_child(self, values, child) -> List[str]:
+        return [f"{self.name}{_label_str(self.labelnames, values)} {_fmt(child.value)}"]
+
+class _GaugeChild:
+    __slots__ = ("value", "function", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function: Optional[Callable[[], float]] = None
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def set_function(self, function: Callable[[], float]):
+        """Evaluate at scrape time (queue depths, pool sizes) instead of tracking updates"""
+        self.function = function
+
+    def get(self) -> float:
+        if self.function is not None:
+            try:
+                return float(self.function())
+            except Exception:
+                return float("nan")
+        return self.value
+
+class Gauge(_Metric):
+    """Value that goes up and down, or a callback read at scrape time"""
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def set_function(self, function: Callable[[], float]):
+        self._default().set_function(function)
+
+    def _render_child(self, values, child) -> List[str]:
+        return [f"{self.name}{_label_str(self.labelnames, values)} {_fmt(child.get())}"]
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+class Histogram(_Metric):
+    """Bucketed distribution (latencies in seconds by default)"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def _render_child(self, values, child) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, child.counts):
+            cumulative += count
+            le = 'le="%s"' % bound
+            lines.append(f"{self.name}_bucket{_label_str(self.labelnames, values, le)} {cumulative}")
+        inf = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{_label_str(self.labelnames, values, inf)} {child.count}")
+        lines.append(f"{self.name}_sum{_label_str(self.labelnames, values)} {_fmt(child.sum)}")
+        lines.append(f"{self.name}_count{_label_str(self.labelnames, values)} {child.count}")
+        return lines
+
+class Registry:
+    """Process-wide set of metric families; registering an existing name returns it"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} already registered with a different type or labels")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)"""
+        lines: List[str] = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+# === Shared metric definitions (one place so names and labels stay consistent) ===
+
+PROVIDER_CALLS = registry.counter(
+    "zega_provider_calls_total", "Text provider calls by outcome", ["provider", "outcome"])
+PROVIDER_RETRIES = registry.counter(
+    "zega_provider_retries_total", "Retried text provider calls", ["provider"])
+GENERATED_CHARS = registry.counter(
+    "zega_generated_characters_total", "Characters generated by text providers", ["provider"])
+GENERATED_TOKENS = registry.counter(
+    "zega_generated_tokens_total", "Tokens generated, where the provider reports usage", ["provider"])
+CACHE_REQUESTS = registry.counter(
+    "zega_cache_requests_total", "Cache and coalescing lookups", ["cache", "result"])
+MEMORY_QUERY_SECONDS = registry.histogram(
+    "zega_memory_query_seconds", "Vector memory operation latency", ["operation"])
+AUTOTRAIN_EXAMPLES = registry.counter(
+    "zega_autotrain_examples_total", "Auto-train examples by result", ["result"])
+IMAGE_PROVIDER_SECONDS = registry.histogram(
+    "zega_image_provider_seconds", "Image provider latency", ["provider", "outcome"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 180.0))
+IMAGE_JOBS_IN_FLIGHT = registry.gauge(
+    "zega_image_jobs_in_flight", "Long-running image predictions being tracked", ["provider"])
+IMAGE_JOB_UPDATES = registry.counter(
+    "zega_image_job_updates_total", "Image predictions finished, by how the result arrived", ["provider", "source"])
+VOICE_PROVIDER_SECONDS = registry.histogram(
+    "zega_voice_provider_seconds", "TTS/STT provider latency", ["provider", "operation", "outcome"])
+LOOP_LAG_SECONDS = registry.histogram(
+    "zega_event_loop_lag_seconds", "How late the event loop runs a periodic timer", ["service"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "zega_http_request_seconds", "HTTP request latency", ["service", "route", "method", "status"])
@@ -0,0 +1,165 @@
+"""
+Sampling Profiler
+On-demand stack sampling of a running service, exported as collapsed stacks or speedscope JSON
+"""
+import asyncio
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from pathlib import Path
+from typing import Dict, Optional
+
+# Leaf frames that mean "blocked waiting", not burning CPU
+_IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+MAX_CAPTURE_SECONDS = 60.0
+
+class ProfilerBusy(Exception):
+    """Raised when a capture is already running in this process"""
+    pass
+
+def _frame_label(code) -> str:
+    path = Path(code.co_filename)
+    short = "/".join(path.parts[-2:]) if len(path.parts) > 1 else path.name
+    return f"{code.co_name} ({short}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    """
+    Samples every thread's Python stack from a background thread.
+
+    Nothing runs between captures; during one the cost is a sys._current_frames()
+    walk per interval, which holds the GIL only briefly.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def _sample(self, seconds: float, interval: float, include_idle: bool) -> Dict[str, int]:
+        me = threading.get_ident()
+        stacks: StackCounter = StackCounter()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                leaf = frame.f_code
+                if not include_idle and (Path(leaf.co_filename).name, leaf.co_name) in _IDLE_LEAVES:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f"thread-{ident}"))
+                stacks[";".join(reversed(labels))] += 1
+            time.sleep(interval)
+        return dict(stacks)
+
+    async def capture(
+        self,
+        seconds: float = 10.0,
+        interval: float = 0.005,
+        include_idle: bool = False
+    ) -> Dict[str, int]:
+        """Collapsed stack -> sample count for `seconds` of wall time"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile capture is already running")
+        try:
+            seconds = min(max(seconds, 0.1), MAX_CAPTURE_SECONDS)
+            interval = max(interval, 0.001)
+            # Sampler runs off the event loop, so the loop's own stacks show up
+            return await asyncio.to_thread(self._sample, seconds, interval, include_idle)
+        finally:
+            self._lock.release()
+
+def to_collapsed(stacks: Dict[str, int]) -> str:
+    """Brendan Gregg collapsed format, input for flamegraph.pl / speedscope / inferno"""
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+def to_speedscope(stacks: Dict[str, int], interval: float, name: str) -> Dict:
+    """speedscope 'sampled' profile; weights are in milliseconds"""
+    frames = []
+    index: Dict[str, int] = {}
+    samples = []
+    weights = []
+    for stack, count in sorted(stacks.items()):
+        ids = []
+        for label in stack.split(";"):
+            if label not in index:
+                index[label] = len(frames)
+                frames.append({"name": label})
+            ids.append(index[label])
+        samples.append(ids)
+        weights.append(round(count * interval * 1000, 3))
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+        "name": name,
+        "exporter": "zega_telemetry",
+    }
+
+profiler = SamplingProfiler()
+
+def profiler_token() -> Optional[str]:
+    """Admin token when ZEGA_PROFILER_ENABLED is on; None keeps the endpoint unregistered"""
+    if os.getenv("ZEGA_PROFILER_ENABLED", "false").lower() != "true":
+        return None
+    token = os.getenv("ZEGA_ADMIN_TOKEN")
+    if not token:
+        print("[TELEMETRY] ⚠️ ZEGA_PROFILER_ENABLED is set but ZEGA_ADMIN_TOKEN is not; profiler disabled")
+        return None
+    return token
+
+def add_profile_route(app, service: str, token: str, path: str = "/admin/profile"):
+    """GET {path}?seconds=10&interval_ms=5&format=collapsed|speedscope, with X-Admin-Token"""
+    from fastapi import Header, HTTPException
+    from fastapi.responses import JSONResponse, PlainTextResponse
+
+    async def capture_profile(
+        seconds: float = 10.0,
+        interval_ms: float = 5.0,
+        format: str = "collapsed",
+        include_idle: bool = False,
+        x_admin_token: Optional[str] = Header(None)
+    ):
+        if not x_admin_token or not hmac.compare_digest(x_admin_token, token):
+            raise HTTPException(status_code=403, detail="Invalid admin token")
+        if format not in ("collapsed", "speedscope"):
+            raise HTTPException(status_code=400, detail="format must be collapsed or speedscope")
+
+        try:
+            stacks = await profiler.capture(seconds, interval_ms / 1000, include_idle)
+        except ProfilerBusy as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
+        filename = f"{service}-{int(time.time())}"
+        if format == "speedscope":
+            return JSONResponse(
+                to_speedscope(stacks, interval_ms / 1000, f"{service} ({seconds:g}s)"),
+                headers={"Content-Disposition": f'attachment; filename="{filename}.speedscope.json"'}
+            )
+        return PlainTextResponse(
+            to_collapsed(stacks),
+            headers={"Content-Disposition": f'attachment; filename="{filename}.collapsed.txt"'}
+        )
+
+    app.add_api_route(path, capture_profile, methods=["GET"], include_in_schema=False)
+    print(f"[TELEMETRY] 🔥 Sampling profiler enabled at {path} for {service}")
@@ -10,18 +10,22 @@ from pathlib import Path
 # Add parent directory for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
+import asyncio
 import base64
+import json
 from dotenv import load_dotenv
 
 # Load environment
 load_dotenv(dotenv_path=Path(__file__).parent.parent / '.env')
 
 from zega_voice.processor import ZegaVoiceProcessor
+from zega_telemetry import instrument_app
+from zega_artifacts import get_store, add_artifact_routes, artifact_url
 
 app = FastAPI(
     title="ZEGA Voice Assistant Service",
@@ -38,10 +42,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Shared metrics: request timing, loop lag and Prometheus text on /metrics
+instrument_app(app, "voice")
+
+# Synthesized audio is served by reference from the shared artifact store
+artifacts = get_store()
+add_artifact_routes(app, artifacts)
+
 # Initialize processor
 processor = ZegaVoiceProcessor(
-    training_data_path=str(Path(__file__).parent / "training_data")
+    training_data_path=str(Path(__file__).parent / "training_data"),
+    artifact_store=artifacts
 )
+for _provider in processor.stt_providers:
+    if getattr(_provider, "local_model", None):
+        app.add_event_handler("shutdown", _provider.local_model.close)
 
 # Request/Response Models
 class TranscribeRequest(BaseModel):
@@ -52,12 +67,17 @@ class SynthesizeRequest(BaseModel):
     text: str
     voice: Optional[str] = "en-US-JennyNeural"
     language: str = "en"
+    rate: str = "+0%"  # Edge TTS speaking rate, e.g. "+10%"
+    pitch: str = "+0Hz"
+    use_cache: bool = True  # Reuse audio synthesized earlier for the same text and voice
+    include_data: bool = False  # Also inline the audio as base64
 
 class NarrateSceneRequest(BaseModel):
     scene_title: str
     scene_description: str
     voice: str = "en-US-JennyNeural"
     include_title: bool = True
+    include_data: bool = False
 
 class SubtitleRequest(BaseModel):
     audio_base64: str
@@ -77,7 +97,43 @@ class SynthesisResponse(BaseModel):
     audio_format: str = "mp3"
     duration: float = 0.0
     voice_used: str = ""
+    provider: str = ""  # Comma-separated when segments came from several providers
+    mixed_voices: bool = False  # Some segments fell back to another provider's voice
     error: Optional[str] = None
+    artifact_id: Optional[str] = None
+    audio_url: Optional[str] = None
+    size: int = 0
+
+async def _synthesis_response(result, include_data: bool, http_request: Request) -> SynthesisResponse:
+    """Store synthesized audio as an artifact and reference it; base64 only on request"""
+    response = SynthesisResponse(
+        success=result.success,
+        audio_format=result.audio_format,
+        voice_used=result.voice_used,
+        provider=result.provider,
+        mixed_voices=result.mixed_voices,
+        error=result.error
+    )
+    if not (result.success and result.audio_data):
+        return response
+    
+    response.size = len(result.audio_data)
+    try:
+        artifact = await asyncio.to_thread(
+            artifacts.put,
+            result.audio_data,
+            "audio",
+            f"audio/{'mpeg' if result.audio_format == 'mp3' else result.audio_format}",
+            {"voice": result.voice_used}
+        )
+        response.artifact_id = artifact.id
+        response.audio_url = artifact_url(http_request, artifact.id)
+    except Exception as e:
+        print(f"[ZEGA_Voice] ⚠️ Failed to store artifact: {e}")
+    
+    if include_data or not response.artifact_id:
+        response.audio_base64 = base64.b64encode(result.audio_data).decode('utf-8')
+    return response
 
 @app.get("/health")
 async def health():
@@ -139,30 +195,24 @@ async def transcribe_file(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/synthesize", response_model=SynthesisResponse)
-async def synthesize_speech(request: SynthesizeRequest):
+async def synthesize_speech(request: SynthesizeRequest, http_request: Request):
     """
     Convert text to speech
     
-    Returns base64 encoded audio in MP3 format.
+    Returns an artifact ID and URL for the MP3 audio (range requests supported);
+    set include_data for base64 audio in the response.
     """
     try:
         result = await processor.synthesize(
             text=request.text,
             voice=request.voice,
-            language=request.language
+            language=request.language,
+            rate=request.rate,
+            pitch=request.pitch,
+            use_cache=request.use_cache
         )
         
-        audio_b64 = None
-        if result.success and result.audio_data:
-            audio_b64 = base64.b64encode(result.audio_data).decode('utf-8')
-        
-        return SynthesisResponse(
-            success=result.success,
-            audio_base64=audio_b64,
-            audio_format=result.audio_format,
-            voice_used=result.voice_used,
-            error=result.error
-        )
+        return await _synthesis_response(result, request.include_data, http_request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -192,8 +242,99 @@ async def synthesize_direct(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/narrate")
-async def narrate_scene(request: NarrateSceneRequest):
+async def _first_event(events):
+    """Wait for the first synthesis event before committing to a 200"""
+    try:
+        return await events.__anext__()
+    except StopAsyncIteration:
+        raise HTTPException(status_code=502, detail="Synthesis produced no audio")
+    except Exception as e:
+        await events.aclose()
+        raise HTTPException(status_code=502, detail=str(e))
+
+@app.get("/synthesize/stream")
+async def synthesize_stream(
+    text: str = Query(..., description="Text to convert to speech"),
+    voice: str = Query("en-US-JennyNeural", description="Voice to use"),
+    rate: str = Query("+0%", description="Speaking rate, e.g. +10%"),
+    pitch: str = Query("+0Hz", description="Pitch, e.g. -5Hz")
+):
+    """
+    Stream speech as audio/mpeg while it is synthesized
+    
+    Edge TTS chunks are forwarded as they arrive, so an <audio> element
+    pointed here starts playing almost immediately.
+    """
+    events = processor.stream_synthesis(text, voice=voice, rate=rate, pitch=pitch, word_boundaries=False)
+    first = await _first_event(events)
+    
+    async def body():
+        try:
+            yield first["data"]
+            async for event in events:
+                yield event["data"]
+        except Exception as e:
+            # Headers are sent; the best we can do is end the stream early
+            print(f"[ZEGA_Voice] ❌ Speech stream stopped: {e}")
+        finally:
+            await events.aclose()
+    
+    return StreamingResponse(
+        body(),
+        media_type="audio/mpeg",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/synthesize/events")
+async def synthesize_events(
+    text: str = Query(..., description="Text to convert to speech"),
+    voice: str = Query("en-US-JennyNeural", description="Voice to use"),
+    rate: str = Query("+0%", description="Speaking rate, e.g. +10%"),
+    pitch: str = Query("+0Hz", description="Pitch, e.g. -5Hz")
+):
+    """
+    Speech as Server-Sent Events for word highlighting
+    
+    "audio" events carry base64 MP3 chunks in order (append them to a
+    MediaSource buffer), "word" events give each word's offset and duration
+    in seconds of audio, then "complete".
+    """
+    events = processor.stream_synthesis(text, voice=voice, rate=rate, pitch=pitch)
+    first = await _first_event(events)
+    
+    async def stream():
+        chunks = words = size = 0
+        try:
+            event = first
+            while True:
+                if event["type"] == "audio":
+                    size += len(event["data"])
+                    payload = {"type": "audio", "index": chunks, "data": base64.b64encode(event["data"]).decode()}
+                    chunks += 1
+                else:
+                    payload = event
+                    words += 1
+                yield f"data: {json.dumps(payload)}\n\n"
+                event = await events.__anext__()
+        except StopAsyncIteration:
+            yield f"data: {json.dumps({'type': 'complete', 'chunks': chunks, 'words': words, 'size': size})}\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'type': 'error', 'error': str(e)})}\n\n"
+        finally:
+            await events.aclose()
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+@app.post("/narrate", response_model=SynthesisResponse)
+async def narrate_scene(request: NarrateSceneRequest, http_request: Request):
     """
     Generate audio narration for a story scene
     
@@ -207,20 +348,52 @@ async def narrate_scene(request: NarrateSceneRequest):
             include_title=request.include_title
         )
         
-        audio_b64 = None
-        if result.success and result.audio_data:
-            audio_b64 = base64.b64encode(result.audio_data).decode('utf-8')
-        
-        return SynthesisResponse(
-            success=result.success,
-            audio_base64=audio_b64,
-            audio_format=result.audio_format,
-            voice_used=result.voice_used,
-            error=result.error
-        )
+        return await _synthesis_response(result, request.include_data, http_request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/narrate/stream")
+async def narrate_scene_stream(request: NarrateSceneRequest):
+    """
+    Stream scene narration as audio/mpeg while it is synthesized
+    
+    The scene is split at sentence boundaries and segments are synthesized
+    concurrently; audio starts as soon as the first segment is ready.
+    """
+    chunks = processor.stream_narration(
+        scene_title=request.scene_title,
+        scene_description=request.scene_description,
+        voice=request.voice,
+        include_title=request.include_title
+    )
+    # Wait for the first segment before committing to a 200
+    try:
+        first = await chunks.__anext__()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except StopAsyncIteration:
+        raise HTTPException(status_code=502, detail="Synthesis produced no audio")
+    except Exception as e:
+        await chunks.aclose()
+        raise HTTPException(status_code=502, detail=str(e))
+    
+    async def body():
+        yield first
+        try:
+            async for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            # Headers are sent; the best we can do is end the stream early
+            print(f"[ZEGA_Voice] ❌ Narration stream stopped: {e}")
+        finally:
+            await chunks.aclose()
+    
+    return StreamingResponse(
+        body(),
+        media_type="audio/mpeg",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/subtitles")
 async def generate_subtitles(request: SubtitleRequest):
     """
@@ -278,6 +451,13 @@ async def generate_subtitles_file(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Speech cache size and hit counts"""
+    if not processor.cache:
+        return {"enabled": False}
+    return {"enabled": True, **await asyncio.to_thread(processor.cache.stats)}
+
 @app.get("/voices")
 async def list_voices():
     """
@@ -319,7 +499,8 @@ MCP_TOOLS = {
             "properties": {
                 "text": {"type": "string", "description": "Text to convert to speech"},
                 "voice": {"type": "string", "description": "Voice to use (e.g., 'en-US-JennyNeural')"},
-                "language": {"type": "string", "description": "Language code"}
+                "language": {"type": "string", "description": "Language code"},
+                "include_data": {"type": "boolean", "description": "Inline base64 audio besides the artifact URL"}
             },
             "required": ["text"]
         }
@@ -332,7 +513,8 @@ MCP_TOOLS = {
             "properties": {
                 "scene_title": {"type": "string", "description": "Title of the scene"},
                 "scene_description": {"type": "string", "description": "Scene content to narrate"},
-                "voice": {"type": "string", "description": "Narrator voice"}
+                "voice": {"type": "string", "description": "Narrator voice"},
+                "include_data": {"type": "boolean", "description": "Inline base64 audio besides the artifact URL"}
             },
             "required": ["scene_title", "scene_description"]
         }
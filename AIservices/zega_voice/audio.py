@@ -0,0 +1,104 @@
+"""
+ZEGA Audio Decoding
+Uploaded audio bytes to mono float32 PCM in memory, resampled for Whisper
+"""
+import io
+import shutil
+import subprocess
+import wave
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import soundfile
+except ImportError:
+    soundfile = None
+
+try:
+    from scipy.signal import resample_poly
+except ImportError:
+    resample_poly = None
+
+# Whisper models expect 16 kHz mono
+SAMPLE_RATE = 16000
+
+_PCM_DTYPES = {1: "u1", 2: "<i2", 4: "<i4"}
+
+def _decode_wav(data: bytes):
+    """(samples, sample_rate) for integer PCM WAV via the stdlib, or None if it is not one"""
+    try:
+        with wave.open(io.BytesIO(data)) as wav:
+            channels, width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+            frames = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError):
+        return None  # Not RIFF/WAVE, or float/extensible PCM the wave module can't read
+    if width == 3:
+        # 24-bit: widen each sample to 32 bits, keeping the sign in the top byte
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        samples = (np.pad(raw, ((0, 0), (1, 0))).view("<i4").ravel()).astype(np.float32) / 2 ** 31
+    elif width in _PCM_DTYPES:
+        samples = np.frombuffer(frames, dtype=_PCM_DTYPES[width]).astype(np.float32)
+        samples = (samples - 128.0) / 128.0 if width == 1 else samples / float(2 ** (8 * width - 1))
+    else:
+        return None
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples, rate
+
+def _decode_soundfile(data: bytes):
+    """FLAC/OGG/float WAV through libsndfile, if installed"""
+    if soundfile is None:
+        return None
+    try:
+        samples, rate = soundfile.read(io.BytesIO(data), dtype="float32", always_2d=True)
+    except Exception:
+        return None
+    return samples.mean(axis=1), rate
+
+def _decode_ffmpeg(data: bytes, sample_rate: int):
+    """
+    Anything else (MP3, WebM/Opus, M4A) through ffmpeg over pipes, which also
+    downmixes and resamples. MP4/M4A files with their index at the end can't
+    be read from a pipe; ffmpeg rejects those.
+    """
+    if shutil.which("ffmpeg") is None:
+        raise RuntimeError("ffmpeg is required to decode this audio format")
+    process = subprocess.run(
+        ["ffmpeg", "-nostdin", "-loglevel", "error", "-threads", "0", "-i", "pipe:0",
+         "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate), "pipe:1"],
+        input=data,
+        capture_output=True,
+        check=False
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not decode audio: {process.stderr.decode(errors='replace')[-200:].strip()}")
+    return np.frombuffer(process.stdout, dtype="<i2").astype(np.float32) / 32768.0
+
+def resample(samples, orig_rate: int, target_rate: int = SAMPLE_RATE):
+    """Polyphase resampling with SciPy when available, otherwise linear interpolation"""
+    if orig_rate == target_rate or len(samples) == 0:
+        return samples.astype(np.float32, copy=False)
+    if resample_poly is not None:
+        from math import gcd
+        factor = gcd(orig_rate, target_rate)
+        return resample_poly(samples, target_rate // factor, orig_rate // factor).astype(np.float32)
+    duration = len(samples) / orig_rate
+    positions = np.arange(int(duration * target_rate)) * (orig_rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+def decode_audio(data: bytes, sample_rate: int = SAMPLE_RATE):
+    """
+    Mono float32 samples in [-1, 1] at `sample_rate`, decoded without touching
+    disk: WAV with the stdlib, FLAC/OGG with soundfile if installed, anything
+    else by piping through ffmpeg.
+    """
+    if np is None:
+        raise RuntimeError("numpy is required for in-memory audio decoding")
+    decoded = _decode_wav(data) or _decode_soundfile(data)
+    if decoded is None:
+        return _decode_ffmpeg(data, sample_rate)
+    samples, rate = decoded
+    return resample(samples, rate, sample_rate)
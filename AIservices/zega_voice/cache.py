@@ -0,0 +1,175 @@
+"""
+ZEGA Speech Cache
+Synthesized audio keyed by normalized text, voice, rate, pitch and provider
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from zega_artifacts import ArtifactStore
+from zega_telemetry import CACHE_REQUESTS
+
+# Pruning trims to this fraction of the byte budget
+PRUNE_LOW_WATERMARK = 0.9
+
+def normalize_text(text: str) -> str:
+    """NFC with whitespace collapsed; case and punctuation stay, since they change the reading"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+class SpeechCache:
+    """
+    Maps (normalized text, voice, rate, pitch, provider) to synthesized audio.
+
+    Entries are per text segment: the processor synthesizes long text one
+    sentence group at a time, so re-narrating a scene after editing one
+    paragraph only synthesizes that paragraph again. Entries are per
+    provider as well, so a cached gTTS fallback never stands in for an
+    available Edge voice.
+
+    The index is a SQLite WAL database in the artifact store root, shared by
+    every voice worker; the audio is stored as artifacts. The index is
+    pruned LRU to `max_bytes` of referenced audio and to `ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        store: ArtifactStore,
+        db_path: Optional[str] = None,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None
+    ):
+        self.store = store
+        self.db_path = Path(db_path or store.root / "speech_cache.db")
+        self.max_bytes = max_bytes or int(os.getenv("ZEGA_TTS_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+        self.ttl = ttl if ttl is not None else float(os.getenv("ZEGA_TTS_CACHE_TTL", str(30 * 86400)))
+        self.misses = 0  # This process only; hits are counted in the index
+        self._local = threading.local()
+        self._connection().executescript("""
+            CREATE TABLE IF NOT EXISTS speech_cache (
+                cache_key TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                voice TEXT NOT NULL,
+                rate TEXT NOT NULL,
+                pitch TEXT NOT NULL,
+                text TEXT NOT NULL,
+                artifact_id TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_hit REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS speech_cache_lru ON speech_cache (last_hit);
+        """)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def make_key(text: str, voice: str, rate: str, pitch: str, provider: str) -> str:
+        return hashlib.sha256(
+            f"{normalize_text(text)}|{voice}|{rate}|{pitch}|{provider}".encode()
+        ).hexdigest()
+
+    def _fresh_after(self) -> float:
+        return time.time() - self.ttl if self.ttl else 0.0
+
+    def get(self, text: str, voice: str, rate: str, pitch: str, provider: str) -> Optional[bytes]:
+        """Cached audio, or None; an entry whose artifact was evicted is dropped"""
+        cache_key = self.make_key(text, voice, rate, pitch, provider)
+        row = self._connection().execute(
+            "SELECT artifact_id FROM speech_cache WHERE cache_key = ? AND created_at >= ?",
+            (cache_key, self._fresh_after())
+        ).fetchone()
+        data = self.store.read(row[0]) if row else None
+        if row:
+            with self._transaction() as conn:
+                if data is not None:
+                    conn.execute(
+                        "UPDATE speech_cache SET last_hit = ?, hits = hits + 1 WHERE cache_key = ?",
+                        (time.time(), cache_key)
+                    )
+                else:
+                    conn.execute("DELETE FROM speech_cache WHERE cache_key = ?", (cache_key,))
+        if data is None:
+            self.misses += 1
+        CACHE_REQUESTS.labels("tts", "hit" if data is not None else "miss").inc()
+        return data
+
+    def put(self, text: str, voice: str, rate: str, pitch: str, provider: str, audio: bytes, content_type: str = "audio/mpeg"):
+        artifact = self.store.put(audio, "audio", content_type, {"voice": voice, "provider": provider})
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO speech_cache (cache_key, provider, voice, rate, pitch, text, "
+                "artifact_id, size, created_at, last_hit) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.make_key(text, voice, rate, pitch, provider), provider, voice, rate, pitch,
+                 normalize_text(text), artifact.id, artifact.size, now, now)
+            )
+        self.prune()
+
+    def prune(self) -> int:
+        """Drop expired entries, then least recently hit ones past `max_bytes`; returns rows removed"""
+        removed = 0
+        with self._transaction() as conn:
+            if self.ttl:
+                removed += conn.execute(
+                    "DELETE FROM speech_cache WHERE created_at < ?", (self._fresh_after(),)
+                ).rowcount
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM speech_cache").fetchone()[0]
+            if total > self.max_bytes:
+                target = self.max_bytes * PRUNE_LOW_WATERMARK
+                victims = []
+                for cache_key, size in conn.execute(
+                    "SELECT cache_key, size FROM speech_cache ORDER BY last_hit"
+                ).fetchall():
+                    if total <= target:
+                        break
+                    victims.append((cache_key,))
+                    total -= size
+                conn.executemany("DELETE FROM speech_cache WHERE cache_key = ?", victims)
+                removed += len(victims)
+        return removed
+
+    def clear(self) -> int:
+        with self._transaction() as conn:
+            return conn.execute("DELETE FROM speech_cache").rowcount
+
+    def stats(self) -> dict:
+        conn = self._connection()
+        entries, size, hits = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) FROM speech_cache"
+        ).fetchone()
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": hits,
+            "misses": self.misses,
+            "by_provider": dict(conn.execute(
+                "SELECT provider, COUNT(*) FROM speech_cache GROUP BY provider"
+            ).fetchall()),
+            "ttl_seconds": self.ttl,
+        }
@@ -0,0 +1,105 @@
+"""
+ZEGA Narration Pipeline
+Splits long text at sentence boundaries and synthesizes segments concurrently, yielding audio in order
+"""
+import asyncio
+import os
+import re
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Deque, List
+
+# Segments are packed up to this many characters; one edge-tts request each
+SEGMENT_CHARS = int(os.getenv("ZEGA_TTS_SEGMENT_CHARS", "400"))
+# Segments synthesized at once (and so buffered ahead of the listener at most)
+WORKERS = int(os.getenv("ZEGA_TTS_WORKERS", "3"))
+
+# Whitespace after terminal punctuation, or after punctuation and a closing quote/bracket
+_SENTENCE_END = re.compile(r"(?:(?<=[.!?…])|(?<=[.!?…][\"'”’)\]]))\s+")
+_CLAUSE_END = re.compile(r"(?<=[,;:—])\s+")
+
+def _split_long(sentence: str, max_chars: int) -> List[str]:
+    """Break a sentence longer than max_chars at clause punctuation, then at spaces"""
+    pieces: List[str] = []
+    for clause in _CLAUSE_END.split(sentence):
+        while len(clause) > max_chars:
+            cut = clause.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            pieces.append(clause[:cut].strip())
+            clause = clause[cut:].strip()
+        if clause:
+            pieces.append(clause)
+    return pieces
+
+def split_sentences(text: str, max_chars: int = None) -> List[str]:
+    """
+    Narration segments: sentences packed together up to `max_chars`, so
+    short lines don't each cost a request and prosody stays natural within a
+    segment. A single sentence over the limit is split at clause boundaries.
+    """
+    max_chars = max_chars or SEGMENT_CHARS
+    segments: List[str] = []
+    current = ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        for sentence in _SENTENCE_END.split(" ".join(paragraph.split())):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            for piece in (_split_long(sentence, max_chars) if len(sentence) > max_chars else [sentence]):
+                if current and len(current) + 1 + len(piece) > max_chars:
+                    segments.append(current)
+                    current = piece
+                else:
+                    current = f"{current} {piece}" if current else piece
+        # Paragraph breaks always end a segment
+        if current:
+            segments.append(current)
+            current = ""
+    return segments
+
+def strip_id3(data: bytes) -> bytes:
+    """Drop a leading ID3v2 tag so segment MP3s concatenate into one clean frame stream"""
+    if len(data) >= 10 and data[:3] == b"ID3":
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        return data[10 + size + footer:]
+    return data
+
+class NarrationPipeline:
+    """
+    Synthesizes segments with up to `workers` running ahead of the consumer
+    and yields each segment's audio in text order as soon as it and every
+    earlier segment are done. The first audio is ready after one segment,
+    not the whole scene, and at most `workers` segments are ever held in
+    memory. `synthesize(index, segment)` returns MP3 bytes or raises;
+    closing the iterator early cancels whatever is still running.
+    """
+
+    def __init__(self, synthesize: Callable[[int, str], Awaitable[bytes]], workers: int = None):
+        self.synthesize = synthesize
+        self.workers = max(1, workers or WORKERS)
+
+    async def stream(self, segments: List[str]) -> AsyncIterator[bytes]:
+        pending = enumerate(segments)
+        window: Deque[asyncio.Task] = deque()
+
+        def refill():
+            while len(window) < self.workers:
+                item = next(pending, None)
+                if item is None:
+                    return
+                window.append(asyncio.create_task(self.synthesize(*item)))
+
+        refill()
+        try:
+            index = 0
+            while window:
+                audio = await window[0]
+                window.popleft()
+                refill()
+                yield audio if index == 0 else strip_id3(audio)
+                index += 1
+        finally:
+            for task in window:
+                task.cancel()
+            if window:
+                await asyncio.gather(*window, return_exceptions=True)
@@ -13,12 +13,17 @@ import asyncio
 import httpx
 import base64
 import json
-import tempfile
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Optional, List, Dict, Any, Tuple, AsyncIterator
 from dataclasses import dataclass
 from pathlib import Path
 from datetime import datetime
 import io
+import time
+from zega_telemetry import VOICE_PROVIDER_SECONDS
+from zega_voice.narration import NarrationPipeline, split_sentences
+from zega_voice.cache import SpeechCache
+from zega_voice.whisper_pool import WhisperPool
+from zega_artifacts import ArtifactStore, get_store
 
 # Optional imports
 try:
@@ -54,6 +59,7 @@ class SynthesisResult:
     error: Optional[str] = None
     provider: str = ""
     voice_used: str = ""
+    mixed_voices: bool = False  # Segments fell back to different providers/voices
 
 @dataclass
 class SubtitleEntry:
@@ -75,9 +81,10 @@ class WhisperProvider:
         self.local_model = None
         if not self.api_key or not use_api:
             try:
-                import whisper
-                self.local_model = whisper.load_model("base")
-                print("[ZEGA_Voice] ✅ Loaded local Whisper model")
+                self.local_model = WhisperPool()
+                self.local_model.warm()
+                print(f"[ZEGA_Voice] ✅ Loaded local Whisper model ({self.local_model.model_name}, "
+                      f"{self.local_model.pool} pool, {self.local_model.workers} workers)")
             except ImportError:
                 print("[ZEGA_Voice] ⚠️ Local Whisper not available")
     
@@ -135,31 +142,16 @@ class WhisperProvider:
                 )
     
     async def _transcribe_local(self, audio_data: bytes, language: str) -> TranscriptionResult:
-        """Use local Whisper model"""
-        import tempfile
+        """Use local Whisper model (decoded in memory, run in the persistent worker pool)"""
+        result = await self.local_model.transcribe(audio_data, language)
         
-        # Save audio to temp file
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-            f.write(audio_data)
-            temp_path = f.name
-        
-        try:
-            # Run transcription in thread pool
-            result = await asyncio.to_thread(
-                self.local_model.transcribe,
-                temp_path,
-                language=language
-            )
-            
-            return TranscriptionResult(
-                success=True,
-                text=result.get("text", ""),
-                language=result.get("language", language),
-                timestamps=result.get("segments", []),
-                provider=f"{self.name}_local"
-            )
-        finally:
-            os.unlink(temp_path)
+        return TranscriptionResult(
+            success=True,
+            text=result.get("text", ""),
+            language=result.get("language", language),
+            timestamps=result.get("segments", []),
+            provider=f"{self.name}_local"
+        )
 
 class HuggingFaceSTTProvider:
     """HuggingFace Inference API for Speech-to-Text"""
@@ -252,11 +244,9 @@ class EdgeTTSProvider:
             )
         
         try:
-            communicate = edge_tts.Communicate(text, voice, rate=rate, pitch=pitch)
-            
             # Collect audio data
             audio_chunks = []
-            async for chunk in communicate.stream():
+            async for chunk in self.stream(text, voice, rate, pitch, word_boundaries=False):
                 if chunk["type"] == "audio":
                     audio_chunks.append(chunk["data"])
             
@@ -276,6 +266,40 @@ class EdgeTTSProvider:
                 provider=self.name
             )
     
+    async def stream(
+        self,
+        text: str,
+        voice: str = "en-US-JennyNeural",
+        rate: str = "+0%",
+        pitch: str = "+0Hz",
+        word_boundaries: bool = True
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Audio as it arrives from the service: {"type": "audio", "data": bytes}
+        chunks, interleaved with {"type": "word", "text", "offset", "duration"}
+        events (seconds from the start of the audio) when word_boundaries is set
+        """
+        if word_boundaries:
+            try:
+                # edge-tts 7+ reports sentence boundaries unless asked for words
+                communicate = edge_tts.Communicate(text, voice, rate=rate, pitch=pitch, boundary="WordBoundary")
+            except TypeError:
+                communicate = edge_tts.Communicate(text, voice, rate=rate, pitch=pitch)
+        else:
+            communicate = edge_tts.Communicate(text, voice, rate=rate, pitch=pitch)
+        
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                yield {"type": "audio", "data": chunk["data"]}
+            elif word_boundaries and chunk["type"] == "WordBoundary":
+                # Offsets and durations come in 100ns ticks
+                yield {
+                    "type": "word",
+                    "text": chunk["text"],
+                    "offset": chunk["offset"] / 1e7,
+                    "duration": chunk["duration"] / 1e7
+                }
+    
     async def get_voices(self) -> List[Dict[str, str]]:
         """Get available voices"""
         if not self.available:
@@ -341,9 +365,11 @@ class ZegaVoiceProcessor:
     Handles STT, TTS, and subtitle generation
     """
     
-    def __init__(self, training_data_path: str = "zega_voice_training"):
+    def __init__(self, training_data_path: str = "zega_voice_training", artifact_store: Optional[ArtifactStore] = None):
         self.training_data_path = Path(training_data_path)
         self.training_data_path.mkdir(exist_ok=True)
+        self.artifacts = artifact_store or get_store()
+        self.cache = SpeechCache(self.artifacts) if os.getenv("ZEGA_TTS_CACHE", "true").lower() == "true" else None
         
         # Initialize providers
         self.stt_providers = []
@@ -384,8 +410,11 @@ class ZegaVoiceProcessor:
         Transcribe audio to text using the best available provider
         """
         for provider in self.stt_providers:
+            started = time.perf_counter()
+            outcome = "error"
             try:
                 result = await provider.transcribe(audio_data, language)
+                outcome = "ok" if result.success else "failed"
                 if result.success:
                     print(f"[ZEGA_Voice] ✅ Transcription success from {provider.name}")
                     return result
@@ -393,6 +422,8 @@ class ZegaVoiceProcessor:
                     print(f"[ZEGA_Voice] ⚠️ {provider.name} failed: {result.error}")
             except Exception as e:
                 print(f"[ZEGA_Voice] ❌ {provider.name} error: {e}")
+            finally:
+                VOICE_PROVIDER_SECONDS.labels(provider.name, "stt", outcome).observe(time.perf_counter() - started)
         
         return TranscriptionResult(
             success=False,
@@ -404,28 +435,131 @@ class ZegaVoiceProcessor:
         self, 
         text: str,
         voice: Optional[str] = None,
-        language: str = "en"
+        language: str = "en",
+        rate: str = "+0%",
+        pitch: str = "+0Hz",
+        use_cache: bool = True
     ) -> SynthesisResult:
         """
         Synthesize speech from text using the best available provider
+        
+        Text longer than one narration segment is synthesized (and cached)
+        sentence group by sentence group, concurrently, and joined.
+        """
+        segments = split_sentences(text)
+        if len(segments) <= 1:
+            return await self._synthesize_one(text, voice, language, rate, pitch, use_cache)
+        
+        results: Dict[int, SynthesisResult] = {}
+        try:
+            chunks = [chunk async for chunk in self._segment_audio(
+                segments, voice, language, rate, pitch, use_cache, results
+            )]
+        except Exception as e:
+            return SynthesisResult(
+                success=False,
+                error=str(e),
+                provider="none"
+            )
+        return self._joined_result(chunks, results)
+    
+    def _segment_audio(
+        self,
+        segments: List[str],
+        voice: Optional[str],
+        language: str,
+        rate: str,
+        pitch: str,
+        use_cache: bool,
+        results: Optional[Dict[int, SynthesisResult]] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Segment audio in text order via the narration pipeline; each segment's
+        result is recorded in `results` under its index. Raises if a segment
+        fails on every provider.
+        """
+        async def synthesize(index: int, segment: str) -> bytes:
+            result = await self._synthesize_one(segment, voice, language, rate, pitch, use_cache)
+            if not result.success or not result.audio_data:
+                raise RuntimeError(result.error or "Synthesis failed")
+            if results is not None:
+                results[index] = result
+            return result.audio_data
+        
+        return NarrationPipeline(synthesize).stream(segments)
+    
+    @staticmethod
+    def _joined_result(chunks: List[bytes], results: Dict[int, SynthesisResult]) -> SynthesisResult:
+        """
+        One result for concatenated segments. When some segments fell back to
+        another provider the audio switches voice partway; voice_used then
+        lists every voice in the order heard and mixed_voices is set.
         """
+        ordered = [results[index] for index in sorted(results)]
+        voices = list(dict.fromkeys(r.voice_used for r in ordered))
+        if len(voices) > 1:
+            print(f"[ZEGA_Voice] ⚠️ Segments used different voices: {', '.join(voices)}")
+        return SynthesisResult(
+            success=True,
+            audio_data=b"".join(chunks),
+            audio_format="mp3",
+            provider=",".join(dict.fromkeys(r.provider for r in ordered)),
+            voice_used=",".join(voices),
+            mixed_voices=len(voices) > 1
+        )
+    
+    async def _synthesize_one(
+        self,
+        text: str,
+        voice: Optional[str],
+        language: str,
+        rate: str,
+        pitch: str,
+        use_cache: bool
+    ) -> SynthesisResult:
+        """One segment through the provider chain, checking each provider's cache entry before calling it"""
         for provider in self.tts_providers:
+            if not hasattr(provider, 'synthesize'):
+                continue
+            cache_voice = f"gtts-{language}" if provider.name == "gtts" else (voice or "en-US-JennyNeural")
+            if self.cache and use_cache:
+                cached = await asyncio.to_thread(self.cache.get, text, cache_voice, rate, pitch, provider.name)
+                if cached is not None:
+                    return SynthesisResult(
+                        success=True,
+                        audio_data=cached,
+                        audio_format="mp3",
+                        provider=provider.name,
+                        voice_used=cache_voice
+                    )
+            
+            started = time.perf_counter()
+            outcome = "error"
             try:
-                if hasattr(provider, 'synthesize'):
-                    if provider.name == "edge_tts" and voice:
-                        result = await provider.synthesize(text, voice=voice)
-                    elif provider.name == "gtts":
-                        result = await provider.synthesize(text, language=language)
-                    else:
-                        result = await provider.synthesize(text)
-                    
-                    if result.success:
-                        print(f"[ZEGA_Voice] ✅ Synthesis success from {provider.name}")
-                        return result
-                    else:
-                        print(f"[ZEGA_Voice] ⚠️ {provider.name} failed: {result.error}")
+                if provider.name == "edge_tts":
+                    result = await provider.synthesize(text, voice=voice or "en-US-JennyNeural", rate=rate, pitch=pitch)
+                elif provider.name == "gtts":
+                    result = await provider.synthesize(text, language=language)
+                else:
+                    result = await provider.synthesize(text)
+                outcome = "ok" if result.success else "failed"
+                
+                if result.success:
+                    print(f"[ZEGA_Voice] ✅ Synthesis success from {provider.name}")
+                    if self.cache and use_cache and result.audio_data:
+                        try:
+                            await asyncio.to_thread(
+                                self.cache.put, text, cache_voice, rate, pitch, provider.name, result.audio_data
+                            )
+                        except Exception as e:
+                            print(f"[ZEGA_Voice] ⚠️ Failed to cache speech: {e}")
+                    return result
+                else:
+                    print(f"[ZEGA_Voice] ⚠️ {provider.name} failed: {result.error}")
             except Exception as e:
                 print(f"[ZEGA_Voice] ❌ {provider.name} error: {e}")
+            finally:
+                VOICE_PROVIDER_SECONDS.labels(provider.name, "tts", outcome).observe(time.perf_counter() - started)
         
         return SynthesisResult(
             success=False,
@@ -433,6 +567,45 @@ class ZegaVoiceProcessor:
             provider="none"
         )
     
+    async def stream_synthesis(
+        self,
+        text: str,
+        voice: Optional[str] = None,
+        language: str = "en",
+        rate: str = "+0%",
+        pitch: str = "+0Hz",
+        word_boundaries: bool = True
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Speech as it is synthesized: audio chunks (and word events) straight
+        from Edge TTS. If it fails before any audio, falls back to
+        `synthesize()` and yields the whole file as one chunk.
+        """
+        edge = next((p for p in self.tts_providers if p.name == "edge_tts" and hasattr(p, "stream")), None)
+        if edge:
+            started = time.perf_counter()
+            outcome = "error"
+            sent_audio = False
+            try:
+                async for event in edge.stream(
+                    text, voice or "en-US-JennyNeural", rate, pitch, word_boundaries=word_boundaries
+                ):
+                    sent_audio = sent_audio or event["type"] == "audio"
+                    yield event
+                outcome = "ok"
+                return
+            except Exception as e:
+                if sent_audio:
+                    raise  # Already streaming; a second voice can't be spliced in
+                print(f"[ZEGA_Voice] ⚠️ {edge.name} stream failed: {e}")
+            finally:
+                VOICE_PROVIDER_SECONDS.labels(edge.name, "tts_stream", outcome).observe(time.perf_counter() - started)
+        
+        result = await self.synthesize(text, voice=voice, language=language, rate=rate, pitch=pitch)
+        if not result.success or not result.audio_data:
+            raise RuntimeError(result.error or "Synthesis failed")
+        yield {"type": "audio", "data": result.audio_data}
+    
     async def generate_subtitles(
         self, 
         audio_data: bytes,
@@ -498,6 +671,38 @@ class ZegaVoiceProcessor:
         ms = int((seconds % 1) * 1000)
         return f"{h:02d}:{m:02d}:{s:02d}.{ms:03d}"
     
+    @staticmethod
+    def _narration_text(scene_title: str, scene_description: str, include_title: bool) -> str:
+        """Build narration text"""
+        parts = []
+        if include_title and scene_title:
+            parts.append(scene_title + ".")
+        if scene_description:
+            parts.append(scene_description)
+        # Keep paragraph breaks; they end narration segments
+        return "\n\n".join(parts)
+    
+    async def stream_narration(
+        self,
+        scene_title: str,
+        scene_description: str,
+        voice: str = "en-US-JennyNeural",
+        include_title: bool = True,
+        language: str = "en",
+        results: Optional[Dict[int, SynthesisResult]] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        Narration as ordered MP3 chunks, one per sentence segment, synthesized
+        concurrently; the first chunk arrives after the first segment is done.
+        Each segment's result goes into `results` by index, if given.
+        Raises if a segment fails on every provider.
+        """
+        segments = split_sentences(self._narration_text(scene_title, scene_description, include_title))
+        if not segments:
+            raise ValueError("No text to narrate")
+        async for chunk in self._segment_audio(segments, voice, language, "+0%", "+0Hz", True, results):
+            yield chunk
+    
     async def narrate_scene(
         self,
         scene_title: str,
@@ -508,22 +713,24 @@ class ZegaVoiceProcessor:
         """
         Generate audio narration for a scene
         """
-        # Build narration text
-        parts = []
-        if include_title and scene_title:
-            parts.append(scene_title + ".")
-        if scene_description:
-            parts.append(scene_description)
-        
-        text = " ".join(parts)
-        
-        if not text:
+        if not self._narration_text(scene_title, scene_description, include_title).strip():
             return SynthesisResult(
                 success=False,
                 error="No text to narrate"
             )
         
-        return await self.synthesize(text, voice=voice)
+        results: Dict[int, SynthesisResult] = {}
+        try:
+            chunks = [chunk async for chunk in self.stream_narration(
+                scene_title, scene_description, voice=voice, include_title=include_title, results=results
+            )]
+        except Exception as e:
+            return SynthesisResult(
+                success=False,
+                error=str(e),
+                provider="none"
+            )
+        return self._joined_result(chunks, results)
     
     async def get_available_voices(self) -> List[Dict[str, str]]:
         """Get all available TTS voices"""
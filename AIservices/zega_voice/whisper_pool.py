@@ -0,0 +1,78 @@
+"""
+ZEGA Whisper Pool
+Persistent workers that keep a local Whisper model loaded and transcribe audio decoded in memory
+"""
+import asyncio
+import importlib.util
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict
+
+from zega_voice.audio import decode_audio
+
+# Set in each process-pool worker by _init_worker, and in the service process for the thread pool
+_model = None
+
+def _load_model(model_name: str):
+    import whisper
+    return whisper.load_model(model_name)
+
+def _init_worker(model_name: str):
+    global _model
+    _model = _load_model(model_name)
+
+def _transcribe(data: bytes, language: str) -> Dict[str, Any]:
+    """Decode and transcribe in the worker; module-level so a process pool can pickle it"""
+    audio = decode_audio(data)
+    result = _model.transcribe(audio, language=language, fp16=_model.device.type == "cuda")
+    return {
+        "text": result.get("text", ""),
+        "language": result.get("language", language),
+        "segments": result.get("segments", []),
+    }
+
+class WhisperPool:
+    """
+    Local Whisper transcription off the event loop, with the model loaded
+    once and kept for the life of the service.
+
+    The default thread pool loads one model in the service process and runs
+    one transcription at a time (PyTorch already spreads a single inference
+    over the CPU cores). ZEGA_WHISPER_POOL=process starts
+    ZEGA_WHISPER_WORKERS processes that each load their own copy, for
+    parallel transcriptions at the cost of one model's memory per worker.
+    Either way audio is decoded in the worker, straight from the uploaded
+    bytes.
+    """
+
+    def __init__(self, model_name: str = None, workers: int = None, pool: str = None):
+        global _model
+        if importlib.util.find_spec("whisper") is None:
+            raise ImportError("openai-whisper is not installed")
+        self.model_name = model_name or os.getenv("ZEGA_WHISPER_MODEL", "base")
+        self.pool = pool or os.getenv("ZEGA_WHISPER_POOL", "thread")
+        self.workers = workers or int(os.getenv("ZEGA_WHISPER_WORKERS", "1"))
+        if self.pool == "process":
+            # Workers load the model as they start; warm() starts them all up front
+            self.executor: Executor = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker, initargs=(self.model_name,)
+            )
+        else:
+            if _model is None:
+                _model = _load_model(self.model_name)
+            self.workers = 1  # One model, and Whisper models are not safe to share across threads
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="zega-whisper")
+
+    def warm(self):
+        """Start every process worker now so the first requests don't wait for model loads"""
+        if self.pool == "process":
+            for future in [self.executor.submit(int) for _ in range(self.workers)]:
+                future.result()
+
+    async def transcribe(self, audio_data: bytes, language: str = "en") -> Dict[str, Any]:
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, _transcribe, audio_data, language
+        )
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)